@@ -3,11 +3,22 @@ import numpy as np
 import re
 import subprocess
 import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import soundfile as sf
+import SubtitleProcessing
+
+# Praat executable and feature script, relative to the scripts folder. SentimentAnalysisPipeline uses the same defaults.
+DEFAULT_PRAAT_PATH = "praat.exe" if os.name == "nt" else "praat"
+DEFAULT_PRAAT_SCRIPT = os.path.join("praat", "GetAudioFeatures.praat")
 
 
 def extract_audio_clip(audio_file, output_clip_name, output_folder, start_time, end_time):
     """Extracts an audio clip from audio file starting at start_time and ending at end_time using ffmpeg.
 
+    Returns
+    -------
+    The ffmpeg exit code.
     """
 
     output_file = os.path.join(output_folder, output_clip_name)
@@ -15,18 +26,107 @@ def extract_audio_clip(audio_file, output_clip_name, output_folder, start_time,
     # audio_file = audio_file.replace("/", "\\")
     # output_file = output_file.replace("/", "\\")
 
-    subprocess.call([
+    # ffmpeg logs every file to stderr, keep it off the console.
+    return subprocess.run([
         "ffmpeg",
         "-ss", start_time,
         "-to", end_time,
         "-i", audio_file,
         "-ar", "16000",  # downsample to 16Khz
         "-ac", "1",  # stereo -> mono
-        output_file])
+        output_file], capture_output=True).returncode
 
     # print("save: " + output_file)
 
 
+def decode_audio(audio_file, sampling_rate=16000):
+    """Decodes and resamples an audio file to a mono float32 array using ffmpeg.
+
+    Parameters
+    ----------
+    audio_file : str
+        The source audio file.
+    sampling_rate : int
+        Sampling rate of the decoded audio.
+
+    Returns
+    -------
+    1d float32 array with the decoded audio.
+    """
+
+    result = subprocess.run([
+        "ffmpeg",
+        "-nostdin",
+        "-i", audio_file,
+        "-ar", str(sampling_rate),
+        "-ac", "1",  # stereo -> mono
+        "-f", "f32le",  # raw 32 bit float samples to stdout
+        "-"], capture_output=True, check=True)
+
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+
+def stream_audio(audio_file, sampling_rate=16000, block_samples=16000 * 60):
+    """Decodes and resamples an audio file with ffmpeg block by block, so that long files are never fully in memory.
+
+    Parameters
+    ----------
+    audio_file : str
+        The source audio file.
+    sampling_rate : int
+        Sampling rate of the decoded audio.
+    block_samples : int
+        Number of samples per block.
+
+    Returns
+    -------
+    Generator of 1d float32 arrays. All blocks but the last have block_samples samples.
+    """
+
+    process = subprocess.Popen([
+        "ffmpeg",
+        "-nostdin",
+        "-i", audio_file,
+        "-ar", str(sampling_rate),
+        "-ac", "1",  # stereo -> mono
+        "-f", "f32le",  # raw 32 bit float samples to stdout
+        "-"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    try:
+        while True:
+            data = process.stdout.read(block_samples * 4)
+            if len(data) == 0:
+                break
+            yield np.frombuffer(data[:len(data) // 4 * 4], dtype=np.float32)
+    finally:
+        process.stdout.close()
+        return_code = process.wait()
+
+    if return_code != 0:
+        raise subprocess.CalledProcessError(return_code, "ffmpeg")
+
+
+def iter_clips(audio, clip_samples):
+    """Yields clips of equal length from an audio array.
+
+    The clips are views into the audio array, nothing is copied. The last clip may be shorter.
+
+    Parameters
+    ----------
+    audio : np.ndarray
+        Decoded audio.
+    clip_samples : int
+        Number of samples per clip.
+
+    Returns
+    -------
+    Generator of (clip number, clip) tuples.
+    """
+
+    for clip_number, start in enumerate(range(0, len(audio), clip_samples)):
+        yield clip_number, audio[start:start + clip_samples]
+
+
 def extract_audio_clip_from_data_row(row, audio_files_folder, output_folder, overwrite_podcast_title="",
                                      correct_file_extension=False):
     """Extracts an audio clip based on a row in the manually labelled sentiment data.
@@ -41,8 +141,93 @@ def extract_audio_clip_from_data_row(row, audio_files_folder, output_folder, ove
 
 
 def extract_clips_from_data_frame(df, audio_files_folder, output_folder, correct_file_extension=False):
-    df.apply(lambda x: extract_audio_clip_from_data_row(x, audio_files_folder, output_folder,
-                                                        correct_file_extension=correct_file_extension), axis=1)
+    extract_clips_from_data_frame_batched(df, audio_files_folder, output_folder, correct_file_extension)
+
+
+def extract_clips_from_data_frame_batched(df, audio_files_folder, output_folder=None, correct_file_extension=False,
+                                          audio_features=None, praat_path=DEFAULT_PRAAT_PATH,
+                                          praat_script=DEFAULT_PRAAT_SCRIPT, max_workers=None, sampling_rate=16000):
+    """Extracts the clips of the manually labelled sentiment data, decoding every source podcast only once.
+
+    Rows are grouped by Podcast_Title. Each podcast is decoded with a single ffmpeg run and all its Start_Time/End_Time
+    segments are sliced from the decoded audio, instead of starting ffmpeg for every row. Audio features can be
+    computed in the same pass.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Labelled data with the columns Podcast_Title, Start_Time and End_Time (e.g. 00:05:14.440).
+    audio_files_folder : str
+        Folder of the source podcasts.
+    output_folder : str
+        Write the clips to this folder, named like extract_audio_clip_from_data_row names them. None keeps them in
+        memory only.
+    correct_file_extension : bool
+        Podcast titles end with the subtitle extension (".en.vtt"), see get_audio_clip_name_by_data_row.
+    audio_features : str
+        None, native (NativeAudioFeatures, in process) or praat (one Praat process per clip, run in parallel).
+    praat_path : str
+        Path to the Praat executable for the praat audio features.
+    praat_script : str
+        Praat script computing the audio features.
+    max_workers : int
+        Number of Praat processes running in parallel. None uses all available cores.
+
+    Returns
+    -------
+    Data frame with the index of df and the column Clip_Name, followed by the audio feature columns (in the order of
+    NativeAudioFeatures.AUDIO_FEATURE_NAMES) if audio features are computed. Rows whose podcast could not be decoded
+    have NaN features.
+    """
+
+    # NativeAudioFeatures imports this module.
+    import NativeAudioFeatures
+
+    clip_names = [get_audio_clip_name_by_data_row(row, correct_file_extension=correct_file_extension)[0]
+                  for _, row in df.iterrows()]
+    result = pd.DataFrame({"Clip_Name": clip_names}, index=df.index)
+    if audio_features is not None:
+        for name in NativeAudioFeatures.AUDIO_FEATURE_NAMES:
+            result[name] = np.nan
+
+    for podcast_title, df_podcast in df.groupby("Podcast_Title", sort=False):
+        podcast_file_name = podcast_title[:-7] if correct_file_extension else podcast_title
+        try:
+            audio = decode_audio(os.path.join(audio_files_folder, podcast_file_name + ".wav"), sampling_rate)
+        except (OSError, subprocess.CalledProcessError) as e:
+            print("Could not decode " + podcast_file_name + ": " + repr(e))
+            continue
+
+        clips = []
+        for start_time, end_time in zip(df_podcast["Start_Time"], df_podcast["End_Time"]):
+            start = SubtitleProcessing.parse_timestamp(start_time) * sampling_rate // 1000
+            end = SubtitleProcessing.parse_timestamp(end_time) * sampling_rate // 1000
+            clips.append(audio[start:end])
+
+        if output_folder is not None:
+            for clip_name, clip in zip(result.loc[df_podcast.index, "Clip_Name"], clips):
+                sf.write(os.path.join(output_folder, clip_name), clip, sampling_rate)
+
+        if audio_features == "native":
+            result.loc[df_podcast.index, NativeAudioFeatures.AUDIO_FEATURE_NAMES] = \
+                NativeAudioFeatures.get_audio_features_batch(clips, sampling_rate)
+        elif audio_features == "praat":
+            def extract(clip):
+                try:
+                    features = pd.to_numeric(pd.Series(get_audio_features_from_array(clip, sampling_rate, praat_path,
+                                                                                      praat_script)), errors="coerce")
+                except Exception as e:
+                    # A failing clip (Praat crash, timeout, unreadable output) must not abort the other clips.
+                    print("Could not extract audio features: " + repr(e))
+                    return None
+                return features.to_numpy() if len(features) == len(NativeAudioFeatures.AUDIO_FEATURE_NAMES) else None
+
+            with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 1) as executor:
+                for index, features in zip(df_podcast.index, executor.map(extract, clips)):
+                    if features is not None:
+                        result.loc[index, NativeAudioFeatures.AUDIO_FEATURE_NAMES] = features
+
+    return result
 
 
 def get_audio_clip_name_by_data_row(row, overwrite_podcast_title="", correct_file_extension=False):
@@ -59,7 +244,7 @@ def get_audio_clip_name_by_data_row(row, overwrite_podcast_title="", correct_fil
     return clip_name, podcast_title
 
 
-def get_audio_features(audio_file, praat_path="praat.exe", praat_script="Praat\\GetAudioFeatures.praat"):
+def get_audio_features(audio_file, praat_path="praat.exe", praat_script="Praat\\GetAudioFeatures.praat", timeout=None):
     """Extracts audio features from an audio file.
 
     Data from praat script:
@@ -74,9 +259,11 @@ def get_audio_features(audio_file, praat_path="praat.exe", praat_script="Praat\\
         Path to the Praat installation.
     praat_script : str
         The Praat script used to extract the audio features.
+    timeout : float
+        Kill Praat after this many seconds and raise subprocess.TimeoutExpired. None waits forever.
     """
 
-    result = subprocess.run([praat_path, "--run", praat_script, audio_file], capture_output=True)
+    result = subprocess.run([praat_path, "--run", praat_script, audio_file], capture_output=True, timeout=timeout)
     result_str = result.stdout.decode("utf-16")
     result_str = result_str[:-2]
     # print(repr(result_str))
@@ -84,6 +271,24 @@ def get_audio_features(audio_file, praat_path="praat.exe", praat_script="Praat\\
     return result_arr
 
 
+def get_audio_features_from_array(audio, sampling_rate, praat_path=DEFAULT_PRAAT_PATH,
+                                  praat_script=DEFAULT_PRAAT_SCRIPT, timeout=None):
+    """Extracts audio features from an audio array.
+
+    Praat can only read files, so the audio is written to a temporary wav file first.
+
+    """
+
+    file_descriptor, temp_file = tempfile.mkstemp(suffix=".wav")
+    os.close(file_descriptor)
+
+    try:
+        sf.write(temp_file, audio, sampling_rate)
+        return get_audio_features(temp_file, praat_path, praat_script, timeout)
+    finally:
+        os.remove(temp_file)
+
+
 def get_audio_features_for_data_row(row, praat_path, clip_folder):
     """Extracts audio features for a row in the labelled sentiment data set.
 
@@ -0,0 +1,475 @@
+import argparse
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import pandas as pd
+import MetadataIndex
+import PipelineCheckpoints
+from SentimentAggregation import SentimentAggregator
+
+DEFAULT_SHARD_SIZE = 10  # episodes
+DEFAULT_LEASE_SECONDS = 30 * 60
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_POLL_INTERVAL = 5  # in seconds
+SQLITE_TIMEOUT = 60  # in seconds, waiting for other processes to release the database
+EPISODE_COLUMNS = ["Date", "Author", "Title", "Views", "Episode_File_Name"]
+OUTPUT_COLUMNS = ["Date", "Author", "Title", "Coin", "Sentiment"]
+
+
+def list_episodes(audio_files_folder, start_date=None, end_date=None, metadata_index_path=None,
+                  separator=MetadataIndex.DEFAULT_FILE_NAME_SEPARATOR):
+    """Lists the downloaded episodes of a date range without loading any model.
+
+    Returns
+    -------
+    Data frame with the columns (Date, Author, Title, Views, Episode_File_Name) sorted by date.
+    """
+
+    if metadata_index_path is not None:
+        df = MetadataIndex.MetadataIndex(metadata_index_path, separator).query_episodes(start_date, end_date)
+        return df[EPISODE_COLUMNS].sort_values(["Date", "Episode_File_Name"], ignore_index=True)
+
+    episodes = []
+    for file_name in sorted(os.listdir(audio_files_folder)):
+        video_info = MetadataIndex.parse_file_name(file_name, separator) if file_name[-4:] == ".wav" else None
+        if video_info is None:
+            continue
+
+        author, date, title, views = video_info
+        if (start_date is None or date >= int(start_date)) and (end_date is None or date <= int(end_date)):
+            episodes.append([date, author, title, views, file_name])
+
+    return pd.DataFrame(episodes, columns=EPISODE_COLUMNS).sort_values(["Date", "Episode_File_Name"],
+                                                                       ignore_index=True)
+
+
+def make_shards(df_episodes, shard_size=DEFAULT_SHARD_SIZE):
+    """Splits episodes sorted by date into shards of at most shard_size episodes. A shard never spans more than one
+    month, so a month can be reprocessed on its own.
+
+    Returns
+    -------
+    List of (shard id, list of episode dicts). A shard id is the month followed by a hash of the episode file names, so
+    it only depends on the episodes of the shard.
+    """
+
+    shards = []
+    for month, df_month in df_episodes.groupby(df_episodes["Date"] // 100, sort=True):
+        records = df_month[EPISODE_COLUMNS].to_dict("records")
+        for shard_start in range(0, len(records), shard_size):
+            shard_records = records[shard_start:shard_start + shard_size]
+            episodes_hash = hashlib.sha1("\n".join(record["Episode_File_Name"] for record in shard_records)
+                                         .encode("utf-8")).hexdigest()
+            shard_id = "%d-%s" % (month, episodes_hash[:12])
+            shards.append((shard_id, [{key: (int(value) if key == "Date" else value) for key, value in record.items()}
+                                      for record in shard_records]))
+
+    return shards
+
+
+class WorkQueue:
+    """SQLite work queue of backfill shards, shared by all workers.
+
+    A worker claims a shard with a lease. If the worker dies, the lease runs out and another worker claims the shard
+    again. Failed shards and shards whose lease ran out are retried until max_attempts is reached, then they are marked
+    failed. Every episode is queued in only one shard. Use a database file on a local disk for local
+    processes or on a shared file system with working file locks (e.g. SMB or NFSv4) for several machines.
+    """
+
+    def __init__(self, path, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        :param path: Path of the SQLite database file.
+        :param max_attempts: Number of claims after which a failing shard is given up.
+        """
+
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        # isolation_level None: transactions are started explicitly, so claiming a shard is a single atomic step.
+        self.connection = sqlite3.connect(path, timeout=SQLITE_TIMEOUT, isolation_level=None, check_same_thread=False)
+
+        with self.lock:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS shards ("
+                                    "shard_id TEXT PRIMARY KEY, "
+                                    "episodes TEXT NOT NULL, "
+                                    "status TEXT NOT NULL DEFAULT 'pending', "
+                                    "attempts INTEGER NOT NULL DEFAULT 0, "
+                                    "worker TEXT, "
+                                    "lease_expires REAL, "
+                                    "result_path TEXT, "
+                                    "error TEXT)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS shards_status ON shards (status)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS episodes ("
+                                    "episode_file_name TEXT PRIMARY KEY, "
+                                    "shard_id TEXT NOT NULL)")
+
+    def publish(self, df_episodes, shard_size=DEFAULT_SHARD_SIZE):
+        """
+        Queues the episodes that are not queued yet in new shards. Existing shards are kept with their status, so
+        publishing again after new episodes were downloaded only adds the new episodes.
+
+        :param df_episodes: Data frame of episodes, see list_episodes.
+        :param shard_size: Maximum number of episodes per shard.
+        :return: Number of added shards.
+        """
+
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                queued = {row[0] for row in self.connection.execute("SELECT episode_file_name FROM episodes")}
+                shards = make_shards(df_episodes[~df_episodes["Episode_File_Name"].isin(queued)], shard_size)
+
+                added = 0
+                for shard_id, episodes in shards:
+                    added += self.connection.execute("INSERT OR IGNORE INTO shards (shard_id, episodes) VALUES (?, ?)",
+                                                     (shard_id, json.dumps(episodes))).rowcount
+                    self.connection.executemany("INSERT INTO episodes (episode_file_name, shard_id) VALUES (?, ?)",
+                                                [(episode["Episode_File_Name"], shard_id) for episode in episodes])
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+
+        return added
+
+    def expire_leases(self):
+        """Marks shards failed whose worker died on their last attempt. Must be called with the lock held."""
+
+        self.connection.execute("UPDATE shards SET status = 'failed', lease_expires = NULL, "
+                                "error = COALESCE(error, 'Lease of ' || worker || ' expired') "
+                                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                                (time.time(), self.max_attempts))
+
+    def claim(self, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Leases the next pending shard (or a shard whose lease expired).
+
+        :param worker: Name of the worker.
+        :return: (shard id, list of episode dicts) or None if no shard is available.
+        """
+
+        now = time.time()
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                self.expire_leases()
+                row = self.connection.execute(
+                    "SELECT shard_id, episodes FROM shards WHERE attempts < ? AND (status = 'pending' OR "
+                    "(status = 'leased' AND lease_expires < ?)) ORDER BY shard_id LIMIT 1",
+                    (self.max_attempts, now)).fetchone()
+                if row is not None:
+                    self.connection.execute("UPDATE shards SET status = 'leased', attempts = attempts + 1, worker = ?, "
+                                            "lease_expires = ? WHERE shard_id = ?",
+                                            (worker, now + lease_seconds, row[0]))
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+
+        if row is None:
+            return None
+
+        return row[0], json.loads(row[1])
+
+    def renew(self, shard_id, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Extends the lease of a shard. Returns False if the worker lost the lease."""
+
+        with self.lock:
+            return self.connection.execute("UPDATE shards SET lease_expires = ? WHERE shard_id = ? AND worker = ? AND "
+                                           "status = 'leased'", (time.time() + lease_seconds, shard_id,
+                                                                 worker)).rowcount == 1
+
+    def complete(self, shard_id, worker, result_path):
+        """Marks a leased shard done. Returns False if the worker lost the lease."""
+
+        with self.lock:
+            return self.connection.execute("UPDATE shards SET status = 'done', result_path = ?, lease_expires = NULL, "
+                                           "error = NULL WHERE shard_id = ? AND worker = ? AND status = 'leased'",
+                                           (result_path, shard_id, worker)).rowcount == 1
+
+    def fail(self, shard_id, worker, error):
+        """Releases a shard after an error. It is retried until max_attempts claims failed."""
+
+        with self.lock:
+            self.connection.execute("UPDATE shards SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' "
+                                    "END, lease_expires = NULL, error = ? WHERE shard_id = ? AND worker = ? AND "
+                                    "status = 'leased'",
+                                    (self.max_attempts, error, shard_id, worker))
+
+    def reset_failed(self):
+        """Makes failed shards pending again with fresh attempts. Returns the number of reset shards."""
+
+        with self.lock:
+            self.expire_leases()
+            return self.connection.execute("UPDATE shards SET status = 'pending', attempts = 0 "
+                                           "WHERE status = 'failed'").rowcount
+
+    def get_status(self):
+        """Returns a dict of status -> number of shards."""
+
+        with self.lock:
+            self.expire_leases()
+            return dict(self.connection.execute("SELECT status, COUNT(*) FROM shards GROUP BY status").fetchall())
+
+    def is_finished(self):
+        """Returns True if every shard is done or failed for good, no shard is pending, leased or can be retried."""
+
+        with self.lock:
+            self.expire_leases()
+            return self.connection.execute("SELECT COUNT(*) FROM shards WHERE status IN ('pending', 'leased')"
+                                           ).fetchone()[0] == 0
+
+    def get_results(self):
+        """Returns the result paths of all done shards, ordered by shard id."""
+
+        with self.lock:
+            return [row[0] for row in self.connection.execute("SELECT result_path FROM shards WHERE status = 'done' "
+                                                              "ORDER BY shard_id")]
+
+    def close(self):
+        self.connection.close()
+
+
+def run_worker(queue_path, output_folder, pipeline, clip_extraction_method="ffmpeg", checkpoint_folder=None,
+               worker=None, lease_seconds=DEFAULT_LEASE_SECONDS, aggregator_weight="clips",
+               poll_interval=DEFAULT_POLL_INTERVAL, wait=False):
+    """Claims and processes shards until the queue is empty.
+
+    Every finished shard is written to output_folder as <shard id>.pkl holding a dict with the labelled clips ("df") and
+    a SentimentAggregator ("aggregator"). The lease is renewed in the background while a shard is processed. A worker
+    that lost the lease of a shard (e.g. after a long pause) abandons it without writing a result, another worker
+    claimed it again.
+
+    Parameters
+    ----------
+    queue_path : str
+        SQLite file of the WorkQueue.
+    output_folder : str
+        Folder for the shard results, shared by all workers.
+    pipeline : SentimentAnalysisPipeline
+        Pipeline processing the episodes. Its audio files folder must contain the episodes of the shards.
+    checkpoint_folder : str
+        Stage checkpoints, so a retried shard resumes its episodes. None disables checkpoints.
+    worker : str
+        Name of the worker. Defaults to host name and process id.
+    wait : bool
+        Keep polling while other workers hold leases, to take over shards of workers that die.
+
+    Returns
+    -------
+    Number of shards processed by this worker.
+    """
+
+    worker = worker or socket.gethostname() + ":" + str(os.getpid())
+    work_queue = WorkQueue(queue_path)
+    checkpoints = PipelineCheckpoints.CheckpointStore(checkpoint_folder) if checkpoint_folder is not None else None
+    os.makedirs(output_folder, exist_ok=True)
+
+    processed = 0
+    while True:
+        shard = work_queue.claim(worker, lease_seconds)
+        if shard is None:
+            if wait and not work_queue.is_finished():
+                time.sleep(poll_interval)
+                continue
+            break
+
+        shard_id, episodes = shard
+        print("Worker " + worker + " processing shard " + shard_id + " (" + str(len(episodes)) + " episodes)")
+
+        stop_renewing = threading.Event()
+        lease_lost = threading.Event()
+
+        def renew_lease():
+            while not stop_renewing.wait(lease_seconds / 3):
+                if not work_queue.renew(shard_id, worker, lease_seconds):
+                    lease_lost.set()
+                    return
+
+        renewer = threading.Thread(target=renew_lease, daemon=True)
+        renewer.start()
+
+        try:
+            aggregator = SentimentAggregator(aggregator_weight)
+            episode_dfs = []
+            for episode in episodes:
+                if lease_lost.is_set():
+                    break
+                row = pd.Series(episode)
+                df = pipeline.process_episode(row, clip_extraction_method, checkpoints=checkpoints)
+                aggregator.add(df, episode["Episode_File_Name"][:-4])
+                episode_dfs.append(df[OUTPUT_COLUMNS])
+
+            # Renewing right before writing keeps the lease for the whole write.
+            if lease_lost.is_set() or not work_queue.renew(shard_id, worker, lease_seconds):
+                print("Worker " + worker + " lost the lease of shard " + shard_id)
+                continue
+
+            df_shard = pd.concat(episode_dfs, ignore_index=True) if len(episode_dfs) > 0 \
+                else pd.DataFrame(columns=OUTPUT_COLUMNS)
+            result_path = write_result(output_folder, shard_id, df_shard, aggregator)
+        except Exception as e:
+            print("Shard " + shard_id + " failed: " + repr(e))
+            work_queue.fail(shard_id, worker, repr(e))
+            continue
+        finally:
+            stop_renewing.set()
+            renewer.join()
+
+        if work_queue.complete(shard_id, worker, result_path):
+            processed += 1
+
+    work_queue.close()
+    return processed
+
+
+def write_result(output_folder, shard_id, df, aggregator):
+    """Writes a shard result atomically and returns its path."""
+
+    result_path = os.path.join(output_folder, shard_id + ".pkl")
+    temp_path = result_path + "." + str(os.getpid()) + ".tmp"
+    pd.to_pickle({"df": df, "aggregator": aggregator}, temp_path)
+    os.replace(temp_path, result_path)
+
+    return result_path
+
+
+def merge(queue_path, output_folder=None):
+    """Combines the results of all done shards.
+
+    Parameters
+    ----------
+    queue_path : str
+        SQLite file of the WorkQueue.
+    output_folder : str
+        If given, the combined clips are written to sentiments.csv and the aggregator to aggregator.pkl in this folder.
+
+    Returns
+    -------
+    Tuple of the data frame (Date, Author, Title, Coin, Sentiment) of all shards and the merged SentimentAggregator.
+    """
+
+    work_queue = WorkQueue(queue_path)
+    result_paths = work_queue.get_results()
+    work_queue.close()
+
+    dfs = []
+    aggregator = None
+    for result_path in result_paths:
+        result = pd.read_pickle(result_path)
+        dfs.append(result["df"])
+        if aggregator is None:
+            aggregator = result["aggregator"]
+        else:
+            aggregator.merge(result["aggregator"])
+
+    df = pd.concat(dfs, ignore_index=True) if len(dfs) > 0 else pd.DataFrame(columns=OUTPUT_COLUMNS)
+    aggregator = aggregator or SentimentAggregator()
+
+    if output_folder is not None:
+        os.makedirs(output_folder, exist_ok=True)
+        df.to_csv(os.path.join(output_folder, "sentiments.csv"), index=False)
+        aggregator.save(os.path.join(output_folder, "aggregator.pkl"))
+
+    return df, aggregator
+
+
+def run_local(arguments, workers):
+    """Starts workers as local processes running this script and waits for them. Returns their exit codes."""
+
+    processes = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "work"] + arguments
+                                  + ["--worker", socket.gethostname() + ":local-" + str(i)])
+                 for i in range(workers)]
+
+    return [process.wait() for process in processes]
+
+
+def get_worker_arguments(args):
+    """Returns the command line arguments giving the workers of the local command the same settings."""
+
+    worker_arguments = []
+    for name, value in vars(args).items():
+        if name in ["command", "workers", "worker"] or value is None or value is False:
+            continue
+        flag = "--" + name.replace("_", "-")
+        worker_arguments += [flag] if value is True else [flag, str(value)]
+
+    return worker_arguments
+
+
+def create_pipeline(args):
+    from CryptoSentimentAnalysis import SentimentAnalysisPipeline
+
+    return SentimentAnalysisPipeline(audio_files_folder=args.audio_files_folder,
+                                     clips_folder=args.clips_folder,
+                                     wav2vec_model=args.wav2vec_model,
+                                     offline=args.offline,
+                                     sentiment_model=args.sentiment_model,
+                                     sentiment_vectorizer=args.sentiment_vectorizer,
+                                     use_audio_features=not args.no_audio_features,
+                                     audio_feature_backend=args.audio_feature_backend,
+                                     metadata_index_path=args.metadata_index,
+                                     num_threads=args.num_threads)
+
+
+if __name__ == '__main__':
+    from CryptoSentimentAnalysis import SentimentAnalysisPipeline
+
+    parser = argparse.ArgumentParser(description="Backfill sentiments with any number of worker processes or machines "
+                                                 "sharing a SQLite work queue.")
+    parser.add_argument("command", choices=["publish", "work", "merge", "status", "retry", "local"],
+                        help="publish shards, work on shards, merge the results, show the queue status, retry failed "
+                             "shards or run publish, several local workers and merge at once.")
+    parser.add_argument("--queue", required=True, help="SQLite file of the work queue.")
+    parser.add_argument("--output-folder", default=os.path.join("data", "backfill"))
+    parser.add_argument("--start-date", default=None)
+    parser.add_argument("--end-date", default=None)
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE)
+    parser.add_argument("--workers", type=int, default=2, help="Local worker processes of the local command.")
+    parser.add_argument("--worker", default=None)
+    parser.add_argument("--wait", action="store_true", help="Keep waiting for shards leased by other workers.")
+    parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS)
+    parser.add_argument("--clip-extraction-method", default="memory",
+                        choices=["ffmpeg", "memory", "vad", "wav2vec", "longform"])
+    parser.add_argument("--checkpoint-folder", default=None)
+    parser.add_argument("--audio-files-folder", default=SentimentAnalysisPipeline.DEFAULT_AUDIO_FILES_FOLDER)
+    parser.add_argument("--clips-folder", default=SentimentAnalysisPipeline.DEFAULT_CLIP_FOLDER)
+    parser.add_argument("--metadata-index", default=None)
+    parser.add_argument("--wav2vec-model", default=SentimentAnalysisPipeline.DEFAULT_WAV2VEC_REPOSITORY)
+    parser.add_argument("--offline", action="store_true")
+    parser.add_argument("--sentiment-model", default=None)
+    parser.add_argument("--sentiment-vectorizer", default=None)
+    parser.add_argument("--no-audio-features", action="store_true")
+    parser.add_argument("--audio-feature-backend", default=SentimentAnalysisPipeline.DEFAULT_AUDIO_FEATURE_BACKEND,
+                        choices=["praat", "native"])
+    parser.add_argument("--num-threads", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command in ["publish", "local"]:
+        df_listed_episodes = list_episodes(args.audio_files_folder, args.start_date, args.end_date, args.metadata_index)
+        print("Published " + str(WorkQueue(args.queue).publish(df_listed_episodes, args.shard_size)) + " new shards")
+
+    if args.command == "local":
+        print("Worker exit codes: " + str(run_local(get_worker_arguments(args), args.workers)))
+
+    if args.command == "work":
+        shard_count = run_worker(args.queue, os.path.join(args.output_folder, "shards"), create_pipeline(args),
+                                 args.clip_extraction_method, args.checkpoint_folder, args.worker, args.lease_seconds,
+                                 wait=args.wait)
+        print("Processed " + str(shard_count) + " shards")
+
+    if args.command == "retry":
+        print("Reset " + str(WorkQueue(args.queue).reset_failed()) + " failed shards")
+
+    if args.command in ["merge", "local"]:
+        merged_df, _ = merge(args.queue, args.output_folder)
+        print("Merged " + str(len(merged_df)) + " labelled clips into " + args.output_folder)
+
+    if args.command in ["status", "local"]:
+        print(WorkQueue(args.queue).get_status())
@@ -0,0 +1,404 @@
+import argparse
+import json
+import os
+import pickle
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import soundfile as sf
+import torch
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.neural_network import MLPClassifier
+import AudioFeatureExtraction
+import PriceEvaluation
+import Segmentation
+import SubtitleProcessing
+from CryptoSentimentAnalysis import SentimentAnalysisPipeline
+
+SAMPLING_RATE = 16000
+DEFAULT_EPISODES = 3
+DEFAULT_EPISODE_LENGTH = 120  # in seconds
+DEFAULT_SEED = 0
+DEFAULT_REPORT_FILE = "benchmark_report.json"
+DEFAULT_TOLERANCE = 0.2  # relative throughput loss reported as regression
+
+# Words of the synthetic subtitles. The coin keywords make sure every stage after coin tagging gets clips.
+VOCABULARY = ["the", "market", "price", "is", "going", "up", "down", "today", "we", "think", "buy", "sell", "hold",
+              "bitcoin", "btc", "ethereum", "eth", "doge", "dogecoin", "moon", "crash", "support", "resistance",
+              "bullish", "bearish", "chart", "week", "trend", "really", "big", "news"]
+SENTIMENTS = ["bullish", "neutral", "bearish"]
+CTC_VOCABULARY = ["<pad>", "<s>", "</s>", "<unk>", "|"] + list("abcdefghijklmnopqrstuvwxyz'")
+
+
+def synthesize_speech(duration, rng, sampling_rate=SAMPLING_RATE):
+    """Generates a deterministic speech-like signal: voiced phrases with syllable rhythm and pitch movement, separated
+    by pauses over a low noise floor.
+
+    Returns
+    -------
+    Tuple of the float32 audio and a list of (start, end) of the phrases in seconds.
+    """
+
+    audio = rng.normal(0, 0.001, int(duration * sampling_rate)).astype(np.float32)
+    phrases = []
+
+    position = rng.uniform(0.2, 1.0)
+    while position < duration - 1:
+        length = min(rng.uniform(1.5, 6.0), duration - position)
+        first = int(position * sampling_rate)
+        t = np.arange(int(length * sampling_rate)) / sampling_rate
+
+        # Pitch glides around a speaker dependent base frequency, syllables at about 4 per second.
+        pitch = rng.uniform(100, 220) * (1 + 0.1 * np.sin(2 * np.pi * rng.uniform(0.2, 0.6) * t))
+        phase = 2 * np.pi * np.cumsum(pitch) / sampling_rate
+        envelope = np.sin(np.pi * rng.uniform(3.0, 5.0) * t) ** 2
+        voiced = sum(np.sin(harmonic * phase) / harmonic for harmonic in range(1, 9))
+
+        audio[first:first + len(t)] += (0.1 * envelope * voiced).astype(np.float32)
+        phrases.append((position, position + length))
+        position += length + rng.uniform(0.2, 1.5)
+
+    return audio, phrases
+
+
+def write_vtt(vtt_file, phrases, rng):
+    """Writes a WebVTT file with a cue of random words for every phrase."""
+
+    with open(vtt_file, "w", encoding="utf-8") as vtt:
+        vtt.write("WEBVTT\n\n")
+        for start, end in phrases:
+            words = rng.choice(VOCABULARY, max(int((end - start) * 2.5), 1))
+            vtt.write(SubtitleProcessing.format_timestamp(start * 1000) + " --> "
+                      + SubtitleProcessing.format_timestamp(end * 1000) + "\n" + " ".join(words) + "\n\n")
+
+
+def make_fixtures(folder, episodes=DEFAULT_EPISODES, episode_length=DEFAULT_EPISODE_LENGTH, seed=DEFAULT_SEED,
+                  separator=SentimentAnalysisPipeline.DEFAULT_FILE_NAME_SEPARATOR):
+    """Writes synthetic episodes (16 kHz wav files named like downloads) and their English subtitles.
+
+    Returns
+    -------
+    List of paths of the audio files.
+    """
+
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    audio_files = []
+    for episode in range(episodes):
+        base_name = separator.join(["Benchmark Channel", "202101%02d" % (episode + 1), "Episode %d" % episode,
+                                    str(1000 * (episode + 1))])
+        audio, phrases = synthesize_speech(episode_length, rng)
+
+        audio_file = os.path.join(folder, base_name + ".wav")
+        sf.write(audio_file, audio, SAMPLING_RATE)
+        write_vtt(os.path.join(folder, base_name + ".en.vtt"), phrases, rng)
+        audio_files.append(audio_file)
+
+    return audio_files
+
+
+def make_tiny_wav2vec(folder, seed=DEFAULT_SEED):
+    """Builds a small randomly initialized Wav2Vec2 CTC model with a character vocabulary, no download needed. Its
+    transcripts are meaningless, but it runs the same code paths as the real model.
+
+    Returns
+    -------
+    Tuple of the processor and the model.
+    """
+
+    from transformers import (Wav2Vec2Config, Wav2Vec2CTCTokenizer, Wav2Vec2FeatureExtractor, Wav2Vec2ForCTC,
+                              Wav2Vec2Processor)
+
+    os.makedirs(folder, exist_ok=True)
+    vocab_file = os.path.join(folder, "vocab.json")
+    with open(vocab_file, "w") as vocab:
+        json.dump({token: token_id for token_id, token in enumerate(CTC_VOCABULARY)}, vocab)
+
+    tokenizer = Wav2Vec2CTCTokenizer(vocab_file, unk_token="<unk>", pad_token="<pad>", word_delimiter_token="|")
+    feature_extractor = Wav2Vec2FeatureExtractor(feature_size=1, sampling_rate=SAMPLING_RATE, padding_value=0.0,
+                                                 do_normalize=True, return_attention_mask=False)
+
+    torch.manual_seed(seed)
+    config = Wav2Vec2Config(vocab_size=len(CTC_VOCABULARY), hidden_size=64, num_hidden_layers=2,
+                            num_attention_heads=2, intermediate_size=128, conv_dim=(32,) * 7,
+                            num_conv_pos_embeddings=16, num_conv_pos_embedding_groups=4,
+                            pad_token_id=tokenizer.pad_token_id)
+    model = Wav2Vec2ForCTC(config).eval()
+
+    return Wav2Vec2Processor(feature_extractor=feature_extractor, tokenizer=tokenizer), model
+
+
+def make_sentiment_model(folder, seed=DEFAULT_SEED):
+    """Trains a TF-IDF vectorizer and a small MLP on random texts and audio features and pickles them.
+
+    Returns
+    -------
+    Tuple of the paths of the vectorizer and the model.
+    """
+
+    rng = np.random.default_rng(seed)
+    texts = [" ".join(rng.choice(VOCABULARY, 20)) for _ in range(300)]
+    labels = rng.choice(SENTIMENTS, len(texts))
+
+    vectorizer = TfidfVectorizer().fit(texts)
+    audio_features = rng.normal(size=(len(texts), len(SentimentAnalysisPipeline.SENTIMENT_AUDIO_FEATURE_COLUMNS)))
+    model_input = np.hstack([vectorizer.transform(texts).toarray(), audio_features])
+    model = MLPClassifier(hidden_layer_sizes=(16,), max_iter=50, random_state=seed).fit(model_input, labels)
+
+    vectorizer_path = os.path.join(folder, "tfidf_vectorizer.pkl")
+    model_path = os.path.join(folder, "sentiment_model.pkl")
+    for path, value in [(vectorizer_path, vectorizer), (model_path, model)]:
+        with open(path, "wb") as model_file:
+            pickle.dump(value, model_file)
+
+    return vectorizer_path, model_path
+
+
+def make_prices(coins, dates, seed=DEFAULT_SEED):
+    """Generates random walk prices in the layout of PriceEvaluation.load_prices."""
+
+    rng = np.random.default_rng(seed)
+    index = pd.DatetimeIndex(dates, name="Date")
+    return pd.concat({coin: pd.DataFrame({"Close": 100 * np.exp(np.cumsum(rng.normal(0, 0.03, len(index))))},
+                                         index=index) for coin in coins}, axis=1, names=["Coin", "Field"])
+
+
+def reset_peak_rss():
+    """Resets the peak resident set size of the process, so the next get_peak_rss measures only what runs in between.
+
+    Returns
+    -------
+    True if the peak was reset (Linux), False if get_peak_rss keeps reporting the peak of the whole process lifetime.
+    """
+
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def get_peak_rss():
+    """Returns the peak resident set size of the process in bytes since the last reset_peak_rss, or None where it is
+    not available (Windows)."""
+
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def measure(results, stage, function, items=None, audio_seconds=None):
+    """Runs function once, appends its timing and peak memory to results and returns its output.
+
+    peak_rss is the peak of the stage if peak_rss_scope is "stage". Where the peak cannot be reset it is the peak of the
+    process up to the end of the stage (peak_rss_scope "process").
+    """
+
+    peak_rss_scope = "stage" if reset_peak_rss() else "process"
+    start_time = time.perf_counter()
+    output = function()
+    seconds = time.perf_counter() - start_time
+
+    result = {"stage": stage, "seconds": seconds, "items": items, "items_per_second": None,
+              "audio_seconds_per_second": None, "peak_rss": get_peak_rss(), "peak_rss_scope": peak_rss_scope}
+    if items is not None:
+        result["items_per_second"] = items / seconds if seconds > 0 else None
+    if audio_seconds is not None:
+        result["audio_seconds_per_second"] = audio_seconds / seconds if seconds > 0 else None
+
+    results.append(result)
+    print("%-20s %8.3f s  %s items/s" % (stage, seconds, "-" if result["items_per_second"] is None
+                                          else "%.1f" % result["items_per_second"]))
+    return output
+
+
+def get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(work_folder, episodes=DEFAULT_EPISODES, episode_length=DEFAULT_EPISODE_LENGTH, seed=DEFAULT_SEED,
+        audio_feature_backend="native", clip_length=SentimentAnalysisPipeline.DEFAULT_CLIP_LENGTH):
+    """Times every stage of the pipeline on its own and end to end on synthetic fixtures.
+
+    Parameters
+    ----------
+    work_folder : str
+        Folder for the fixtures, models and clips.
+    episodes : int
+        Number of synthetic episodes.
+    episode_length : float
+        Length of every episode in seconds.
+    seed : int
+        Seed of the fixtures and models. Equal seeds give equal inputs.
+    audio_feature_backend : str
+        native or praat (requires a Praat installation).
+    clip_length : int
+        Length of the clips in seconds.
+
+    Returns
+    -------
+    Report dict with the settings, environment and one result per stage (seconds, items, items_per_second,
+    audio_seconds_per_second, peak_rss in bytes and peak_rss_scope, see measure).
+    """
+
+    audio_folder = os.path.join(work_folder, "audio")
+    clips_folder = os.path.join(work_folder, "clips")
+    models_folder = os.path.join(work_folder, "models")
+    os.makedirs(clips_folder, exist_ok=True)
+
+    audio_files = make_fixtures(audio_folder, episodes, episode_length, seed)
+    processor, model = make_tiny_wav2vec(models_folder, seed)
+    vectorizer_path, model_path = make_sentiment_model(models_folder, seed)
+
+    pipeline = SentimentAnalysisPipeline(audio_files_folder=audio_folder, clips_folder=clips_folder,
+                                         clip_length=clip_length, wav2vec_model=model, wav2vec_processor=processor,
+                                         sentiment_model=model_path, sentiment_vectorizer=vectorizer_path,
+                                         audio_feature_backend=audio_feature_backend, wav2vec_version="benchmark")
+    pipeline.warm_up()
+
+    audios = [AudioFeatureExtraction.decode_audio(audio_file, SAMPLING_RATE) for audio_file in audio_files]
+    audio_seconds = sum(len(audio) for audio in audios) / SAMPLING_RATE
+    results = []
+
+    segments = measure(results, "segmentation",
+                       lambda: [Segmentation.segment_on_pauses(audio, clip_length, SAMPLING_RATE) for audio in audios],
+                       audio_seconds=audio_seconds)
+    print("%d speech clips" % sum(len(episode_segments) for episode_segments in segments))
+
+    # Equal length clips in the clips folder, like the ffmpeg clip extraction method writes them.
+    clip_files = []
+    clips = []
+    for audio_file, audio in zip(audio_files, audios):
+        for clip_number, clip in AudioFeatureExtraction.iter_clips(audio, clip_length * SAMPLING_RATE):
+            clip_file = os.path.basename(audio_file)[:-4] + pipeline.separator + "%04d" % clip_number + ".wav"
+            sf.write(os.path.join(clips_folder, clip_file), clip, SAMPLING_RATE)
+            clip_files.append(clip_file)
+            clips.append(clip)
+
+    measure(results, "wav2vec_output", lambda: pipeline.get_wav2vec_outputs(clip_files), len(clip_files),
+            audio_seconds)
+
+    subtitle_files = [SubtitleProcessing.find_subtitle_file(audio_file) for audio_file in audio_files]
+    subtitle_words = measure(results, "vtt_parsing",
+                             lambda: [SubtitleProcessing.read_subtitle_words(subtitle_file)
+                                      for subtitle_file in subtitle_files], len(subtitle_files))
+
+    # The tiny model transcribes gibberish, label the subtitle text of every clip instead.
+    texts = []
+    for (words, starts, ends), audio in zip(subtitle_words, audios):
+        clip_starts = np.arange(0, len(audio), clip_length * SAMPLING_RATE) / SAMPLING_RATE * 1000
+        clip_ends = np.minimum(clip_starts + clip_length * 1000, len(audio) / SAMPLING_RATE * 1000)
+        clip_texts, _ = SubtitleProcessing.align_words_to_clips(words, starts, ends, clip_starts, clip_ends)
+        texts.extend(text or "" for text in clip_texts)
+
+    coins = measure(results, "auto_label_text_chunk",
+                    lambda: [SubtitleProcessing.auto_label_text_chunk(text, pipeline.TEXT_COIN_LABELS)
+                             for text in texts], len(texts))
+
+    df_clips = pd.DataFrame({"Clip_Id": ["%04d" % i for i in range(len(clips))], "File_Name": clip_files,
+                             "Text": texts, "Coin": [coin if coin in pipeline.coins else "BTC" for coin in coins]})
+    # The method the audio_features stage of the pipeline runs, it dispatches on the audio feature backend.
+    df_features = measure(results, "audio_features", lambda: pipeline.get_audio_features_df_parallel(df_clips),
+                          len(df_clips), audio_seconds)
+
+    df_prediction = pd.concat([df_clips, df_features], axis=1)
+    sentiments = measure(results, "predict_sentiments", lambda: pipeline.predict_sentiments(df_prediction),
+                         len(df_prediction))
+
+    # A year of daily sentiments for the price join, so the join and not the fixture size dominates.
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2021-01-01", periods=365, freq="D")
+    df_sentiments = pd.DataFrame({"Date": rng.choice(dates.strftime("%Y%m%d").astype(int), 10000),
+                                  "Coin": rng.choice(["BTC", "ETH", "DOGE"], 10000),
+                                  "Sentiment": rng.choice(list(sentiments) or SENTIMENTS, 10000)})
+    prices = make_prices(["BTC", "ETH", "DOGE"], dates, seed)
+    measure(results, "price_join", lambda: PriceEvaluation.evaluate(df_sentiments, prices), len(df_sentiments))
+
+    for clip_file in clip_files:
+        os.remove(os.path.join(clips_folder, clip_file))
+    measure(results, "end_to_end", lambda: pipeline.get_sentiments(clip_extraction_method="memory"), len(clips),
+            audio_seconds)
+
+    return {"commit": get_commit(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "torch_threads": torch.get_num_threads(),
+            "settings": {"episodes": episodes, "episode_length": episode_length, "seed": seed,
+                         "audio_feature_backend": audio_feature_backend, "clip_length": clip_length},
+            "stages": results}
+
+
+def compare_reports(baseline, report, tolerance=DEFAULT_TOLERANCE):
+    """Compares the stage timings of two reports made with the same settings.
+
+    Returns
+    -------
+    Data frame with the columns (Stage, Baseline_Seconds, Seconds, Change, Regression). Change is the relative change
+    of the time, Regression marks stages that got slower by more than tolerance.
+    """
+
+    if baseline["settings"] != report["settings"]:
+        print("Warning: the reports were made with different settings.")
+
+    baseline_seconds = {result["stage"]: result["seconds"] for result in baseline["stages"]}
+    rows = []
+    for result in report["stages"]:
+        if result["stage"] in baseline_seconds:
+            change = result["seconds"] / baseline_seconds[result["stage"]] - 1
+            rows.append([result["stage"], baseline_seconds[result["stage"]], result["seconds"], change,
+                         change > tolerance])
+
+    return pd.DataFrame(rows, columns=["Stage", "Baseline_Seconds", "Seconds", "Change", "Regression"])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the sentiment analysis pipeline on synthetic audio and "
+                                                 "subtitles with a tiny local speech to text model.")
+    parser.add_argument("--output", default=DEFAULT_REPORT_FILE, help="JSON report file.")
+    parser.add_argument("--compare", default=None, help="Earlier JSON report. Exits with 1 on a regression.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--episodes", type=int, default=DEFAULT_EPISODES)
+    parser.add_argument("--episode-length", type=float, default=DEFAULT_EPISODE_LENGTH)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--audio-feature-backend", default="native", choices=["native", "praat"])
+    parser.add_argument("--work-folder", default=None, help="Defaults to a temporary folder.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_folder:
+        benchmark_report = run(args.work_folder or temp_folder, args.episodes, args.episode_length, args.seed,
+                               args.audio_feature_backend)
+
+    with open(args.output, "w") as report_file:
+        json.dump(benchmark_report, report_file, indent=2)
+    print("Report written to " + args.output)
+
+    if args.compare is not None:
+        with open(args.compare) as baseline_file:
+            comparison = compare_reports(json.load(baseline_file), benchmark_report, args.tolerance)
+        print(comparison.to_string(index=False))
+        if comparison["Regression"].any():
+            sys.exit(1)
@@ -1,16 +1,35 @@
 import subprocess
 import numpy as np
 import pandas as pd
+import scipy.sparse
 import torch
 import soundfile as sf
-from transformers import Wav2Vec2Processor, Wav2Vec2ForCTC
 from sklearn.feature_extraction.text import TfidfVectorizer
-import pickle
+import hashlib
 import os
 from os import listdir
+from concurrent.futures import ThreadPoolExecutor
 import VideoDownloader
 import AudioFeatureExtraction
 import SubtitleProcessing
+import NativeAudioFeatures
+import FeatureCache
+import PipelineCheckpoints
+import ModelRegistry
+import MetadataIndex
+import Segmentation
+import Wav2VecBackends
+import PipelineExecutor
+import Instrumentation
+
+
+def to_object_array(values):
+    """Returns a 1d object array of values. Avoids numpy turning a list of equally long arrays into a 2d array."""
+
+    array = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        array[i] = value
+    return array
 
 
 class SentimentAnalysisPipeline:
@@ -19,10 +38,29 @@ class SentimentAnalysisPipeline:
     DEFAULT_WAV2VEC_REPOSITORY = "distractedm1nd/wav2vec-en-finetuned-on-cryptocurrency"
     DEFAULT_CLIP_LENGTH = 15  # in seconds
     DEFAULT_COINS = ["BTC", "ETH", "DOGE"]
-    DEFAULT_PRAAT_PATH = "praat.exe",
-    DEFAULT_PRAAT_SCRIPT = os.path.join("praat", "GetAudioFeatures.praat")
+    DEFAULT_PRAAT_PATH = AudioFeatureExtraction.DEFAULT_PRAAT_PATH
+    DEFAULT_PRAAT_SCRIPT = AudioFeatureExtraction.DEFAULT_PRAAT_SCRIPT
     DEFAULT_FILE_NAME_SEPARATOR = "-sep-"
     DEFAULT_MAX_DOWNLOADS_PER_PLAYLIST = 50
+    DEFAULT_WAV2VEC_BATCH_SIZE = 8
+    DEFAULT_SAMPLING_RATE = 16_000
+    DEFAULT_AUDIO_FEATURE_TIMEOUT = 60  # in seconds
+    DEFAULT_AUDIO_FEATURE_BACKEND = "praat"
+    NATIVE_AUDIO_FEATURE_BATCH_SIZE = 64
+    DEFAULT_PREDICTION_CHUNK_SIZE = 4096
+    DEFAULT_INFERENCE_BACKEND = "torch"
+    # Window and stride on each side of the window for long-form transcription, in seconds.
+    LONG_FORM_WINDOW_LENGTH = 30
+    LONG_FORM_STRIDE_LENGTH = 5
+    # Parallel episodes decoded and cut into clips, and episodes waiting between two stages of the pipelined executor.
+    DEFAULT_DECODE_WORKERS = 2
+    DEFAULT_PIPELINE_QUEUE_SIZE = 2
+    # Subtitle text is only used for a clip if its words per second are in this range and it is not mostly annotations.
+    SUBTITLE_MIN_WORDS_PER_SECOND = 0.8
+    SUBTITLE_MAX_WORDS_PER_SECOND = 6.0
+    SUBTITLE_MAX_ANNOTATION_RATIO = 0.2
+    SENTIMENT_AUDIO_FEATURE_COLUMNS = ["Pitch_05_Quantile", "Pitch_95_Quantile", "Pitch_Range", "Pitch_Median",
+                                       "Pitch_Stdev", "Jitter", "Shimmer", "Hammarberg_Index"]
 
     BTC_FILTER = ["bitcoin", "btc"]
     ETH_FILTER = ["ethereum", " eth "]
@@ -33,6 +71,18 @@ class SentimentAnalysisPipeline:
         "BTC": BTC_FILTER
     }
 
+    AUDIO_FEATURE_COLUMNS = NativeAudioFeatures.AUDIO_FEATURE_NAMES
+
+    # Clip extraction methods that decode the audio file once and keep the clips in memory.
+    IN_MEMORY_CLIP_EXTRACTION_METHODS = ["memory", "vad", "wav2vec", "longform"]
+
+    # Stages that are run for every episode, in order. Each stage can be checkpointed.
+    EPISODE_STAGES = ["clips", "text", "coins", "audio_features", "sentiments"]
+
+    # Worker pools of the pipelined executor and the episode stages they run.
+    EXECUTOR_STAGES = {"decode": ["clips"], "asr": ["text", "coins"], "audio_features": ["audio_features"],
+                       "prediction": ["sentiments"]}
+
     def __init__(self,
                  coins=DEFAULT_COINS,
                  audio_files_folder=DEFAULT_AUDIO_FILES_FOLDER,
@@ -45,7 +95,23 @@ class SentimentAnalysisPipeline:
                  wav2vec_processor=None,
                  sentiment_model=None,
                  sentiment_vectorizer=None,
-                 use_audio_features=True):
+                 use_audio_features=True,
+                 wav2vec_batch_size=DEFAULT_WAV2VEC_BATCH_SIZE,
+                 num_threads=None,
+                 audio_feature_workers=None,
+                 audio_feature_timeout=DEFAULT_AUDIO_FEATURE_TIMEOUT,
+                 audio_feature_backend=DEFAULT_AUDIO_FEATURE_BACKEND,
+                 cache_path=None,
+                 cache_max_size=FeatureCache.DEFAULT_MAX_SIZE,
+                 wav2vec_version=None,
+                 offline=False,
+                 prediction_chunk_size=DEFAULT_PREDICTION_CHUNK_SIZE,
+                 download_workers=VideoDownloader.DEFAULT_MAX_WORKERS,
+                 metadata_index_path=None,
+                 use_subtitles=False,
+                 inference_backend=DEFAULT_INFERENCE_BACKEND,
+                 onnx_path=None,
+                 instrumentation_sinks=None):
 
         """
         Initializes the crypto sentiment analysis pipeline
@@ -58,10 +124,33 @@ class SentimentAnalysisPipeline:
         :param praat_script: Path to the Praat installation.
         :param praat_path: The Praat script used for the audio feature extraction.
         :param separator: Separator used in filenames
-        :param wav2vec_model: Trained speech to text model.
+        :param wav2vec_model: Trained speech to text model, or the Hub repository / local directory to load it from.
         :param wav2vec_processor: Trained wav2vec processor.
         :param sentiment_model: Trained sentiment analysis model.
         :param use_audio_features: Use audio features for sentiment labelling.
+        :param wav2vec_batch_size: Number of clips transcribed in one forward pass.
+        :param num_threads: Number of threads used by torch for inference. None keeps the torch default.
+        :param audio_feature_workers: Number of Praat processes running in parallel. None uses all available cores.
+        :param audio_feature_timeout: Audio feature extraction of a clip is aborted after this many seconds.
+        :param audio_feature_backend: praat runs GetAudioFeatures.praat for every clip, native computes the same
+         features in process with NumPy. The models are trained on Praat features, check the native ones with
+         NativeAudioFeatures.check_praat_parity first.
+        :param cache_path: SQLite file used to cache transcripts and audio features across runs. None disables caching.
+        :param cache_max_size: Maximum size of the cache in bytes.
+        :param wav2vec_version: Identifies the speech to text model in the cache. Defaults to the model name or path.
+        :param offline: Never download the Wav2Vec model, only use local directories and the local Hugging Face cache.
+        :param prediction_chunk_size: Number of clips vectorized and classified at once.
+        :param download_workers: Maximum number of parallel downloads.
+        :param metadata_index_path: SQLite file indexing episodes and clips. Replaces scanning the audio and clip folders.
+         Import previously downloaded files with index_audio_files_folder. None scans the folders.
+        :param use_subtitles: Download subtitles with the audio files and use the subtitle text of every clip with
+         plausible subtitles (see get_subtitle_texts). Speech to text only runs on the other clips.
+        :param inference_backend: Runs the Wav2Vec model in full precision PyTorch (torch), with int8 linear layers
+         (quantized) or as ONNX graph with onnxruntime (onnx). See Wav2VecBackends.compare_backends for a WER check.
+        :param onnx_path: ONNX file of the onnx backend. The model is exported to it if it does not exist. Defaults to a
+         file named after the model and a hash of its weights in models/wav2vec_onnx.
+        :param instrumentation_sinks: Functions receiving the run report at the end of get_sentiments, e.g.
+         Instrumentation.JsonLinesSink or Instrumentation.PrometheusTextSink.
         :return: CryptoSentimentAnalysis Pipeline instance
         """
 
@@ -77,15 +166,64 @@ class SentimentAnalysisPipeline:
         self.sentiment_model = sentiment_model
         self.sentiment_vectorizer = sentiment_vectorizer
         self.use_audio_features = use_audio_features
+        self.wav2vec_batch_size = wav2vec_batch_size
+        self.num_threads = num_threads
+        self.audio_feature_workers = audio_feature_workers
+        self.audio_feature_timeout = audio_feature_timeout
+        self.audio_feature_backend = audio_feature_backend
+        self.wav2vec_version = wav2vec_version
+        self.prediction_chunk_size = prediction_chunk_size
+        self.download_workers = download_workers
+        self.use_subtitles = use_subtitles
+        self.metadata_index = None
+        self.instrumentation = Instrumentation.Instrumentation(instrumentation_sinks)
+
+        if metadata_index_path is not None:
+            self.metadata_index = MetadataIndex.MetadataIndex(metadata_index_path, separator)
+
+        self.cache = None
+
+        if cache_path is not None:
+            self.cache = FeatureCache.FeatureCache(cache_path, cache_max_size)
+
+        if num_threads is not None:
+            torch.set_num_threads(num_threads)
+
+        if wav2vec_model is None or wav2vec_processor is None or isinstance(wav2vec_model, str):
+            model_name_or_path = wav2vec_model if isinstance(wav2vec_model, str) else self.DEFAULT_WAV2VEC_REPOSITORY
+            print("Loading Wav2Vec model and processor: " + model_name_or_path)
+            # Loaded only once per process, pipelines with the same model share it.
+            self.wav2vec_processor, self.wav2vec_model = ModelRegistry.load_wav2vec(model_name_or_path, offline)
+
+        self.inference_backend = inference_backend
+        if inference_backend == "onnx" and onnx_path is None:
+            onnx_path = Wav2VecBackends.get_default_onnx_path(self.wav2vec_model)
+        use_attention_mask = bool(getattr(self.wav2vec_processor.feature_extractor, "return_attention_mask", False))
+        self.wav2vec_backend = ModelRegistry.load_wav2vec_backend(self.wav2vec_model, inference_backend, onnx_path,
+                                                                  use_attention_mask, num_threads)
+
+    def warm_up(self):
+        """
+        Loads the sentiment models and runs one forward pass of the speech to text model, so the first real batch does
+        not pay for lazy initialization.
+
+        """
+
+        if self.sentiment_vectorizer is not None:
+            ModelRegistry.load_pickle(self.sentiment_vectorizer)
+        if self.sentiment_model is not None:
+            ModelRegistry.load_pickle(self.sentiment_model)
 
-        if wav2vec_model is None or wav2vec_processor is None:
-            print("Downloading standard Wav2Vec model and processor")
-            self.wav2vec_processor = Wav2Vec2Processor.from_pretrained(self.DEFAULT_WAV2VEC_REPOSITORY)
-            self.wav2vec_model = Wav2Vec2ForCTC.from_pretrained(self.DEFAULT_WAV2VEC_REPOSITORY)
+        self.transcribe_batch([np.zeros(self.DEFAULT_SAMPLING_RATE, dtype=np.float32)])
 
     def get_sentiments(self, video_urls=[], playlist_urls=[], start_date=None, end_date=None,
                        clip_extraction_method="ffmpeg",
-                       max_downloads_per_playlist=DEFAULT_MAX_DOWNLOADS_PER_PLAYLIST):
+                       max_downloads_per_playlist=DEFAULT_MAX_DOWNLOADS_PER_PLAYLIST,
+                       write_clips=False,
+                       checkpoint_folder=None,
+                       aggregator=None,
+                       pipelined=False,
+                       return_report=False):
         """
         Gets sentiments for specified coins from audio/video files.
 
@@ -94,22 +232,181 @@ class SentimentAnalysisPipeline:
         :param playlist_urls: List of playlist URLs to download.
         :param start_date: Do not use videos/audios before this date. Format: YYYYMMDD.
         :param end_date: Do not use videos/audios after this date. Format: YYYYMMDD.
-        :param clip_extraction_method: Method used to extract clips from audio files. ffmpeg or wav2vec (wip).
+        :param clip_extraction_method: Method used to extract clips from audio files. ffmpeg, memory, vad, wav2vec or
+         longform. memory decodes each audio file once and cuts the clips in memory instead of writing them to the clips
+         folder. vad also drops silence and music and cuts on pauses near the clip length. wav2vec additionally
+         transcribes the speech and cuts between words, the clips are transcribed in the same pass. longform transcribes
+         the whole episode in overlapping windows instead of the speech segments and cuts between words.
         :param max_downloads_per_playlist: Stop downloading videos from a playlist after max downloads reached.
-        :return: Returns a data frame with the following structure: (Date, Author, Title, Coin, Sentiment)
+        :param write_clips: Also save the clips in the clips folder when using an in memory clip extraction method.
+        :param checkpoint_folder: Save the output of every stage per episode in this folder. A rerun resumes from the last
+         completed stage and skips episodes whose checkpoints are up to date. None disables checkpoints.
+        :param aggregator: SentimentAggregator the sentiments of every episode are added to as soon as it is processed.
+        :param pipelined: Run downloading, decoding, speech to text, audio features and prediction at the same time on
+         different episodes (see iter_sentiments_pipelined). Episodes are returned in the order they finish.
+        :param return_report: Also return the run report with the time spent per stage and external call and the clip
+         counters (see Instrumentation.get_report).
+        :return: Returns a data frame with the following structure: (Date, Author, Title, Coin, Sentiment). With
+         return_report a tuple of the data frame and the report.
         """
 
-        # Download audio.
-        if len(video_urls) > 0 or len(playlist_urls) > 0:
-            self.download_audio_files(video_urls=video_urls,
-                                      playlist_urls=playlist_urls,
-                                      start_date=start_date,
-                                      end_date=end_date,
-                                      max_downloads=max_downloads_per_playlist)
+        self.instrumentation.reset()
+
+        if pipelined:
+            episodes = self.iter_sentiments_pipelined(video_urls, playlist_urls, start_date, end_date,
+                                                      clip_extraction_method, max_downloads_per_playlist, write_clips,
+                                                      checkpoint_folder)
+        else:
+            # Download audio.
+            if len(video_urls) > 0 or len(playlist_urls) > 0:
+                self.download_audio_files(video_urls=video_urls,
+                                          playlist_urls=playlist_urls,
+                                          start_date=start_date,
+                                          end_date=end_date,
+                                          max_downloads=max_downloads_per_playlist)
+
+                print("Download finished")
 
-            print("Download finished")
+            episodes = self.iter_sentiments(start_date, end_date, clip_extraction_method, write_clips,
+                                            checkpoint_folder)
 
-        # Collect audio files in a data frame.
+        episode_dfs = []
+        for episode_key, df in episodes:
+            if aggregator is not None:
+                aggregator.add(df, episode_key)
+            episode_dfs.append(df[["Date", "Author", "Title", "Coin", "Sentiment"]])
+
+        print("Sentiments labelling complete")
+
+        if len(episode_dfs) == 0:
+            df = pd.DataFrame(columns=["Date", "Author", "Title", "Coin", "Sentiment"])
+        else:
+            df = pd.concat(episode_dfs, ignore_index=True)
+
+        report = self.instrumentation.flush()
+
+        return (df, report) if return_report else df
+
+    def iter_sentiments(self, start_date=None, end_date=None, clip_extraction_method="ffmpeg", write_clips=False,
+                        checkpoint_folder=None):
+        """
+        Processes the downloaded episodes one by one. Only one episode is held in memory at a time, use it with a
+        SentimentAggregator for long backfills.
+
+        :param start_date: Do not use videos/audios before this date. Format: YYYYMMDD.
+        :param end_date: Do not use videos/audios after this date. Format: YYYYMMDD.
+        :param clip_extraction_method: Method used to extract clips from audio files. ffmpeg, memory, vad, wav2vec or
+         longform.
+        :param write_clips: Also save the clips in the clips folder when using an in memory clip extraction method.
+        :param checkpoint_folder: Save the output of every stage per episode in this folder. None disables checkpoints.
+        :return: Generator of (episode key, data frame with the labelled clips of the episode).
+        """
+
+        df_video_files_info = self.get_video_files_info_df(start_date, end_date)
+
+        checkpoints = None
+        if checkpoint_folder is not None:
+            checkpoints = PipelineCheckpoints.CheckpointStore(checkpoint_folder)
+
+        for _, row in df_video_files_info.iterrows():
+            episode_key = self.reconstruct_filename_from_metadata(row)[:-4]
+            yield episode_key, self.process_episode(row, clip_extraction_method, write_clips, checkpoints)
+
+    def iter_sentiments_pipelined(self, video_urls=[], playlist_urls=[], start_date=None, end_date=None,
+                                  clip_extraction_method="ffmpeg",
+                                  max_downloads_per_playlist=DEFAULT_MAX_DOWNLOADS_PER_PLAYLIST, write_clips=False,
+                                  checkpoint_folder=None):
+        """
+        Downloads and processes episodes with a PipelineExecutor. Every group of stages (download, decode, asr,
+        audio_features and prediction, see EXECUTOR_STAGES) has its own workers, so a new episode is transcribed while
+        the next one downloads instead of after all downloads finished. Bounded queues between the stages keep at most
+        a few episodes in memory.
+
+        New videos are processed first, then the episodes already in the audio files folder. An episode that fails in
+        any stage is skipped and the error is printed.
+
+        :param video_urls: List of video/audio URLs to do download.
+        :param playlist_urls: List of playlist URLs to download.
+        :param start_date: Do not use videos/audios before this date. Format: YYYYMMDD.
+        :param end_date: Do not use videos/audios after this date. Format: YYYYMMDD.
+        :param clip_extraction_method: Method used to extract clips from audio files. ffmpeg, memory, vad, wav2vec or
+         longform.
+        :param max_downloads_per_playlist: Stop downloading videos from a playlist after max downloads reached.
+        :param write_clips: Also save the clips in the clips folder when using an in memory clip extraction method.
+        :param checkpoint_folder: Save the output of every stage per episode in this folder. None disables checkpoints.
+        :return: Generator of (episode key, data frame with the labelled clips of the episode) in the order the episodes
+         finish.
+        """
+
+        checkpoints = None
+        if checkpoint_folder is not None:
+            checkpoints = PipelineCheckpoints.CheckpointStore(checkpoint_folder)
+
+        download_manager = self.get_download_manager()
+
+        def iter_inputs():
+            # List the downloaded episodes before new files arrive.
+            df_video_files_info = self.get_video_files_info_df(start_date, end_date)
+            for job in download_manager.get_jobs(video_urls, playlist_urls, start_date, end_date):
+                yield "job", job
+            for _, row in df_video_files_info.iterrows():
+                yield "row", row
+
+        def download(item):
+            kind, value = item
+            if kind == "job":
+                audio_files = [file for file in download_manager.download_job(value, start_date, end_date,
+                                                                              max_downloads_per_playlist)
+                               if file[-4:] == ".wav"]
+                value = self.get_video_info_row(audio_files[0]) if len(audio_files) > 0 else None
+                if value is None:
+                    return None
+
+            return self.start_episode(value, clip_extraction_method, checkpoints)
+
+        def make_stage_function(stages):
+            return lambda episode: self.run_episode_stages(episode, stages, clip_extraction_method, write_clips,
+                                                           checkpoints)
+
+        workers = {"decode": self.DEFAULT_DECODE_WORKERS, "asr": 1, "audio_features": 1, "prediction": 1}
+        executor = PipelineExecutor.PipelineExecutor(
+            [PipelineExecutor.Stage("download", download, self.download_workers, self.DEFAULT_PIPELINE_QUEUE_SIZE)]
+            + [PipelineExecutor.Stage(name, make_stage_function(stages), workers[name],
+                                      self.DEFAULT_PIPELINE_QUEUE_SIZE)
+               for name, stages in self.EXECUTOR_STAGES.items()])
+
+        for episode in executor.run(iter_inputs()):
+            yield episode["key"], self.finish_episode(episode)
+
+    def get_video_info_row(self, audio_file):
+        """
+        Creates the video info row of a downloaded audio file.
+
+        :param audio_file: Path of the audio file.
+        :return: Series with the entries Date, Author, Title, Views and Episode_File_Name. None if the file name does not
+         have the expected format.
+        """
+
+        video_info = MetadataIndex.parse_file_name(audio_file, self.separator)
+        if video_info is None:
+            return None
+
+        author, date, title, views = video_info
+        return pd.Series({"Date": date, "Author": author, "Title": title, "Views": views,
+                          "Episode_File_Name": os.path.basename(audio_file)})
+
+    def get_video_files_info_df(self, start_date=None, end_date=None):
+        """
+        Collects the audio files in the audio files folder in a data frame.
+
+        :param start_date: Do not use videos/audios before this date. Format: YYYYMMDD.
+        :param end_date: Do not use videos/audios after this date. Format: YYYYMMDD.
+        :return: Data frame with the columns (Date, Author, Title, Views). With a metadata index also Episode_Id,
+         Episode_File_Name and Duration.
+        """
+
+        if self.metadata_index is not None:
+            return self.metadata_index.query_episodes(start_date, end_date)
 
         # This data frame contains information about the video files to be used in further analysis.
         all_file_names = listdir(self.audio_files_folder)
@@ -125,152 +422,751 @@ class SentimentAnalysisPipeline:
         # Reorder data frame and convert types
         df_video_files_info = df_video_files_info[["Date", "Author", "Title", "Views"]]
         df_video_files_info["Date"] = df_video_files_info["Date"].astype("int")
-        # print(df_video_files_info)
 
         # Only keep entries in the user specified date range.
-        df_video_files_info = self.filter_df_by_date(df_video_files_info, start_date, end_date)
-        # print(df_video_files_info)
+        return self.filter_df_by_date(df_video_files_info, start_date, end_date)
+
+    def process_episode(self, row, clip_extraction_method="ffmpeg", write_clips=False, checkpoints=None):
+        """
+        Runs all stages (see EPISODE_STAGES) for one episode.
+
+        With checkpoints the episode resumes after the latest stage with an up to date checkpoint.
+
+        :param row: Row in the video info data frame.
+        :param clip_extraction_method: Method used to extract clips from audio files. ffmpeg, memory, vad, wav2vec or
+         longform.
+        :param write_clips: Also save the clips in the clips folder when using an in memory clip extraction method.
+        :param checkpoints: CheckpointStore or None.
+        :return: Data frame with the labelled clips of the episode.
+        """
+
+        episode = self.start_episode(row, clip_extraction_method, checkpoints)
+        episode = self.run_episode_stages(episode, self.EPISODE_STAGES, clip_extraction_method, write_clips,
+                                          checkpoints)
+        return self.finish_episode(episode)
+
+    def start_episode(self, row, clip_extraction_method="ffmpeg", checkpoints=None):
+        """
+        Prepares the processing state of an episode. With checkpoints it continues after the latest stage with an up to
+        date checkpoint.
+
+        :param row: Row in the video info data frame.
+        :param clip_extraction_method: Method used to extract clips from audio files.
+        :param checkpoints: CheckpointStore or None.
+        :return: Dict with the entries row, key (episode key), versions (see get_stage_versions, None without
+         checkpoints), df (output of the last completed stage or None) and next_stage (index of the next stage in
+         EPISODE_STAGES).
+        """
+
+        audio_file_name = self.reconstruct_filename_from_metadata(row)
+        audio_file = os.path.join(self.audio_files_folder, audio_file_name)
+        episode = {"row": row, "key": audio_file_name[:-4], "versions": None, "df": None, "next_stage": 0}
+
+        if checkpoints is not None:
+            episode["versions"] = self.get_stage_versions(clip_extraction_method)
+            for i in reversed(range(len(self.EPISODE_STAGES))):
+                stage = self.EPISODE_STAGES[i]
+                if checkpoints.is_up_to_date(stage, episode["key"], episode["versions"][stage], [audio_file]):
+                    episode["df"] = checkpoints.load(stage, episode["key"])
+                    episode["next_stage"] = i + 1
+                    break
+
+        return episode
+
+    def run_episode_stages(self, episode, stages, clip_extraction_method="ffmpeg", write_clips=False,
+                           checkpoints=None):
+        """
+        Runs stages of an episode that are not completed yet and saves their checkpoints.
+
+        :param episode: Processing state of the episode, see start_episode. It is updated in place.
+        :param stages: Names of the stages to run, consecutive in EPISODE_STAGES.
+        :param clip_extraction_method: Method used to extract clips from audio files.
+        :param write_clips: Also save the clips in the clips folder when using an in memory clip extraction method.
+        :param checkpoints: CheckpointStore or None.
+        :return: The episode.
+        """
+
+        for stage in stages:
+            if self.EPISODE_STAGES.index(stage) < episode["next_stage"]:
+                continue
 
-        # Extract audio clips.
+            with self.instrumentation.span("stage." + stage):
+                episode["df"] = self.run_episode_stage(stage, episode["df"], episode["row"], clip_extraction_method,
+                                                       write_clips)
+            episode["next_stage"] = self.EPISODE_STAGES.index(stage) + 1
+
+            if checkpoints is not None:
+                checkpoints.save(stage, episode["key"], episode["versions"][stage],
+                                 episode["df"].drop(columns=["Audio"], errors="ignore"))
+
+        return episode
+
+    def finish_episode(self, episode):
+        """
+        :param episode: Processing state of an episode after all stages, see start_episode.
+        :return: Data frame with the labelled clips of the episode.
+        """
+
+        print("Episode processed: " + episode["key"])
+
+        return episode["df"].drop(columns=["Audio"], errors="ignore")
+
+    def run_episode_stage(self, stage, df, row, clip_extraction_method="ffmpeg", write_clips=False):
+        """
+        Runs a single stage for one episode.
+
+        :param stage: Name of the stage, see EPISODE_STAGES.
+        :param df: Output of the previous stage (None for the first stage).
+        :param row: Row in the video info data frame.
+        :param clip_extraction_method: Method used to extract clips from audio files. ffmpeg, memory, vad, wav2vec or
+         longform.
+        :param write_clips: Also save the clips in the clips folder when using an in memory clip extraction method.
+        :return: Data frame with the output of the stage.
+        """
+
+        if stage == "clips":
+            df = self.get_episode_clips_df(row, clip_extraction_method, write_clips)
+            self.instrumentation.count("episodes_processed")
+            self.instrumentation.count("clips_processed", len(df))
+            return df
+
+        # In memory clips are not checkpointed, decode them again when resuming.
+        if stage in ["text", "audio_features"] and clip_extraction_method in self.IN_MEMORY_CLIP_EXTRACTION_METHODS \
+                and "Audio" not in df.columns:
+            audio = self.decode_episode_audio(row)
+            df["Audio"] = to_object_array([audio[int(start * self.DEFAULT_SAMPLING_RATE):
+                                                 int(end * self.DEFAULT_SAMPLING_RATE)]
+                                           for start, end in zip(df["Start"], df["End"])])
+
+        if stage == "text":
+            # Speech to text
+            if "Text" in df.columns:
+                # Already transcribed while cutting the clips.
+                df["Text_Source"] = "asr"
+            else:
+                df["Text"] = None
+                df["Text_Source"] = "asr"
+                if self.use_subtitles:
+                    df["Text"] = self.get_subtitle_texts(row, df)
+                    df.loc[df["Text"].notna(), "Text_Source"] = "subtitles"
+
+                to_transcribe = df["Text"].isna().to_numpy()
+                if to_transcribe.any():
+                    if "Audio" in df.columns:
+                        texts = self.transcribe_audio_clips(list(df.loc[to_transcribe, "Audio"]))
+                    else:
+                        texts = self.get_wav2vec_outputs(df.loc[to_transcribe, "File_Name"])
+                    df.loc[to_transcribe, "Text"] = pd.Series(texts, index=df.index[to_transcribe], dtype=object)
+        elif stage == "coins":
+            # Label coin
+            coin_tagger = SubtitleProcessing.get_keyword_tagger(self.TEXT_COIN_LABELS)
+            df["Coin_Mentions"] = coin_tagger.tag_series(df["Text"], all_matches=True).to_numpy()
+            df["Coin"] = df["Coin_Mentions"].map(coin_tagger.best_label)
+        elif stage == "audio_features":
+            # Extract audio features
+            df = pd.concat([df, self.get_audio_features_df_parallel(df)], axis=1)
+        elif stage == "sentiments":
+            clip_count = len(df)
+            df = df.dropna(subset=["Text"])
+            self.instrumentation.count("clips_dropped_missing_text", clip_count - len(df))
+
+            clip_count = len(df)
+            coin_list = ["BTC", "ETH", "DOGE"]
+            df = df[df["Coin"].isin(coin_list)]
+            self.instrumentation.count("clips_dropped_coin_filter", clip_count - len(df))
+
+            if self.use_audio_features:
+                clip_count = len(df)
+                df = df[self.has_sentiment_audio_features(df)]
+                self.instrumentation.count("clips_dropped_missing_audio_features", clip_count - len(df))
+
+            # Label sentiment
+            df = df.copy()
+            df["Sentiment"] = self.predict_sentiments(df)
+            self.instrumentation.count("clips_labelled", len(df))
+
+        return df
+
+    def get_stage_versions(self, clip_extraction_method="ffmpeg"):
+        """
+        Returns a version string per stage. It changes whenever a setting that affects the stage output (or the output of
+        an earlier stage) changes, which makes existing checkpoints outdated.
+
+        :param clip_extraction_method: Method used to extract clips from audio files.
+        :return: Dict of stage name -> version string.
+        """
+
+        settings = {
+            "clips": [clip_extraction_method, self.clip_length, Segmentation.VERSION]
+            + ([self.LONG_FORM_WINDOW_LENGTH, self.LONG_FORM_STRIDE_LENGTH] if clip_extraction_method == "longform"
+               else []),
+            "text": [self.get_wav2vec_version(), self.use_subtitles, self.SUBTITLE_MIN_WORDS_PER_SECOND,
+                     self.SUBTITLE_MAX_WORDS_PER_SECOND, self.SUBTITLE_MAX_ANNOTATION_RATIO],
+            "coins": [sorted((label, sorted(keywords)) for label, keywords in self.TEXT_COIN_LABELS.items())],
+            # The sentiments do not depend on the audio features without use_audio_features.
+            "audio_features": [self.get_audio_features_version() if self.use_audio_features else None],
+            "sentiments": [self.sentiment_model, self.sentiment_vectorizer, self.use_audio_features]
+        }
+
+        versions = {}
+        version = ""
+        for stage in self.EPISODE_STAGES:
+            version += repr(settings[stage])
+            versions[stage] = hashlib.sha1(version.encode("utf-8")).hexdigest()
+
+        return versions
+
+    def get_episode_clips_df(self, row, clip_extraction_method="ffmpeg", write_clips=False):
+        """
+        Collects the clips of an episode in a data frame.
+
+        :param row: Row in the video info data frame.
+        :param clip_extraction_method: ffmpeg cuts the clips into the clips folder first, memory decodes the audio file
+         once and cuts it in memory, vad, wav2vec and longform cut it on pauses or between words (see
+         get_episode_clips_df_segmented).
+         Otherwise the clips already present in the clips folder are used.
+        :param write_clips: Also save the clips in the clips folder when using an in memory clip extraction method.
+        :return: Data frame with one row per clip. With the memory method the "Audio" column holds views into the decoded
+         audio.
+        """
+
+        if clip_extraction_method == "memory":
+            return self.get_episode_clips_df_in_memory(row, write_clips)
+
+        if clip_extraction_method in ["vad", "wav2vec", "longform"]:
+            return self.get_episode_clips_df_segmented(row, clip_extraction_method, write_clips)
 
         if clip_extraction_method == "ffmpeg":
-            self.extract_clips_from_audio_files(df_video_info=df_video_files_info)
+            self.extract_clip_for_video_info_data_frame_row(row)
+
+        episode_file_name = self.reconstruct_filename_from_metadata(row)
+        clip_prefix = episode_file_name[:-4] + self.separator
+
+        clip_files = None
+        if self.metadata_index is not None and clip_extraction_method != "ffmpeg":
+            # Clips recorded by earlier runs.
+            df_clips = self.metadata_index.query_clips(episode_file_name[:-4]).dropna(subset=["File_Path"])
+            if len(df_clips) > 0:
+                clip_files = [(clip_id, os.path.basename(file_path))
+                              for clip_id, file_path in zip(df_clips["Clip_Id"], df_clips["File_Path"])]
+        elif self.metadata_index is not None and pd.notna(row.get("Duration")):
+            # ffmpeg numbers the clips consecutively, so the clips folder does not have to be listed.
+            clip_count = int(np.ceil(row["Duration"] / self.clip_length))
+            clip_files = [("%04d" % i, clip_prefix + "%04d" % i + ".wav") for i in range(clip_count)]
+            clip_files = [(clip_id, file_name) for clip_id, file_name in clip_files
+                          if os.path.isfile(os.path.join(self.clips_folder, file_name))]
+
+        if clip_files is None:
+            # Collect clips from folder.
+            clip_files = [(file_name[len(clip_prefix):-4], file_name) for file_name in sorted(listdir(self.clips_folder))
+                          if file_name[-4:] == ".wav" and file_name.startswith(clip_prefix)]
+
+        duration = row.get("Duration")
+        duration = np.inf if pd.isna(duration) else duration
+        clips_info = []
+        for clip_id, file_name in clip_files:
+            start = int(clip_id) * self.clip_length if clip_id.isdigit() else np.nan
+            end = min(start + self.clip_length, duration)
+            clips_info.append([row["Date"], row["Author"], row["Title"], row["Views"], clip_id, file_name, start, end])
+
+        df = pd.DataFrame(clips_info, columns=["Date", "Author", "Title", "Views", "Clip_Id", "File_Name", "Start",
+                                               "End"])
+
+        if self.metadata_index is not None and clip_extraction_method == "ffmpeg":
+            self.metadata_index.add_clips(episode_file_name[:-4],
+                                          [(clip_id, start, end, os.path.join(self.clips_folder, file_name))
+                                           for clip_id, file_name, start, end
+                                           in zip(df["Clip_Id"], df["File_Name"], df["Start"], df["End"])])
 
-            print("Clips extracted")
+        return df
 
-        # Start building the final data set.
+    def get_episode_clips_df_in_memory(self, row, write_clips=False):
+        """
+        Decodes an audio file once and cuts it into clips of equal length in memory.
 
-        # Collect clips from folder.
-        all_file_names = listdir(self.clips_folder)
+        :param row: Row in the video info data frame.
+        :param write_clips: Also save the clips in the clips folder.
+        :return: Data frame with one row per clip. The "Audio" column holds views into the decoded audio.
+        """
 
-        clip_files_info = []
-        for file_name in all_file_names:
-            if file_name[-4:] == ".wav":
-                clip_info = file_name[:-4].split(self.separator)
-                clip_info.append(file_name)
-                clip_files_info.append(clip_info)
+        audio = self.decode_episode_audio(row)
 
-        # Save clip info in a data frame.
-        df = pd.DataFrame(clip_files_info, columns=["Author", "Date", "Title", "Views", "Clip_Id", "File_Name"])
-        # Reorder data frame and convert types
-        df = df[["Date", "Author", "Title", "Views", "Clip_Id", "File_Name"]]
-        df["Date"] = df["Date"].astype("int")
+        clip_samples = self.clip_length * self.DEFAULT_SAMPLING_RATE
+        bounds = [(clip_number * self.clip_length, (clip_number * clip_samples + len(clip)) / self.DEFAULT_SAMPLING_RATE)
+                  for clip_number, clip in AudioFeatureExtraction.iter_clips(audio, clip_samples)]
 
-        # Only keep entries in the user specified date range.
-        df = self.filter_df_by_date(df, start_date, end_date)
+        return self.make_in_memory_clips_df(row, audio, bounds, write_clips=write_clips)
 
-        # Speech to text
-        df["Text"] = df["File_Name"].apply(lambda x: self.get_wav2vec_output(x))
+    def get_episode_clips_df_segmented(self, row, clip_extraction_method="vad", write_clips=False):
+        """
+        Decodes an audio file once and cuts its speech into clips of about clip_length seconds. Silence and music are
+        dropped.
 
-        print("Text extracted")
+        vad cuts on pauses found by an energy based voice activity detection. wav2vec transcribes the speech segments
+        and cuts between words, so no clip starts or ends in the middle of a word. longform transcribes the whole
+        episode in overlapping windows (see transcribe_long_form) and cuts between words, so words at segment boundaries
+        are not cut either. With wav2vec and longform the clips are transcribed in the same pass and have a "Text"
+        column.
 
-        # Label coin
-        df["Coin"] = [SubtitleProcessing.auto_label_text_chunk(t, self.TEXT_COIN_LABELS) for t in df["Text"]]
+        :param row: Row in the video info data frame.
+        :param clip_extraction_method: vad, wav2vec or longform.
+        :param write_clips: Also save the clips in the clips folder.
+        :return: Data frame with one row per clip. The "Audio" column holds views into the decoded audio.
+        """
 
-        print("Text labelled with coins")
+        audio = self.decode_episode_audio(row)
 
-        # Extract audio features
-        df_audio_features = self.get_audio_features_df(df)
-        df = pd.concat([df, df_audio_features], axis=1)
+        if clip_extraction_method == "longform":
+            # The clips are cut from the decoded audio, so it is in memory anyway and the windows are views into it.
+            # transcribe_audio_file streams instead for transcripts only.
+            block_samples = self.LONG_FORM_WINDOW_LENGTH * self.DEFAULT_SAMPLING_RATE
+            words = self.transcribe_long_form(audio[i:i + block_samples] for i in range(0, len(audio), block_samples))
+        else:
+            segments = Segmentation.segment_on_pauses(audio, self.clip_length, self.DEFAULT_SAMPLING_RATE)
 
-        print("Audio features extracted")
+            if clip_extraction_method == "vad":
+                return self.make_in_memory_clips_df(row, audio, segments, write_clips=write_clips)
 
-        #df.to_csv("get_sentiments_output.csv")
+            # Transcribe the pause delimited segments and cut again between words.
+            segment_audio = [audio[int(start * self.DEFAULT_SAMPLING_RATE):int(end * self.DEFAULT_SAMPLING_RATE)]
+                             for start, end in segments]
+            words = []
+            for (segment_start, _), segment_words in zip(segments, self.transcribe_words(segment_audio)):
+                words.extend((word, segment_start + start, segment_start + end) for word, start, end in segment_words)
 
-        df.dropna(subset=["Text"], inplace=True)
-        coin_list = ["BTC", "ETH", "DOGE"]
-        df = df[df["Coin"].isin(coin_list)]
-        if self.use_audio_features:
-            df.dropna(subset=["Pitch_Median"], inplace=True)
-            df = df[df["Pitch_Median"] != "None"]
+        clips = Segmentation.segment_on_words(words, self.clip_length)
+        return self.make_in_memory_clips_df(row, audio, [(start, end) for start, end, _ in clips],
+                                            texts=[text for _, _, text in clips], write_clips=write_clips)
 
-        # Label sentiment
-        df["Sentiment"] = self.predict_sentiments(df)
+    def decode_episode_audio(self, row):
+        """
+        Decodes the audio file of an episode.
 
-        print("Sentiments labelling complete")
+        :param row: Row in the video info data frame.
+        :return: 1d float32 array sampled at 16kHz.
+        """
+
+        audio_file = os.path.join(self.audio_files_folder, self.reconstruct_filename_from_metadata(row))
+        try:
+            with self.instrumentation.span("subprocess.ffmpeg_decode"):
+                return AudioFeatureExtraction.decode_audio(audio_file, self.DEFAULT_SAMPLING_RATE)
+        except (OSError, subprocess.CalledProcessError):
+            self.instrumentation.count("subprocess_failures")
+            self.instrumentation.count("subprocess_failures.ffmpeg_decode")
+            raise
+
+    def make_in_memory_clips_df(self, row, audio, bounds, texts=None, write_clips=False):
+        """
+        Creates the clips data frame of an episode from its decoded audio and records the clips in the metadata index.
+
+        :param row: Row in the video info data frame.
+        :param audio: Decoded audio of the episode.
+        :param bounds: Start and end of every clip in seconds.
+        :param texts: Transcripts of the clips or None.
+        :param write_clips: Also save the clips in the clips folder.
+        :return: Data frame with one row per clip. The "Audio" column holds views into the decoded audio.
+        """
+
+        audio_file_name = self.reconstruct_filename_from_metadata(row)
 
-        # print(df)
+        clips_info = []
+        for clip_number, (start, end) in enumerate(bounds):
+            clip = audio[int(start * self.DEFAULT_SAMPLING_RATE):int(end * self.DEFAULT_SAMPLING_RATE)]
+            clip_id = "%04d" % clip_number
+            file_name = None
+            if write_clips:
+                file_name = audio_file_name[:-4] + self.separator + clip_id + ".wav"
+                sf.write(os.path.join(self.clips_folder, file_name), clip, self.DEFAULT_SAMPLING_RATE)
+
+            clips_info.append([row["Date"], row["Author"], row["Title"], row["Views"], clip_id, file_name, start, end,
+                               clip])
+
+        df = pd.DataFrame(clips_info, columns=["Date", "Author", "Title", "Views", "Clip_Id", "File_Name", "Start", "End",
+                                               "Audio"])
+        if texts is not None:
+            df["Text"] = texts
+
+        if self.metadata_index is not None:
+            self.metadata_index.add_clips(audio_file_name[:-4],
+                                          [(clip_id, start, end, os.path.join(self.clips_folder, file_name)
+                                            if file_name is not None else None)
+                                           for clip_id, file_name, start, end
+                                           in zip(df["Clip_Id"], df["File_Name"], df["Start"], df["End"])])
 
-        # Return subset of the data frame
-        return df[["Date", "Author", "Title", "Coin", "Sentiment"]]
+        return df
+
+    def get_subtitle_texts(self, row, df):
+        """
+        Aligns the words of an episode's subtitle file to its clips.
+
+        A clip gets the subtitle text if its words per second are plausible for speech and at most
+        SUBTITLE_MAX_ANNOTATION_RATIO of its subtitle entries are sound annotations like "[Music]". Too few words usually
+        mean missing captions, too many mean misaligned ones.
+
+        :param row: Row in the video info data frame.
+        :param df: Clips data frame of the episode with the columns Start and End (in seconds).
+        :return: List with the lower case subtitle text of every clip or None where speech to text has to be used.
+        """
+
+        subtitle_file = SubtitleProcessing.find_subtitle_file(
+            os.path.join(self.audio_files_folder, self.reconstruct_filename_from_metadata(row)))
+        if subtitle_file is None or "Start" not in df.columns:
+            return [None] * len(df)
+
+        words, starts, ends = SubtitleProcessing.read_subtitle_words(subtitle_file)
+        clip_starts = df["Start"].to_numpy(dtype=np.float64) * 1000
+        clip_ends = df["End"].to_numpy(dtype=np.float64) * 1000
+        texts, annotation_counts = SubtitleProcessing.align_words_to_clips(words, starts, ends, clip_starts, clip_ends)
+
+        subtitle_texts = []
+        for text, annotation_count, clip_start, clip_end in zip(texts, annotation_counts, clip_starts, clip_ends):
+            duration = (clip_end - clip_start) / 1000
+            word_count = 0 if text is None else len(text.split())
+            plausible = duration > 0 and \
+                self.SUBTITLE_MIN_WORDS_PER_SECOND <= word_count / duration <= self.SUBTITLE_MAX_WORDS_PER_SECOND and \
+                annotation_count <= self.SUBTITLE_MAX_ANNOTATION_RATIO * (word_count + annotation_count)
+            subtitle_texts.append(text.lower() if plausible else None)
+
+        return subtitle_texts
+
+    def has_sentiment_audio_features(self, df):
+        """
+        Checks which clips have all audio features used by the sentiment model. Clips with only a few voiced periods
+        can have a pitch but no jitter, shimmer or pitch deviation.
+
+        :param df: Data frame with the columns of SENTIMENT_AUDIO_FEATURE_COLUMNS.
+        :return: Boolean series with the index of df.
+        """
+
+        audio_features = df[self.SENTIMENT_AUDIO_FEATURE_COLUMNS].apply(pd.to_numeric, errors="coerce")
+        return pd.Series(np.isfinite(audio_features.to_numpy(dtype=np.float64)).all(axis=1), index=df.index)
 
     def predict_sentiments(self, df):
+        """
+        Predicts the sentiment of clips. With audio features, clips missing one of them are skipped (see
+        has_sentiment_audio_features).
+
+        :param df: Data frame with the columns Text and, with audio features, SENTIMENT_AUDIO_FEATURE_COLUMNS.
+        :return: Array with the sentiment of every clip that was not skipped.
+        """
+
+        if self.use_audio_features:
+            df = df[self.has_sentiment_audio_features(df)]
 
         if len(df) == 0:
             return []
 
-        if self.use_audio_features:
-            df = df[df["Pitch_Median"] != "None"]
+        # Load Tfidf vectorizer (only loaded once per process)
+        tfidf_vectorizer = ModelRegistry.load_pickle(self.sentiment_vectorizer)
 
-        # Load Tfidf vectorizer
-        with open(self.sentiment_vectorizer, 'rb') as sentiment_vect_file:
-            tfidf_vectorizer = pickle.load(
-                sentiment_vect_file)
+        # Load sentiment model (only loaded once per process)
+        MLPClassifier = ModelRegistry.load_pickle(self.sentiment_model)
 
-        vectorized_matrix = tfidf_vectorizer.transform(df["Text"])
-        # convert the vectorized_matrix to numpy array
-        vectorized = np.asarray(vectorized_matrix.todense())
+        # Vectorize and predict in chunks, the input stays sparse so memory does not grow with the vocabulary size.
+        predicted_chunks = []
+        for chunk_start in range(0, len(df), self.prediction_chunk_size):
+            df_chunk = df.iloc[chunk_start:chunk_start + self.prediction_chunk_size]
+            with self.instrumentation.span("model.tfidf"):
+                vectorized_matrix = tfidf_vectorizer.transform(df_chunk["Text"])
 
-        if self.use_audio_features:
-            audio_feature_array = df[
-                ["Pitch_05_Quantile", "Pitch_95_Quantile", "Pitch_Range", "Pitch_Median", "Pitch_Stdev", "Jitter",
-                 "Shimmer", "Hammarberg_Index"]].to_numpy()
+            if self.use_audio_features:
+                audio_feature_array = df_chunk[self.SENTIMENT_AUDIO_FEATURE_COLUMNS].to_numpy(dtype=np.float64)
 
-            # Concatenate the array of features with the converted texts to create the input for our model
-            final_input = np.concatenate((vectorized, audio_feature_array), axis=1)
-        else:
-            final_input = vectorized
+                # Append the audio features to the vectorized texts to create the input for our model
+                final_input = scipy.sparse.hstack([vectorized_matrix, scipy.sparse.csr_matrix(audio_feature_array)],
+                                                  format="csr")
+            else:
+                final_input = vectorized_matrix.tocsr()
 
-        # Load sentiment model
-        with open(self.sentiment_model, 'rb') as sentiment_model_file:
-            MLPClassifier = pickle.load(
-                sentiment_model_file)
+            # Predict sentiments
+            with self.instrumentation.span("model.sentiment"):
+                predicted_chunks.append(MLPClassifier.predict(final_input))
 
-        # Predict sentiments
-        predicted = MLPClassifier.predict(final_input)
+        predicted = np.concatenate(predicted_chunks)
 
         return predicted
 
 
     def get_wav2vec_output(self, filename):
-        # TODO: Make parameter use_cuda + batchsize for speedup, but it requires that all audio files are already loaded into the df
+        """
+        Transcribes a single audio clip. Use get_wav2vec_outputs for many clips.
 
-        # Reads audio file
-        file = os.path.join(self.clips_folder, filename)
-        audio, sampling_rate = sf.read(file)
-        assert (sampling_rate == 16_000, "Sampling rate was not 16k.")
+        :param filename: File name of the clip in the clips folder.
+        :return: The transcribed text in lower case.
+        """
 
-        # Batch size 1
-        input_values = self.wav2vec_processor(audio, return_tensors="pt", padding="longest",
-                                              sampling_rate=sampling_rate).input_values
+        return self.get_wav2vec_outputs([filename])[0]
 
-        # retrieve logits
-        logits = self.wav2vec_model(input_values).logits
+    def get_wav2vec_outputs(self, file_names):
+        """
+        Transcribes audio clips from the clips folder in padded batches.
+
+        Clips are sorted by length so that each batch needs as little padding as possible. Only one batch of clips is
+        held in memory at a time.
+
+        :param file_names: File names of the clips in the clips folder.
+        :return: List of transcribed texts in the same order as file_names.
+        """
+
+        files = [os.path.join(self.clips_folder, file_name) for file_name in file_names]
+        lengths = [sf.info(file).frames for file in files]
+
+        def load_clip(i):
+            audio, sampling_rate = sf.read(files[i], dtype="float32")
+            assert sampling_rate == self.DEFAULT_SAMPLING_RATE, "Sampling rate was not 16k."
+            return audio
+
+        return self.transcribe_in_batches(lengths, load_clip)
+
+    def transcribe_audio_clips(self, audio_clips):
+        """
+        Transcribes audio clips that are already loaded into memory.
+
+        :param audio_clips: List of 1d arrays sampled at 16kHz.
+        :return: List of transcribed texts in the same order as audio_clips.
+        """
+
+        return self.transcribe_in_batches([len(audio) for audio in audio_clips], lambda i: audio_clips[i])
+
+    def transcribe_in_batches(self, lengths, load_clip):
+        """
+        Runs speech to text over length-bucketed batches.
+
+        :param lengths: Number of samples of each clip.
+        :param load_clip: Function returning the audio array for a clip index.
+        :return: List of transcribed texts in input order.
+        """
+
+        texts = [None] * len(lengths)
+        pending = np.arange(len(lengths))
+
+        if self.cache is not None:
+            content_hashes = [FeatureCache.hash_audio(load_clip(i)) for i in range(len(lengths))]
+            cached_texts = self.cache.get_many("text", self.get_wav2vec_version(), content_hashes)
+            texts = [cached_texts.get(content_hash) for content_hash in content_hashes]
+            pending = np.array([i for i, text in enumerate(texts) if text is None], dtype=int)
+            self.instrumentation.count("cache_hits.text", len(lengths) - len(pending))
+            self.instrumentation.count("cache_misses.text", len(pending))
+
+        order = pending[np.argsort(np.asarray(lengths)[pending], kind="stable")]
+
+        for batch_start in range(0, len(order), self.wav2vec_batch_size):
+            batch_indices = order[batch_start:batch_start + self.wav2vec_batch_size]
+            batch_texts = self.transcribe_batch([load_clip(i) for i in batch_indices])
+
+            for i, text in zip(batch_indices, batch_texts):
+                texts[i] = text
+
+            if self.cache is not None:
+                self.cache.put_many("text", self.get_wav2vec_version(),
+                                    {content_hashes[i]: text for i, text in zip(batch_indices, batch_texts)})
+
+        return texts
+
+    def get_wav2vec_version(self):
+        """
+        Returns the string identifying the speech to text model (and its inference backend) in the cache.
+
+        """
+
+        if self.wav2vec_version is None:
+            self.wav2vec_version = getattr(self.wav2vec_model.config, "_name_or_path", "") or "custom"
+
+        if self.inference_backend != "torch":
+            # Quantized and exported models transcribe slightly differently.
+            return self.wav2vec_version + ":" + self.inference_backend
+
+        return self.wav2vec_version
+
+    def get_audio_features_version(self):
+        """
+        Returns the string identifying the audio feature backend (and Praat script) in the cache and the checkpoints.
+        A missing Praat script is no error here, Praat fails on every clip later and the clips get no features.
+
+        """
+
+        if self.audio_feature_backend == "native":
+            return "native:" + NativeAudioFeatures.VERSION
+
+        try:
+            with open(self.praat_script, "rb") as praat_script_file:
+                return "praat:" + hashlib.sha1(praat_script_file.read()).hexdigest()
+        except OSError:
+            return "praat:missing:" + str(self.praat_script)
+
+    def transcribe_batch(self, audio_clips):
+        """
+        Transcribes one batch of audio clips with a single padded forward pass.
+
+        :param audio_clips: List of 1d arrays sampled at 16kHz.
+        :return: List of transcribed texts.
+        """
 
         # take argmax and decode
-        predicted_ids = torch.argmax(logits, dim=-1)
-        return self.wav2vec_processor.batch_decode(predicted_ids)[0].lower()
+        predicted_ids, _ = self.get_predicted_ids(audio_clips)
+        return [text.lower() for text in self.wav2vec_processor.batch_decode(predicted_ids)]
+
+    def get_predicted_ids(self, audio_clips):
+        """
+        Runs one padded forward pass and takes the most likely token per output frame.
+
+        :param audio_clips: List of 1d arrays sampled at 16kHz.
+        :return: Tensor of token ids with shape (number of clips, output frames) and the number of input samples per
+         output frame.
+        """
+
+        inputs = self.wav2vec_processor(audio_clips, return_tensors="pt", padding="longest",
+                                        sampling_rate=self.DEFAULT_SAMPLING_RATE)
+
+        # Only models trained with an attention mask expect one, see Wav2Vec2FeatureExtractor.return_attention_mask
+        attention_mask = inputs.attention_mask if "attention_mask" in inputs else None
+
+        # retrieve logits
+        with self.instrumentation.span("model.wav2vec"):
+            logits = self.wav2vec_backend(inputs.input_values, attention_mask)
+
+        return torch.argmax(logits, dim=-1), inputs.input_values.shape[1] / logits.shape[1]
+
+    def transcribe_words(self, audio_clips):
+        """
+        Transcribes audio clips in length-bucketed batches and returns the timestamp of every word.
+
+        :param audio_clips: List of 1d arrays sampled at 16kHz.
+        :return: List with one list of (word, start in seconds, end in seconds) per clip. Words are lower case.
+        """
+
+        tokenizer = self.wav2vec_processor.tokenizer
+        id_to_token = {token_id: token for token, token_id in tokenizer.get_vocab().items()}
+        word_delimiter_token = getattr(tokenizer, "word_delimiter_token", "|")
+        skip_token_ids = Segmentation.get_special_token_ids(tokenizer)
+
+        words = [None] * len(audio_clips)
+        order = np.argsort([len(audio) for audio in audio_clips], kind="stable")
+
+        for batch_start in range(0, len(order), self.wav2vec_batch_size):
+            batch_indices = order[batch_start:batch_start + self.wav2vec_batch_size]
+            predicted_ids, samples_per_frame = self.get_predicted_ids([audio_clips[i] for i in batch_indices])
+
+            for i, clip_ids in zip(batch_indices, predicted_ids.numpy()):
+                # Drop the frames of the padding.
+                frame_count = int(np.ceil(len(audio_clips[i]) / samples_per_frame))
+                clip_words = Segmentation.get_word_timestamps(clip_ids[:frame_count], id_to_token,
+                                                              tokenizer.pad_token_id, word_delimiter_token,
+                                                              samples_per_frame / self.DEFAULT_SAMPLING_RATE,
+                                                              skip_token_ids)
+                words[i] = [(word.lower(), start, end) for word, start, end in clip_words]
+
+        return words
+
+    def transcribe_long_form(self, blocks):
+        """
+        Transcribes a recording of any length in overlapping windows and returns the timestamp of every word.
+
+        Windows of LONG_FORM_WINDOW_LENGTH seconds overlap by twice LONG_FORM_STRIDE_LENGTH seconds. The output frames
+        are merged by keeping every frame from the window in which it is furthest from the window edges, so each word is
+        recognized with at least LONG_FORM_STRIDE_LENGTH seconds of context on both sides. The frames are then decoded
+        as one sequence, which means words are never cut at window boundaries. Only one batch of windows is in memory.
+
+        :param blocks: Iterable of consecutive 1d arrays sampled at 16kHz, e.g. AudioFeatureExtraction.stream_audio of
+         an episode or slices of decoded audio.
+        :return: List of (word, start in seconds, end in seconds). Words are lower case.
+        """
+
+        tokenizer = self.wav2vec_processor.tokenizer
+        id_to_token = {token_id: token for token, token_id in tokenizer.get_vocab().items()}
+        word_delimiter_token = getattr(tokenizer, "word_delimiter_token", "|")
+
+        # Windows start on output frame boundaries, so the frames of all windows line up.
+        samples_per_frame = int(np.prod(self.wav2vec_model.config.conv_stride))
+        window_samples = self.LONG_FORM_WINDOW_LENGTH * self.DEFAULT_SAMPLING_RATE
+        window_samples -= window_samples % samples_per_frame
+        stride_samples = self.LONG_FORM_STRIDE_LENGTH * self.DEFAULT_SAMPLING_RATE
+        stride_samples -= stride_samples % samples_per_frame
+
+        kept_ids = []
+
+        def transcribe_windows(windows):
+            predicted_ids, _ = self.get_predicted_ids([window for window, _, _ in windows])
+            for (window, keep_start, keep_end), window_ids in zip(windows, predicted_ids.numpy()):
+                # The last window is shorter, its padding frames are dropped.
+                frame_count = min(int(np.ceil(keep_end / samples_per_frame)), len(window_ids))
+                kept_ids.append(window_ids[keep_start // samples_per_frame:frame_count])
+
+        windows = []
+        for _, window, keep_start, keep_end in Segmentation.iter_windows(blocks, window_samples, stride_samples):
+            windows.append((window, keep_start, keep_end))
+            if len(windows) == self.wav2vec_batch_size:
+                transcribe_windows(windows)
+                windows = []
+        if len(windows) > 0:
+            transcribe_windows(windows)
+
+        if len(kept_ids) == 0:
+            return []
+
+        words = Segmentation.get_word_timestamps(np.concatenate(kept_ids), id_to_token, tokenizer.pad_token_id,
+                                                 word_delimiter_token, samples_per_frame / self.DEFAULT_SAMPLING_RATE,
+                                                 Segmentation.get_special_token_ids(tokenizer))
+        return [(word.lower(), start, end) for word, start, end in words]
+
+    def transcribe_audio_file(self, audio_file):
+        """
+        Transcribes an audio file of any length without decoding it into memory at once or writing clips.
+
+        :param audio_file: Path of the audio file.
+        :return: List of (word, start in seconds, end in seconds), see transcribe_long_form.
+        """
+
+        return self.transcribe_long_form(AudioFeatureExtraction.stream_audio(
+            audio_file, self.DEFAULT_SAMPLING_RATE, self.LONG_FORM_WINDOW_LENGTH * self.DEFAULT_SAMPLING_RATE))
 
     def download_audio_files(self, video_urls=[], playlist_urls=[], start_date=None, end_date=None,
                              max_downloads=DEFAULT_MAX_DOWNLOADS_PER_PLAYLIST):
-        for video_url in video_urls:
-            VideoDownloader.download_playlist(video_url,
-                                              output_folder=self.audio_files_folder,
-                                              start_date=start_date,
-                                              end_date=end_date,
-                                              file_name_separator=self.separator,
-                                              extract_subtitles=False)
-
-        for playlist_url in playlist_urls:
-            VideoDownloader.download_playlist(playlist_url,
-                                              output_folder=self.audio_files_folder,
-                                              start_date=start_date,
-                                              end_date=end_date,
-                                              max_videos=max_downloads,
-                                              file_name_separator=self.separator,
-                                              extract_subtitles=False)
-
-        VideoDownloader.ensure_correct_naming(self.audio_files_folder)
+        return self.get_download_manager().download(video_urls=video_urls,
+                                         playlist_urls=playlist_urls,
+                                         start_date=start_date,
+                                         end_date=end_date,
+                                         max_videos_per_playlist=max_downloads)
+
+    def get_download_manager(self):
+        return VideoDownloader.DownloadManager(self.audio_files_folder,
+                                               max_workers=self.download_workers,
+                                               file_name_separator=self.separator,
+                                               extract_subtitles=self.use_subtitles,
+                                               downloader=self.download_video,
+                                               on_file_downloaded=self.on_file_downloaded)
+
+    def download_video(self, url, output_folder, start_date=None, end_date=None, file_name_separator="-sep-",
+                       extract_subtitles=True):
+        """
+        Downloads a single video with youtube-dl like VideoDownloader.download_video, but keeps its output off stdout
+        and counts failures.
+
+        :return: The youtube-dl exit code.
+        """
+
+        return self.instrumentation.run_subprocess("youtube-dl", VideoDownloader.get_download_command(
+            url, output_folder, start_date, end_date, file_name_separator=file_name_separator,
+            extract_subtitles=extract_subtitles, playlist=False)).returncode
+
+    def on_file_downloaded(self, file_path):
+        """
+        Registers a downloaded audio file in the metadata index.
+
+        :param file_path: Path of the downloaded file.
+        """
+
+        if self.metadata_index is not None and file_path[-4:] == ".wav":
+            self.metadata_index.add_episode(file_path)
+
+    def index_audio_files_folder(self):
+        """
+        Adds all audio files of the audio files folder that are not indexed yet to the metadata index.
+
+        :return: Number of added episodes.
+        """
+
+        return self.metadata_index.add_folder(self.audio_files_folder)
 
     def extract_clips_from_audio_files(self, df_video_info=None):
         """
@@ -299,7 +1195,7 @@ class SentimentAnalysisPipeline:
         output_file_name = output_clip_base_name + self.separator + "%04d.wav"
         output_file = os.path.join(self.clips_folder, output_file_name)
 
-        subprocess.call([
+        self.instrumentation.run_subprocess("ffmpeg_clips", [
             "ffmpeg",
             "-i", audio_file,
             "-ar", "16000",  # downsample to 16Khz
@@ -317,54 +1213,169 @@ class SentimentAnalysisPipeline:
         :return: The file name of the video of the corresponding row.
         """
 
+        # Rows from the metadata index know their file name, titles may contain the separator.
+        if "Episode_File_Name" in row.index:
+            return row["Episode_File_Name"]
+
         return row["Author"] + self.separator + str(row["Date"]) + self.separator + row["Title"] + self.separator \
                + row["Views"] + ".wav"
 
     def get_audio_features_df(self, df, coins=DEFAULT_COINS):
         """
-        Generates a data frame with audio features for input df.
+        Generates a data frame with audio features for input df. Runs one Praat process at a time, see
+        get_audio_features_df_parallel. Uses the audio feature backend and the cache like the parallel version.
 
         :param df: Input data.
         :param coins: Only extract audio features for these coins.
         :return: Data frame containing audio features.
         """
 
-        none_list = [None] * 11
+        return self.get_audio_features_df_parallel(df, coins, max_workers=1)
+
+    def get_audio_features_for_clip(self, row, timeout=None):
+        """
+        Extracts audio features for a row in the clip data frame.
+
+        :param row: Row in the clip data frame. Uses the "Audio" column if present, otherwise "File_Name".
+        :param timeout: Abort the extraction after this many seconds. None waits forever.
+        :return: List of audio features.
+        """
 
-        # Get audio features for each clip (if correct coin label).
-        audio_features = df.apply(
-            lambda x: none_list if x["Coin"] not in coins
-            else AudioFeatureExtraction.get_audio_features(os.path.join(self.clips_folder, x["File_Name"]),
-                                                           self.praat_path,
-                                                           self.praat_script), axis=1)
+        if "Audio" in row.index:
+            return AudioFeatureExtraction.get_audio_features_from_array(row["Audio"],
+                                                                        self.DEFAULT_SAMPLING_RATE,
+                                                                        self.praat_path,
+                                                                        self.praat_script,
+                                                                        timeout)
 
-        # Make sure audio_features has the same length in every entry.
-        audio_features = audio_features.apply(lambda x: none_list if len(x) == 1 else x)
+        return AudioFeatureExtraction.get_audio_features(os.path.join(self.clips_folder, row["File_Name"]),
+                                                         self.praat_path,
+                                                         self.praat_script,
+                                                         timeout)
 
-        # Create a data frame with audio features.
-        df_audio_features = pd.DataFrame(np.vstack(audio_features), columns=["Pitch_Min",
-                                                                             "Pitch_Max",
-                                                                             "Pitch_05_Quantile",
-                                                                             "Pitch_95_Quantile",
-                                                                             "Pitch_Range",
-                                                                             "Pitch_Stdev",
-                                                                             "Pitch_Mean",
-                                                                             "Pitch_Median",
-                                                                             "Jitter",
-                                                                             "Shimmer",
-                                                                             "Hammarberg_Index"])
-
-        return df_audio_features
-
-    def get_audio_features_df_parallel(self, df, coins=DEFAULT_COINS):
+    def get_audio_features_df_parallel(self, df, coins=DEFAULT_COINS, max_workers=None):
         """
         Generates a data frame with audio features for input df. Runs parallel for speed
 
+        Every clip is processed by its own Praat process, so a thread pool is enough to keep all cores busy. Clips that
+        fail or time out get None for all features instead of aborting the whole extraction.
+
+        :param df: Input data.
+        :param coins: Only extract audio features for these coins.
+        :param max_workers: Number of Praat processes running in parallel. Defaults to audio_feature_workers.
+        :return: Data frame containing audio features.
+        """
+
+        if self.audio_feature_backend == "native":
+            return self.get_audio_features_df_native(df, coins)
+
+        none_list = [None] * len(self.AUDIO_FEATURE_COLUMNS)
+        max_workers = max_workers or self.audio_feature_workers or os.cpu_count() or 1
+
+        audio_features_version = self.get_audio_features_version() if self.cache is not None else None
+
+        def extract(row):
+            if row["Coin"] not in coins:
+                return none_list
+
+            content_hash = None
+            try:
+                if self.cache is not None:
+                    content_hash = FeatureCache.hash_audio(self.load_clip_audio(row))
+                    cached_audio_features = self.cache.get("audio_features", audio_features_version, content_hash)
+                    if cached_audio_features is not None:
+                        self.instrumentation.count("cache_hits.audio_features")
+                        return cached_audio_features
+                    self.instrumentation.count("cache_misses.audio_features")
+
+                with self.instrumentation.span("subprocess.praat"):
+                    audio_features = self.get_audio_features_for_clip(row, self.audio_feature_timeout)
+            except Exception as e:
+                self.instrumentation.count("subprocess_failures")
+                self.instrumentation.count("subprocess_failures.praat")
+                print("Could not extract audio features for clip " + str(row["Clip_Id"]) + " of " + str(row["Title"])
+                      + ": " + repr(e))
+                return none_list
+
+            # Make sure audio_features has the same length in every entry.
+            if len(audio_features) != len(self.AUDIO_FEATURE_COLUMNS):
+                return none_list
+
+            if self.cache is not None:
+                self.cache.put("audio_features", audio_features_version, content_hash, audio_features)
+
+            return audio_features
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            audio_features = list(executor.map(extract, (row for _, row in df.iterrows())))
+
+        # Create a data frame with audio features.
+        df_audio_features = pd.DataFrame(audio_features if len(audio_features) > 0 else None,
+                                         columns=self.AUDIO_FEATURE_COLUMNS,
+                                         index=df.index)
+
+        # Praat writes undefined values as "--undefined--".
+        return df_audio_features.apply(pd.to_numeric, errors="coerce")
+
+    def get_audio_features_df_native(self, df, coins=DEFAULT_COINS):
+        """
+        Generates a data frame with audio features for input df without starting Praat.
+
+        :param df: Input data.
+        :param coins: Only extract audio features for these coins.
+        :return: Data frame containing audio features. Undefined features are NaN.
+        """
+
+        audio_features = np.full((len(df), len(self.AUDIO_FEATURE_COLUMNS)), np.nan, dtype=np.float32)
+        selected = np.flatnonzero(df["Coin"].isin(coins).to_numpy())
+
+        audio_features_version = self.get_audio_features_version()
+
+        # Only load a limited number of clips at once.
+        for batch_start in range(0, len(selected), self.NATIVE_AUDIO_FEATURE_BATCH_SIZE):
+            batch = selected[batch_start:batch_start + self.NATIVE_AUDIO_FEATURE_BATCH_SIZE]
+            audio_clips = [self.load_clip_audio(df.iloc[i]) for i in batch]
+
+            if self.cache is None:
+                with self.instrumentation.span("native_audio_features"):
+                    audio_features[batch] = NativeAudioFeatures.get_audio_features_batch(audio_clips,
+                                                                                         self.DEFAULT_SAMPLING_RATE)
+                continue
+
+            content_hashes = [FeatureCache.hash_audio(audio) for audio in audio_clips]
+            cached_audio_features = self.cache.get_many("audio_features", audio_features_version, content_hashes)
+            missing = [j for j, content_hash in enumerate(content_hashes) if content_hash not in cached_audio_features]
+            self.instrumentation.count("cache_hits.audio_features", len(batch) - len(missing))
+            self.instrumentation.count("cache_misses.audio_features", len(missing))
+
+            for j, content_hash in enumerate(content_hashes):
+                if content_hash in cached_audio_features:
+                    audio_features[batch[j]] = cached_audio_features[content_hash]
+
+            if len(missing) > 0:
+                with self.instrumentation.span("native_audio_features"):
+                    computed = NativeAudioFeatures.get_audio_features_batch([audio_clips[j] for j in missing],
+                                                                            self.DEFAULT_SAMPLING_RATE)
+                audio_features[batch[missing]] = computed
+                self.cache.put_many("audio_features", audio_features_version,
+                                    {content_hashes[j]: features for j, features in zip(missing, computed)})
+
+        return pd.DataFrame(audio_features, columns=self.AUDIO_FEATURE_COLUMNS, index=df.index)
+
+    def load_clip_audio(self, row):
+        """
+        Loads the audio of a row in the clip data frame.
+
+        :param row: Row in the clip data frame. Uses the "Audio" column if present, otherwise "File_Name".
+        :return: 1d float32 array sampled at 16kHz.
         """
 
-        # Todo parallel library
+        if "Audio" in row.index:
+            return row["Audio"]
 
-        return self.get_audio_features_df(df, coins)
+        audio, sampling_rate = sf.read(os.path.join(self.clips_folder, row["File_Name"]), dtype="float32")
+        assert sampling_rate == self.DEFAULT_SAMPLING_RATE, "Sampling rate was not 16k."
+        return audio
 
     def filter_df_by_date(self, df, start_date=None, end_date=None):
         if start_date is not None:
@@ -0,0 +1,210 @@
+import argparse
+import hashlib
+import pickle
+import sqlite3
+import threading
+import time
+import numpy as np
+
+DEFAULT_MAX_SIZE = 2 * 1024 ** 3  # in bytes
+EVICTION_TARGET = 0.9  # Evict down to this fraction of the max size.
+
+
+def hash_audio(audio):
+    """Returns the content hash of an audio clip (hash of its float32 samples)."""
+
+    return hashlib.sha1(np.ascontiguousarray(audio, dtype=np.float32).tobytes()).hexdigest()
+
+
+class FeatureCache:
+    """Persistent cache for transcripts and audio features of audio clips.
+
+    Entries are keyed by the kind of value (e.g. "text"), a version string of the model or script that produced the value
+    and a hash of the clip's audio samples. The least recently used entries are evicted when the cache grows beyond
+    max_size bytes. The size is tracked while writing, so puts do not scan the table. Writes of other processes sharing
+    the file are only counted when the size is checked before evicting.
+    """
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE):
+        """
+        Opens (or creates) a cache.
+
+        :param path: Path of the SQLite database file.
+        :param max_size: Maximum size of all cached values in bytes.
+        """
+
+        self.path = path
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+
+        with self.lock, self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS cache ("
+                                    "key TEXT PRIMARY KEY, "
+                                    "kind TEXT NOT NULL, "
+                                    "version TEXT NOT NULL, "
+                                    "value BLOB NOT NULL, "
+                                    "size INTEGER NOT NULL, "
+                                    "last_access REAL NOT NULL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS cache_last_access ON cache (last_access)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS cache_kind_version ON cache (kind, version)")
+
+        # Size of all cached values in bytes, as far as this process knows.
+        self.total_size = self.size()
+
+    @staticmethod
+    def make_key(kind, version, content_hash):
+        return kind + ":" + version + ":" + content_hash
+
+    def get(self, kind, version, content_hash):
+        """Returns a cached value or None."""
+
+        return self.get_many(kind, version, [content_hash]).get(content_hash)
+
+    def get_many(self, kind, version, content_hashes):
+        """
+        Looks up several clips at once.
+
+        :return: Dict of content hash -> value for all clips found in the cache.
+        """
+
+        keys = {self.make_key(kind, version, content_hash): content_hash for content_hash in set(content_hashes)}
+        found = {}
+
+        with self.lock, self.connection:
+            key_list = list(keys)
+            # Stay below SQLite's limit of host parameters per statement.
+            for start in range(0, len(key_list), 500):
+                batch = key_list[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.connection.execute("SELECT key, value FROM cache WHERE key IN (" + placeholders + ")",
+                                               batch).fetchall()
+                for key, value in rows:
+                    found[keys[key]] = pickle.loads(value)
+
+                self.connection.execute("UPDATE cache SET last_access = ? WHERE key IN (" + placeholders + ")",
+                                        [time.time()] + batch)
+
+        return found
+
+    def put(self, kind, version, content_hash, value):
+        self.put_many(kind, version, {content_hash: value})
+
+    def put_many(self, kind, version, values):
+        """
+        Stores several values and evicts old entries if the cache grew too large.
+
+        :param values: Dict of content hash -> value.
+        """
+
+        now = time.time()
+        rows = []
+        for content_hash, value in values.items():
+            blob = pickle.dumps(value)
+            rows.append((self.make_key(kind, version, content_hash), kind, version, blob, len(blob), now))
+
+        with self.lock, self.connection:
+            # Replaced values no longer count towards the size.
+            replaced_size = 0
+            for start in range(0, len(rows), 500):
+                batch = [row[0] for row in rows[start:start + 500]]
+                replaced_size += self.connection.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM cache WHERE key IN (" + ",".join("?" * len(batch)) + ")",
+                    batch).fetchone()[0]
+
+            self.connection.executemany("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self.total_size += sum(row[4] for row in rows) - replaced_size
+
+        self.evict()
+
+    def size(self):
+        """Returns the size of all cached values in bytes."""
+
+        with self.lock:
+            return self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+
+    def evict(self):
+        """Removes the least recently used entries until the cache is below its max size."""
+
+        if self.total_size <= self.max_size:
+            return
+
+        # Count again, other processes may have written to or evicted from the same file.
+        total_size = self.size()
+        self.total_size = total_size
+        if total_size <= self.max_size:
+            return
+
+        size_to_free = total_size - EVICTION_TARGET * self.max_size
+
+        with self.lock, self.connection:
+            cursor = self.connection.execute("SELECT key, size FROM cache ORDER BY last_access")
+            keys_to_delete = []
+            freed_size = 0
+            for key, size in cursor:
+                if freed_size >= size_to_free:
+                    break
+                keys_to_delete.append((key,))
+                freed_size += size
+            cursor.close()
+
+            self.connection.executemany("DELETE FROM cache WHERE key = ?", keys_to_delete)
+            self.total_size -= freed_size
+
+    def invalidate(self, kind=None, version=None):
+        """
+        Removes cached values.
+
+        :param kind: Only remove values of this kind. None removes all kinds.
+        :param version: Only remove values of this version. None removes all versions.
+        :return: Number of removed entries.
+        """
+
+        conditions = []
+        parameters = []
+        if kind is not None:
+            conditions.append("kind = ?")
+            parameters.append(kind)
+        if version is not None:
+            conditions.append("version = ?")
+            parameters.append(version)
+
+        query = "DELETE FROM cache"
+        if len(conditions) > 0:
+            query += " WHERE " + " AND ".join(conditions)
+
+        with self.lock, self.connection:
+            deleted = self.connection.execute(query, parameters).rowcount
+
+        with self.lock:
+            self.connection.execute("VACUUM")
+
+        self.total_size = self.size()
+        return deleted
+
+    def stats(self):
+        """Returns number of entries and size in bytes per kind and version."""
+
+        with self.lock:
+            return self.connection.execute("SELECT kind, version, COUNT(*), SUM(size) FROM cache "
+                                           "GROUP BY kind, version ORDER BY kind, version").fetchall()
+
+    def close(self):
+        self.connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect or invalidate the transcript and audio feature cache.")
+    parser.add_argument("command", choices=["stats", "invalidate"])
+    parser.add_argument("cache_path", help="Path of the cache database.")
+    parser.add_argument("--kind", default=None, help="Only invalidate values of this kind, e.g. text or audio_features.")
+    parser.add_argument("--version", default=None, help="Only invalidate values of this version.")
+    args = parser.parse_args()
+
+    cache = FeatureCache(args.cache_path)
+    if args.command == "stats":
+        for kind, version, count, size in cache.stats():
+            print(kind + "\t" + version + "\t" + str(count) + " entries\t" + str(size) + " bytes")
+    else:
+        print("Removed " + str(cache.invalidate(args.kind, args.version)) + " entries")
+    cache.close()
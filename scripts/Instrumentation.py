@@ -0,0 +1,171 @@
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+METRIC_NAME_REGEX = re.compile(r"[^a-zA-Z0-9_]")
+DEFAULT_METRIC_PREFIX = "crypto_sentiment"
+# Characters of the output of a failed subprocess that are printed.
+MAX_ERROR_OUTPUT = 2000
+
+
+class Instrumentation:
+    """Collects counters and timed spans of a pipeline run and hands the run report to sinks.
+
+    Spans and counters are plain sums behind a lock, cheap enough to wrap every external call and model forward pass.
+    All methods are thread-safe.
+    """
+
+    def __init__(self, sinks=None):
+        """
+        :param sinks: Functions called with the report dict on flush, e.g. JsonLinesSink or PrometheusTextSink.
+        """
+
+        self.sinks = list(sinks or [])
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Starts a new run: clears all counters and spans."""
+
+        with self.lock:
+            self.counters = {}
+            self.spans = {}  # name -> [count, total seconds, max seconds]
+            self.start_time = time.time()
+            self.start_counter = time.perf_counter()
+
+    def count(self, name, value=1):
+        """Adds value to a counter."""
+
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_span(self, name, seconds):
+        with self.lock:
+            span = self.spans.get(name)
+            if span is None:
+                self.spans[name] = [1, seconds, seconds]
+            else:
+                span[0] += 1
+                span[1] += seconds
+                span[2] = max(span[2], seconds)
+
+    @contextmanager
+    def span(self, name):
+        """Times the enclosed block. Spans with the same name are summed."""
+
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, time.perf_counter() - start_time)
+
+    def run_subprocess(self, name, command, timeout=None):
+        """
+        Runs an external program in a span without letting its output reach stdout. Failures are counted as
+        subprocess_failures and the end of their output is printed.
+
+        :param name: Name of the span, e.g. ffmpeg.
+        :param command: Command list passed to subprocess.run.
+        :param timeout: Kill the program after this many seconds and raise subprocess.TimeoutExpired.
+        :return: subprocess.CompletedProcess with the captured output.
+        """
+
+        try:
+            with self.span("subprocess." + name):
+                result = subprocess.run(command, capture_output=True, timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            self.count("subprocess_failures")
+            self.count("subprocess_failures." + name)
+            raise
+
+        if result.returncode != 0:
+            self.count("subprocess_failures")
+            self.count("subprocess_failures." + name)
+            print(name + " failed with exit code " + str(result.returncode) + ": "
+                  + result.stderr.decode("utf-8", errors="replace")[-MAX_ERROR_OUTPUT:])
+
+        return result
+
+    def get_report(self):
+        """
+        :return: Dict with start_time (unix time), wall_seconds, counters (name -> value) and spans (name -> dict with
+         count, seconds and max_seconds).
+        """
+
+        with self.lock:
+            return {"start_time": self.start_time,
+                    "wall_seconds": time.perf_counter() - self.start_counter,
+                    "counters": dict(self.counters),
+                    "spans": {name: {"count": count, "seconds": seconds, "max_seconds": max_seconds}
+                              for name, (count, seconds, max_seconds) in sorted(self.spans.items())}}
+
+    def flush(self):
+        """Passes the current report to all sinks and returns it."""
+
+        report = self.get_report()
+        for sink in self.sinks:
+            sink(report)
+
+        return report
+
+
+class JsonLinesSink:
+    """Appends every report as one JSON line to a structured log file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, report):
+        with open(self.path, "a") as log_file:
+            log_file.write(json.dumps(report) + "\n")
+
+
+class PrometheusTextSink:
+    """Writes the latest report in the Prometheus text exposition format, e.g. for the textfile collector of the node
+    exporter. The file is replaced atomically, so a scrape never sees half a report."""
+
+    def __init__(self, path, prefix=DEFAULT_METRIC_PREFIX):
+        self.path = path
+        self.prefix = prefix
+
+    def __call__(self, report):
+        lines = []
+
+        def add_metric(name, metric_type, samples):
+            name = self.prefix + "_" + name
+            lines.append("# TYPE " + name + " " + metric_type)
+            lines.extend(name + labels + " " + repr(float(value)) for labels, value in samples)
+
+        add_metric("run_wall_seconds", "gauge", [("", report["wall_seconds"])])
+        add_metric("run_start_time_seconds", "gauge", [("", report["start_time"])])
+        for name, value in sorted(report["counters"].items()):
+            add_metric(METRIC_NAME_REGEX.sub("_", name) + "_total", "counter", [("", value)])
+
+        spans = sorted(report["spans"].items())
+        for field, metric_name in [("count", "span_count_total"), ("seconds", "span_seconds_total"),
+                                   ("max_seconds", "span_max_seconds")]:
+            add_metric(metric_name, "gauge" if field == "max_seconds" else "counter",
+                       [('{span="' + name + '"}', span[field]) for name, span in spans])
+
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as metrics_file:
+            metrics_file.write("\n".join(lines) + "\n")
+        os.replace(temp_path, self.path)
+
+
+def format_report(report):
+    """Formats a report as a table of spans sorted by total time, followed by the counters."""
+
+    lines = ["%-32s %8s %12s %12s" % ("Span", "Count", "Seconds", "Max seconds")]
+    for name, span in sorted(report["spans"].items(), key=lambda item: -item[1]["seconds"]):
+        lines.append("%-32s %8d %12.3f %12.3f" % (name, span["count"], span["seconds"], span["max_seconds"]))
+
+    lines.append("")
+    lines.extend("%-32s %8s" % (name, value) for name, value in sorted(report["counters"].items()))
+    lines.append("Wall time: %.3f s" % report["wall_seconds"])
+
+    return "\n".join(lines)
@@ -0,0 +1,167 @@
+import os
+import sqlite3
+import threading
+import pandas as pd
+import soundfile as sf
+
+DEFAULT_FILE_NAME_SEPARATOR = "-sep-"
+
+
+def parse_file_name(file_name, separator=DEFAULT_FILE_NAME_SEPARATOR):
+    """Parses author, date, title and views from a downloaded file name (see VideoDownloader.get_download_command).
+
+    Titles may contain the separator: the author and date are the first fields, views is the last field and everything in
+    between is the title.
+
+    Returns
+    -------
+    Tuple (author, date, title, views) or None if the file name does not have the expected format.
+    """
+
+    parts = os.path.splitext(os.path.basename(file_name))[0].split(separator)
+    if len(parts) < 4 or not parts[1].isdigit():
+        return None
+
+    return parts[0], int(parts[1]), separator.join(parts[2:-1]), parts[-1]
+
+
+class MetadataIndex:
+    """SQLite index of downloaded episodes and their clips.
+
+    Replaces listing the audio and clip folders and parsing file names, date ranges are an indexed query.
+    """
+
+    def __init__(self, path, separator=DEFAULT_FILE_NAME_SEPARATOR):
+        """
+        :param path: Path of the SQLite database file.
+        :param separator: Separator used in file names.
+        """
+
+        self.path = path
+        self.separator = separator
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+
+        with self.lock, self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS episodes ("
+                                    "episode_id TEXT PRIMARY KEY, "
+                                    "author TEXT NOT NULL, "
+                                    "date INTEGER NOT NULL, "
+                                    "title TEXT NOT NULL, "
+                                    "views TEXT, "
+                                    "duration REAL, "
+                                    "file_path TEXT NOT NULL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS episodes_date ON episodes (date)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS clips ("
+                                    "episode_id TEXT NOT NULL, "
+                                    "clip_id TEXT NOT NULL, "
+                                    "start_time REAL NOT NULL, "
+                                    "end_time REAL NOT NULL, "
+                                    "file_path TEXT, "
+                                    "PRIMARY KEY (episode_id, clip_id))")
+
+    def add_episode(self, file_path, author=None, date=None, title=None, views=None, duration=None):
+        """
+        Adds (or updates) an episode. Metadata that is not given is parsed from the file name, the duration is read from
+        the audio file header.
+
+        :param file_path: Path of the episode's audio file.
+        :return: The episode id (file name without extension) or None if the metadata is unknown.
+        """
+
+        parsed = parse_file_name(file_path, self.separator)
+        if parsed is None and None in (author, date, title):
+            return None
+        if parsed is not None:
+            author = author if author is not None else parsed[0]
+            date = date if date is not None else parsed[1]
+            title = title if title is not None else parsed[2]
+            views = views if views is not None else parsed[3]
+
+        if duration is None:
+            try:
+                duration = sf.info(file_path).duration
+            except RuntimeError:
+                duration = None
+
+        episode_id = os.path.splitext(os.path.basename(file_path))[0]
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO episodes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                    (episode_id, author, int(date), title, views, duration, file_path))
+
+        return episode_id
+
+    def add_folder(self, folder, extension=".wav"):
+        """
+        Adds all episodes of a folder that are not indexed yet. Used to import previously downloaded files.
+
+        :return: Number of added episodes.
+        """
+
+        with self.lock:
+            indexed = set(row[0] for row in self.connection.execute("SELECT file_path FROM episodes"))
+
+        added = 0
+        for file_name in sorted(os.listdir(folder)):
+            file_path = os.path.join(folder, file_name)
+            if file_name.endswith(extension) and file_path not in indexed:
+                if self.add_episode(file_path) is not None:
+                    added += 1
+
+        return added
+
+    def query_episodes(self, start_date=None, end_date=None):
+        """
+        Returns the episodes in a date range.
+
+        :param start_date: Do not return episodes before this date. Format: YYYYMMDD.
+        :param end_date: Do not return episodes after this date. Format: YYYYMMDD.
+        :return: Data frame with the columns (Date, Author, Title, Views, Episode_Id, Episode_File_Name, Duration).
+        """
+
+        query = "SELECT date, author, title, views, episode_id, file_path, duration FROM episodes WHERE 1 = 1"
+        parameters = []
+        if start_date is not None:
+            query += " AND date >= ?"
+            parameters.append(int(start_date))
+        if end_date is not None:
+            query += " AND date <= ?"
+            parameters.append(int(end_date))
+        query += " ORDER BY date, episode_id"
+
+        with self.lock:
+            rows = self.connection.execute(query, parameters).fetchall()
+
+        df = pd.DataFrame(rows, columns=["Date", "Author", "Title", "Views", "Episode_Id", "Episode_File_Name",
+                                         "Duration"])
+        df["Episode_File_Name"] = df["Episode_File_Name"].map(os.path.basename)
+        return df
+
+    def add_clips(self, episode_id, clips):
+        """
+        Adds (or updates) the clips of an episode.
+
+        :param episode_id: Id of the episode.
+        :param clips: List of (clip id, start in seconds, end in seconds, file path or None).
+        """
+
+        with self.lock, self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO clips VALUES (?, ?, ?, ?, ?)",
+                                        [(episode_id, clip_id, start, end, file_path)
+                                         for clip_id, start, end, file_path in clips])
+
+    def query_clips(self, episode_id):
+        """
+        Returns the clips of an episode.
+
+        :return: Data frame with the columns (Clip_Id, Start, End, File_Path) ordered by start time.
+        """
+
+        with self.lock:
+            rows = self.connection.execute("SELECT clip_id, start_time, end_time, file_path FROM clips "
+                                           "WHERE episode_id = ? ORDER BY start_time", (episode_id,)).fetchall()
+
+        return pd.DataFrame(rows, columns=["Clip_Id", "Start", "End", "File_Path"])
+
+    def close(self):
+        self.connection.close()
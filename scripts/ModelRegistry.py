@@ -0,0 +1,93 @@
+import os
+import threading
+import joblib
+from transformers import Wav2Vec2Processor, Wav2Vec2ForCTC
+import Wav2VecBackends
+
+# Loaded models are shared by all pipelines in the process.
+_loaded_models = {}
+_lock = threading.Lock()
+
+
+def load_pickle(path):
+    """Loads a pickled model (e.g. the TF-IDF vectorizer or the sentiment classifier) once per process.
+
+    The model is loaded again if the file changed since it was loaded. Numpy arrays in files written with joblib.dump are
+    memory-mapped instead of read into memory.
+
+    Parameters
+    ----------
+    path : str
+        Path of the pickle file.
+
+    Returns
+    -------
+    The unpickled object. Do not modify it, it is shared.
+    """
+
+    key = ("pickle", os.path.abspath(path))
+    modified_time = os.path.getmtime(path)
+
+    with _lock:
+        if key not in _loaded_models or _loaded_models[key][0] != modified_time:
+            # joblib.load also reads files written with pickle.dump.
+            _loaded_models[key] = (modified_time, joblib.load(path, mmap_mode="r"))
+
+        return _loaded_models[key][1]
+
+
+def load_wav2vec(model_name_or_path, offline=False):
+    """Loads a Wav2Vec2 processor and model once per process.
+
+    Parameters
+    ----------
+    model_name_or_path : str
+        Hugging Face Hub repository or local directory containing the model and processor files.
+    offline : bool
+        Never contact the Hub, only use local directories and the local Hugging Face cache.
+
+    Returns
+    -------
+    Wav2Vec2Processor, Wav2Vec2ForCTC in evaluation mode. Do not modify them, they are shared.
+    """
+
+    local_files_only = offline or os.path.isdir(model_name_or_path)
+    key = ("wav2vec", model_name_or_path)
+
+    with _lock:
+        if key not in _loaded_models:
+            processor = Wav2Vec2Processor.from_pretrained(model_name_or_path, local_files_only=local_files_only)
+            model = Wav2Vec2ForCTC.from_pretrained(model_name_or_path, local_files_only=local_files_only)
+            model.eval()
+            _loaded_models[key] = (processor, model)
+
+        return _loaded_models[key]
+
+
+def load_wav2vec_backend(model, backend="torch", onnx_path=None, use_attention_mask=False, num_threads=None):
+    """Creates an inference backend for a loaded Wav2Vec2 model once per process (see Wav2VecBackends.create_backend).
+
+    Quantizing the model or exporting and loading the ONNX graph takes a while, pipelines sharing a model share the
+    backend.
+
+    Returns
+    -------
+    Callable (input_values, attention_mask) returning the logits tensor. Do not modify it, it is shared.
+    """
+
+    key = ("wav2vec_backend", id(model), backend, onnx_path)
+
+    with _lock:
+        if key not in _loaded_models:
+            # Keep a reference to the model, so its id is not reused while the backend is cached.
+            _loaded_models[key] = (model, Wav2VecBackends.create_backend(model, backend, onnx_path, use_attention_mask,
+                                                                         num_threads))
+
+        return _loaded_models[key][1]
+
+
+def clear():
+    """Forgets all loaded models."""
+
+    with _lock:
+        _loaded_models.clear()
@@ -0,0 +1,480 @@
+import numpy as np
+import pandas as pd
+import soundfile as sf
+import AudioFeatureExtraction
+
+# Same settings as GetAudioFeatures.praat
+PITCH_FLOOR = 75  # in Hz
+PITCH_CEILING = 600  # in Hz
+VOICING_THRESHOLD = 0.45
+SILENCE_THRESHOLD = 0.03
+# Defaults of Praat's "To Pitch"
+MAX_CANDIDATES = 14  # voiced candidates per frame
+OCTAVE_COST = 0.01
+OCTAVE_JUMP_COST = 0.35
+VOICED_UNVOICED_COST = 0.14
+JITTER_SHORTEST_PERIOD = 0.0001  # in seconds
+JITTER_LONGEST_PERIOD = 0.02  # in seconds
+JITTER_MAX_PERIOD_FACTOR = 1.3
+SHIMMER_MAX_AMPLITUDE_FACTOR = 1.6
+LTAS_BANDWIDTH = 100  # in Hz
+HAMMARBERG_SPLIT_FREQUENCY = 2000  # in Hz
+HAMMARBERG_MAX_FREQUENCY = 5000  # in Hz
+
+DEFAULT_CHUNK_SIZE = 4
+
+# Largest median relative difference to the Praat script accepted per feature by check_praat_parity. On synthetic
+# voices the medians differ by less than 1 % except for the Hammarberg index (3 to 6 %): Praat's Ltas bins the
+# spectrum slightly differently. Pitch_Min and Pitch_Max depend on single frames at the edges of voiced intervals and
+# can differ by more than 10 % on individual clips even when their medians agree, don't compare them clip by clip.
+PRAAT_PARITY_TOLERANCES = {"Pitch_Min": 0.05,
+                           "Pitch_Max": 0.05,
+                           "Pitch_05_Quantile": 0.02,
+                           "Pitch_95_Quantile": 0.02,
+                           "Pitch_Range": 0.05,
+                           "Pitch_Stdev": 0.05,
+                           "Pitch_Mean": 0.02,
+                           "Pitch_Median": 0.02,
+                           "Jitter": 0.1,
+                           "Shimmer": 0.1,
+                           "Hammarberg_Index": 0.15}
+
+# Increase when the feature computation changes, cached features of older versions are not used anymore.
+VERSION = "2"
+
+AUDIO_FEATURE_NAMES = ["Pitch_Min",
+                       "Pitch_Max",
+                       "Pitch_05_Quantile",
+                       "Pitch_95_Quantile",
+                       "Pitch_Range",
+                       "Pitch_Stdev",
+                       "Pitch_Mean",
+                       "Pitch_Median",
+                       "Jitter",
+                       "Shimmer",
+                       "Hammarberg_Index"]
+
+
+def get_audio_features_batch(audio_clips, sampling_rate=16000, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Extracts the audio features of GetAudioFeatures.praat for a batch of audio clips without starting Praat.
+
+    Pitch is estimated with a windowed autocorrelation and a path finder like Praat's "To Pitch", jitter and shimmer
+    are computed from glottal pulses like Praat's "To PointProcess (periodic, cc)" and the Hammarberg index is taken
+    from a long-term average spectrum with 100 Hz bands. See PRAAT_PARITY_TOLERANCES for how close the features are to
+    the ones of the Praat script.
+
+    Parameters
+    ----------
+    audio_clips : list of np.ndarray
+        Mono audio clips.
+    sampling_rate : int
+        Sampling rate of the clips.
+    chunk_size : int
+        Number of clips processed in one vectorized step. Bounds the memory used for the framed audio.
+
+    Returns
+    -------
+    float32 array of shape (number of clips, 11) with the features in the order of AUDIO_FEATURE_NAMES.
+    Undefined features (e.g. no voiced frames) are NaN.
+    """
+
+    features = np.full((len(audio_clips), len(AUDIO_FEATURE_NAMES)), np.nan, dtype=np.float32)
+
+    for chunk_start in range(0, len(audio_clips), chunk_size):
+        chunk = audio_clips[chunk_start:chunk_start + chunk_size]
+        features[chunk_start:chunk_start + len(chunk)] = get_audio_features_chunk(chunk, sampling_rate)
+
+    return features
+
+
+def get_audio_features_chunk(audio_clips, sampling_rate):
+    """Extracts audio features for clips that fit into memory as one padded matrix.
+
+    """
+
+    lengths = np.array([len(audio) for audio in audio_clips])
+    window_length = int(round(3 / PITCH_FLOOR * sampling_rate))  # 3 periods of the pitch floor
+    padded = np.zeros((len(audio_clips), max(lengths.max(initial=0), window_length)), dtype=np.float64)
+    for i, audio in enumerate(audio_clips):
+        padded[i, :len(audio)] = audio
+
+    pitch, frame_starts = get_pitch(padded, lengths, sampling_rate)
+
+    features = np.full((len(audio_clips), len(AUDIO_FEATURE_NAMES)), np.nan)
+    voiced_clips = np.isfinite(pitch).any(axis=1)
+
+    if voiced_clips.any():
+        voiced_pitch = pitch[voiced_clips]
+        quantiles = np.nanquantile(voiced_pitch, [0.05, 0.5, 0.95], axis=1)
+
+        features[voiced_clips, 0] = np.nanmin(voiced_pitch, axis=1)
+        features[voiced_clips, 1] = np.nanmax(voiced_pitch, axis=1)
+        features[voiced_clips, 2] = quantiles[0]
+        features[voiced_clips, 3] = quantiles[2]
+        features[voiced_clips, 4] = quantiles[2] - quantiles[0]
+        features[voiced_clips, 6] = np.nanmean(voiced_pitch, axis=1)
+        features[voiced_clips, 7] = quantiles[1]
+
+        # Standard deviation in semitones, the reference frequency cancels out.
+        semitones = 12 * np.log2(voiced_pitch)
+        voiced_counts = np.isfinite(voiced_pitch).sum(axis=1)
+        multiple_voiced = voiced_counts > 1
+        stdev = np.full(len(voiced_pitch), np.nan)
+        stdev[multiple_voiced] = np.nanstd(semitones[multiple_voiced], axis=1, ddof=1)
+        features[voiced_clips, 5] = stdev
+
+    for i, audio in enumerate(padded):
+        pulses = get_pulses(audio[:lengths[i]], pitch[i], frame_starts[i], sampling_rate)
+        features[i, 8], features[i, 9] = get_jitter_and_shimmer(audio[:lengths[i]], pulses, sampling_rate)
+    features[:, 10] = get_hammarberg_index(padded, lengths, sampling_rate)
+
+    return features
+
+
+def get_pitch(padded, lengths, sampling_rate):
+    """Estimates the pitch contour of padded clips like Praat's "To Pitch" (autocorrelation method).
+
+    Every frame gets up to MAX_CANDIDATES voiced candidates (peaks of the normalized autocorrelation, Boersma 1993) and
+    an unvoiced candidate. A Viterbi path finder picks one candidate per frame with Praat's octave, octave jump and
+    voiced/unvoiced costs, which removes most octave errors.
+
+    Returns
+    -------
+    Pitch in Hz per frame (NaN for unvoiced frames) and the start sample of every frame, both per clip.
+    """
+
+    time_step = int(round(0.75 / PITCH_FLOOR * sampling_rate))
+    window_length = int(round(3 / PITCH_FLOOR * sampling_rate))
+    min_lag = int(np.floor(sampling_rate / PITCH_CEILING))
+    max_lag = int(np.ceil(sampling_rate / PITCH_FLOOR))
+    fft_length = int(2 ** np.ceil(np.log2(2 * window_length)))
+
+    # Like Praat, the frames are centred in the clip: the samples before the first frame are never analysed.
+    offsets = np.maximum(lengths - window_length, 0) % time_step // 2
+    if offsets.any():
+        padded = np.stack([np.roll(audio, -offset) for audio, offset in zip(padded, offsets)])
+
+    frames = np.lib.stride_tricks.sliding_window_view(padded, window_length, axis=1)[:, ::time_step]
+    frame_starts = offsets[:, np.newaxis] + np.arange(frames.shape[1]) * time_step
+    in_clip = frame_starts + window_length <= np.maximum(lengths, window_length)[:, np.newaxis]
+
+    # Like Praat, the local peak is taken within half a longest period around the centre of the frame.
+    half_period = int(sampling_rate / PITCH_FLOOR) // 2 + 1
+    centre = slice(max(window_length // 2 - half_period, 0), min(window_length // 2 + half_period, window_length))
+    frame_peaks = np.abs(frames - frames.mean(axis=2, keepdims=True))[..., centre].max(axis=2)
+    global_peaks = np.abs(padded).max(axis=1, keepdims=True)
+
+    window = np.hanning(window_length)
+    windowed = (frames - frames.mean(axis=2, keepdims=True)) * window
+
+    # Autocorrelation of each frame divided by the autocorrelation of the window (Boersma 1993).
+    frame_autocorrelation = np.fft.irfft(np.abs(np.fft.rfft(windowed, fft_length, axis=2)) ** 2, axis=2)
+    window_autocorrelation = np.fft.irfft(np.abs(np.fft.rfft(window, fft_length)) ** 2)
+    energy = frame_autocorrelation[..., :1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        normalized = frame_autocorrelation[..., min_lag - 1:max_lag + 2] \
+                     / window_autocorrelation[min_lag - 1:max_lag + 2] \
+                     / np.where(energy > 0, energy, np.inf) * window_autocorrelation[0]
+
+    # Local maxima of the autocorrelation, with parabolic interpolation of lag and height.
+    left, centre, right = normalized[..., :-2], normalized[..., 1:-1], normalized[..., 2:]
+    is_peak = (centre > left) & (centre >= right) & (centre > 0.5 * VOICING_THRESHOLD)
+    denominator = left - 2 * centre + right
+    with np.errstate(divide="ignore", invalid="ignore"):
+        offset = np.clip(np.where(denominator < 0, 0.5 * (left - right) / denominator, 0), -0.5, 0.5)
+    lags = min_lag + np.arange(centre.shape[2]) + offset
+    heights = centre - 0.25 * (left - right) * offset
+    # Heights above 1 come from the normalization of short or clipped frames.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        heights = np.where(heights > 1, 1 / heights, heights)
+        strengths = np.where(is_peak, heights - OCTAVE_COST * np.log2(PITCH_CEILING * lags / sampling_rate), -np.inf)
+
+    # Keep the strongest candidates of every frame.
+    candidate_count = min(MAX_CANDIDATES, strengths.shape[2])
+    best = np.argpartition(-strengths, candidate_count - 1, axis=2)[..., :candidate_count]
+    voiced_strengths = np.take_along_axis(strengths, best, axis=2)
+    voiced_frequencies = sampling_rate / np.take_along_axis(lags, best, axis=2)
+    voiced_strengths[~in_clip] = -np.inf
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        relative_peaks = frame_peaks / np.where(global_peaks > 0, global_peaks, np.inf)
+    unvoiced_strengths = VOICING_THRESHOLD + np.maximum(
+        0, 2 - relative_peaks / (SILENCE_THRESHOLD / (1 + VOICING_THRESHOLD)))
+
+    # Candidate 0 of every frame is unvoiced.
+    candidate_strengths = np.concatenate([unvoiced_strengths[..., np.newaxis], voiced_strengths], axis=2)
+    candidate_frequencies = np.concatenate([np.full(unvoiced_strengths.shape + (1,), np.nan), voiced_frequencies],
+                                           axis=2)
+    path = find_pitch_path(candidate_strengths, candidate_frequencies, time_step / sampling_rate)
+
+    pitch = np.take_along_axis(candidate_frequencies, path[..., np.newaxis], axis=2)[..., 0]
+    pitch[(pitch < PITCH_FLOOR) | (pitch > PITCH_CEILING)] = np.nan
+
+    return pitch, frame_starts
+
+
+def find_pitch_path(strengths, frequencies, time_step):
+    """Finds the candidate path with the highest total strength minus transition costs, like Praat's path finder.
+
+    Parameters
+    ----------
+    strengths, frequencies : np.ndarray
+        Shape (clips, frames, candidates). Candidate 0 is unvoiced (frequency NaN).
+    time_step : float
+        Seconds between frames. The transition costs are given per 10 ms.
+
+    Returns
+    -------
+    Index of the chosen candidate per clip and frame.
+    """
+
+    clips, frame_count, candidate_count = strengths.shape
+    cost_factor = 0.01 / time_step
+
+    with np.errstate(invalid="ignore"):
+        log_frequencies = np.log2(frequencies)
+    voiced = ~np.isnan(frequencies)
+
+    backpointers = np.zeros((clips, frame_count, candidate_count), dtype=np.int64)
+    scores = strengths[:, 0].copy() if frame_count > 0 else np.zeros((clips, candidate_count))
+
+    for frame in range(1, frame_count):
+        # (clips, previous candidate, candidate)
+        previous_voiced = voiced[:, frame - 1, :, np.newaxis]
+        current_voiced = voiced[:, frame, np.newaxis, :]
+        jump_cost = OCTAVE_JUMP_COST * np.abs(log_frequencies[:, frame - 1, :, np.newaxis]
+                                              - log_frequencies[:, frame, np.newaxis, :])
+        transition_cost = np.where(previous_voiced & current_voiced, jump_cost,
+                                   np.where(previous_voiced ^ current_voiced, VOICED_UNVOICED_COST, 0))
+        total = scores[:, :, np.newaxis] - cost_factor * transition_cost
+        backpointers[:, frame] = np.argmax(total, axis=1)
+        scores = np.take_along_axis(total, backpointers[:, frame, np.newaxis, :], axis=1)[:, 0] + strengths[:, frame]
+
+    path = np.zeros((clips, frame_count), dtype=np.int64)
+    if frame_count > 0:
+        path[:, -1] = np.argmax(scores, axis=1)
+        for frame in range(frame_count - 1, 0, -1):
+            path[:, frame - 1] = np.take_along_axis(backpointers[:, frame], path[:, frame, np.newaxis], axis=1)[:, 0]
+
+    return path
+
+
+def get_pulses(audio, pitch, frame_starts, sampling_rate):
+    """Finds the glottal pulses of a clip like Praat's "To PointProcess (periodic, cc)".
+
+    In every voiced interval the first pulse is put on the absolute extremum in the middle. From there the next pulses
+    are found period by period in both directions at the maximum of the cross-correlation with the previous period.
+
+    Parameters
+    ----------
+    audio : np.ndarray
+        Audio of the clip.
+    pitch : np.ndarray
+        Pitch per frame from get_pitch (NaN for unvoiced frames).
+    frame_starts : np.ndarray
+        Start sample of every frame.
+
+    Returns
+    -------
+    Sorted float array of pulse positions in samples.
+    """
+
+    window_length = int(round(3 / PITCH_FLOOR * sampling_rate))
+    time_step = frame_starts[1] - frame_starts[0] if len(frame_starts) > 1 else window_length
+    frame_centres = frame_starts + window_length / 2
+
+    voiced = np.isfinite(pitch).astype(np.int8)
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], voiced, [0]])))
+    pulses = []
+
+    for first, last in zip(edges[::2], edges[1::2]):
+        start = int(max(frame_centres[first] - time_step / 2, 1))
+        end = int(min(frame_centres[last - 1] + time_step / 2, len(audio) - 1))
+        centres = frame_centres[first:last]
+        periods = sampling_rate / pitch[first:last]
+
+        middle = (start + end) // 2
+        half_period = np.interp(middle, centres, periods) / 2
+        search_start = int(max(start, middle - half_period))
+        search_end = int(min(end, middle + half_period + 1))
+        if search_end - search_start < 3:
+            continue
+
+        extremum = search_start + int(np.argmax(np.abs(audio[search_start:search_end])))
+        first_pulse = extremum + get_parabolic_offset(*np.abs(audio[extremum - 1:extremum + 2]))
+        pulses.append(first_pulse)
+
+        for direction in [1, -1]:
+            pulse = first_pulse
+            while True:
+                period = np.interp(pulse, centres, periods)
+                half_length = int(period / 2)
+                position = int(round(pulse))
+                offsets = np.arange(int(0.8 * period) - 1, int(1.25 * period) + 2)
+                candidates = position + direction * offsets
+                if min(candidates.min(), position) - half_length < start \
+                        or max(candidates.max(), position) + half_length >= end:
+                    break
+
+                reference = audio[position - half_length:position + half_length + 1]
+                segments = audio[candidates[:, np.newaxis] + np.arange(-half_length, half_length + 1)]
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    correlations = segments @ reference / np.sqrt((segments ** 2).sum(axis=1) * (reference @ reference))
+                correlations = np.nan_to_num(correlations, nan=-1.0)
+
+                best = 1 + int(np.argmax(correlations[1:-1]))
+                pulse += direction * (offsets[best] + get_parabolic_offset(*correlations[best - 1:best + 2]))
+                pulses.append(pulse)
+
+    return np.sort(np.array(pulses, dtype=np.float64))
+
+
+def get_jitter_and_shimmer(audio, pulses, sampling_rate):
+    """Computes local jitter and shimmer from glottal pulses like Praat's "Get jitter (local)" and
+    "Get shimmer (local)".
+
+    Jitter is the mean absolute difference of consecutive periods divided by the mean period. Shimmer is the mean
+    absolute difference of the amplitudes of consecutive periods divided by the mean amplitude, the amplitude of a
+    pulse being the Hann windowed RMS around it. Periods outside of Praat's shortest/longest period, pairs of periods
+    differing by more than the maximum period factor and amplitudes differing by more than the maximum amplitude factor
+    are skipped.
+
+    Returns
+    -------
+    Tuple of jitter and shimmer, NaN if there are not enough periods.
+    """
+
+    periods = np.diff(pulses) / sampling_rate
+    valid = (periods >= JITTER_SHORTEST_PERIOD) & (periods <= JITTER_LONGEST_PERIOD)
+    pairs = valid[1:] & valid[:-1] \
+        & (np.maximum(periods[1:], periods[:-1]) <= JITTER_MAX_PERIOD_FACTOR * np.minimum(periods[1:], periods[:-1]))
+    if not pairs.any():
+        return np.nan, np.nan
+
+    jitter = np.abs(np.diff(periods))[pairs].mean() / periods[valid].mean()
+
+    # Amplitudes of the pulses surrounded by two valid periods.
+    amplitude_pulses = np.flatnonzero(pairs) + 1
+    amplitudes = np.array([get_hann_windowed_rms(audio, pulses[i], 0.2 * (pulses[i] - pulses[i - 1]),
+                                                 0.2 * (pulses[i + 1] - pulses[i])) for i in amplitude_pulses])
+    amplitude_periods = np.diff(pulses[amplitude_pulses]) / sampling_rate
+    with np.errstate(divide="ignore", invalid="ignore"):
+        amplitude_pairs = (amplitude_periods >= JITTER_SHORTEST_PERIOD) & (amplitude_periods <= JITTER_LONGEST_PERIOD) \
+            & (np.maximum(amplitudes[1:], amplitudes[:-1])
+               <= SHIMMER_MAX_AMPLITUDE_FACTOR * np.minimum(amplitudes[1:], amplitudes[:-1]))
+    if not amplitude_pairs.any() or not amplitudes.mean() > 0:
+        return jitter, np.nan
+
+    shimmer = np.abs(np.diff(amplitudes))[amplitude_pairs].mean() / amplitudes.mean()
+
+    return jitter, shimmer
+
+
+def get_hann_windowed_rms(audio, centre, left_width, right_width):
+    """Returns the RMS of the audio around centre (in samples), weighted by a Hann window whose left and right halves
+    are left_width and right_width samples wide."""
+
+    first = max(int(np.ceil(centre - left_width)), 0)
+    last = min(int(np.floor(centre + right_width)), len(audio) - 1)
+    if last <= first:
+        return np.nan
+
+    positions = np.arange(first, last + 1)
+    phase = np.where(positions < centre, (positions - centre) / left_width, (positions - centre) / right_width)
+    weights = 0.5 + 0.5 * np.cos(np.pi * phase)
+
+    return np.sqrt(np.sum(audio[positions] ** 2 * weights) / np.sum(weights))
+
+
+def get_parabolic_offset(left, centre, right):
+    """Returns the offset of the peak of a parabola through three equally spaced points from the middle point."""
+
+    denominator = left - 2 * centre + right
+    return float(np.clip(0.5 * (left - right) / denominator, -0.5, 0.5)) if denominator < 0 else 0.0
+
+
+def get_hammarberg_index(padded, lengths, sampling_rate):
+    """Computes the Hammarberg index: maximum LTAS level below 2 kHz minus maximum LTAS level from 2 to 5 kHz.
+
+    """
+
+    spectrum = np.abs(np.fft.rfft(padded, axis=1)) ** 2
+    frequencies = np.fft.rfftfreq(padded.shape[1], 1 / sampling_rate)
+
+    band_starts = np.searchsorted(frequencies, np.arange(0, HAMMARBERG_MAX_FREQUENCY, LTAS_BANDWIDTH))
+    band_counts = np.diff(np.append(band_starts, np.searchsorted(frequencies, HAMMARBERG_MAX_FREQUENCY)))
+    band_power = np.add.reduceat(spectrum, band_starts, axis=1) / np.maximum(band_counts, 1)
+
+    split_band = HAMMARBERG_SPLIT_FREQUENCY // LTAS_BANDWIDTH
+    with np.errstate(divide="ignore", invalid="ignore"):
+        band_levels = 10 * np.log10(band_power)
+        hammarberg = band_levels[:, :split_band].max(axis=1) - band_levels[:, split_band:].max(axis=1)
+    hammarberg[(lengths == 0) | ~np.isfinite(hammarberg)] = np.nan
+
+    return hammarberg
+
+
+def compare_with_praat(audio_files, praat_path="praat", praat_script="praat/GetAudioFeatures.praat",
+                       tolerances=None):
+    """Compares the native features with the output of the Praat script.
+
+    Parameters
+    ----------
+    audio_files : list of str
+        Audio files (16 kHz mono) to compare on.
+    praat_path : str
+        Path to the Praat installation.
+    praat_script : str
+        The Praat script used to extract the audio features.
+    tolerances : dict
+        Largest accepted median relative difference per feature, PRAAT_PARITY_TOLERANCES by default.
+
+    Returns
+    -------
+    Data frame with the median relative difference per feature over all files where both are defined, the tolerance
+    and whether the feature is within it. Features that could not be compared on any file are not within tolerance.
+    """
+
+    tolerances = PRAAT_PARITY_TOLERANCES if tolerances is None else tolerances
+
+    audio_clips = [sf.read(audio_file, dtype="float32")[0] for audio_file in audio_files]
+    native = get_audio_features_batch(audio_clips)
+
+    praat = np.full(native.shape, np.nan)
+    for i, audio_file in enumerate(audio_files):
+        praat_features = AudioFeatureExtraction.get_audio_features(audio_file, praat_path, praat_script)
+        if len(praat_features) == len(AUDIO_FEATURE_NAMES):
+            praat[i] = pd.to_numeric(pd.Series(praat_features), errors="coerce")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        relative_difference = np.abs(native - praat) / np.abs(praat)
+
+    df_comparison = pd.DataFrame({"Feature": AUDIO_FEATURE_NAMES,
+                                  "Median_Relative_Difference": [
+                                      np.median(difference[np.isfinite(difference)])
+                                      if np.isfinite(difference).any() else np.nan
+                                      for difference in relative_difference.T],
+                                  "Compared_Clips": np.isfinite(relative_difference).sum(axis=0),
+                                  "Tolerance": [tolerances[name] for name in AUDIO_FEATURE_NAMES]})
+    df_comparison["Within_Tolerance"] = df_comparison["Median_Relative_Difference"] <= df_comparison["Tolerance"]
+
+    return df_comparison
+
+
+def check_praat_parity(audio_files, praat_path="praat", praat_script="praat/GetAudioFeatures.praat", tolerances=None):
+    """Raises a ValueError if a native feature differs from the Praat script by more than its tolerance.
+
+    The models are trained on features of the Praat script, run this on a sample of episodes before switching to the
+    native backend. See compare_with_praat for the parameters.
+
+    Returns
+    -------
+    The comparison data frame of compare_with_praat.
+    """
+
+    df_comparison = compare_with_praat(audio_files, praat_path, praat_script, tolerances)
+    df_diverging = df_comparison[~df_comparison["Within_Tolerance"]]
+    if len(df_diverging) > 0:
+        raise ValueError("Native audio features diverge from Praat:\n" + df_diverging.to_string(index=False))
+
+    return df_comparison
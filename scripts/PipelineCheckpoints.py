@@ -0,0 +1,64 @@
+import os
+import pickle
+
+
+class CheckpointStore:
+    """Stores the intermediate data frame of every pipeline stage per episode on disk.
+
+    A checkpoint is up to date if it was written with the same stage version and after all of its source files were last
+    modified. Checkpoints are written atomically, so an interrupted run never leaves a partial checkpoint behind.
+    """
+
+    def __init__(self, folder):
+        """
+        :param folder: Folder for the checkpoints. One sub folder is created per stage.
+        """
+
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def get_path(self, stage, episode_key):
+        return os.path.join(self.folder, stage, episode_key + ".pkl")
+
+    def is_up_to_date(self, stage, episode_key, version, source_files=()):
+        """
+        Checks whether a checkpoint can be used instead of running the stage again.
+
+        :param stage: Name of the stage.
+        :param episode_key: Unique name of the episode.
+        :param version: Version string of the stage settings. Checkpoints written with other settings are outdated.
+        :param source_files: Files the stage output depends on.
+        :return: True if the checkpoint exists and is up to date.
+        """
+
+        path = self.get_path(stage, episode_key)
+        if not os.path.isfile(path):
+            return False
+
+        checkpoint_time = os.path.getmtime(path)
+        for source_file in source_files:
+            if os.path.exists(source_file) and os.path.getmtime(source_file) > checkpoint_time:
+                return False
+
+        # The version is pickled before the data, so the data does not have to be loaded here.
+        with open(path, "rb") as checkpoint_file:
+            return pickle.load(checkpoint_file) == version
+
+    def load(self, stage, episode_key):
+        """Returns the data frame saved for a stage."""
+
+        with open(self.get_path(stage, episode_key), "rb") as checkpoint_file:
+            pickle.load(checkpoint_file)  # version
+            return pickle.load(checkpoint_file)
+
+    def save(self, stage, episode_key, version, df):
+        """Saves the data frame of a stage."""
+
+        path = self.get_path(stage, episode_key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as checkpoint_file:
+            pickle.dump(version, checkpoint_file)
+            pickle.dump(df, checkpoint_file)
+        os.replace(temp_path, path)
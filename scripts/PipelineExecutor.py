@@ -0,0 +1,145 @@
+import queue
+import threading
+import traceback
+
+DEFAULT_QUEUE_SIZE = 2
+
+# Marks the end of the input of a stage.
+END = object()
+
+
+class Stage:
+    """A step of a PipelineExecutor with its own pool of worker threads."""
+
+    def __init__(self, name, function, workers=1, queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        :param name: Name of the stage, used in error messages.
+        :param function: Function taking an item and returning the item passed on to the next stage. Items for which it
+         returns None are dropped.
+        :param workers: Number of threads running the function in parallel.
+        :param queue_size: Maximum number of items waiting for this stage. A full queue blocks the previous stage, which
+         bounds the number of items (and their memory) in flight.
+        """
+
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.queue_size = queue_size
+
+
+class PipelineExecutor:
+    """Runs items through a chain of stages, with bounded queues between the stages.
+
+    Every stage has its own worker pool, so different items are in different stages at the same time: while one episode
+    is transcribed the next one is downloaded and decoded. Threads are enough because the heavy lifting releases the
+    GIL (ffmpeg, Praat and youtube-dl run in subprocesses, torch and NumPy compute outside of Python).
+
+    Items leave the executor in the order they finish, which is not necessarily the input order. An exception in a
+    stage drops only the affected item and is reported to on_error.
+    """
+
+    def __init__(self, stages, on_error=None):
+        """
+        :param stages: List of Stage, in order.
+        :param on_error: Called with (stage name, item, exception) when a stage fails for an item. Defaults to printing
+         the traceback.
+        """
+
+        self.stages = stages
+        self.on_error = on_error or print_error
+
+    def run(self, items):
+        """
+        Feeds items into the first stage and yields the outputs of the last stage as soon as they are ready.
+
+        :param items: Iterable of input items. It is consumed lazily, only as fast as the first stage accepts items.
+        :return: Generator of output items.
+        """
+
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        # The outputs are consumed by the caller, who may stop early.
+        queues.append(queue.Queue(maxsize=max(self.stages[-1].queue_size, 1)))
+        stop = threading.Event()
+
+        def put(target_queue, item):
+            # Give up waiting for space once the executor is stopped, so no thread blocks forever.
+            while not stop.is_set():
+                try:
+                    target_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def get(source_queue):
+            while not stop.is_set():
+                try:
+                    return source_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            return END
+
+        def feed():
+            try:
+                for item in items:
+                    if not put(queues[0], item):
+                        return
+            except Exception as e:
+                self.on_error("input", None, e)
+            for _ in range(self.stages[0].workers):
+                put(queues[0], END)
+
+        def work(stage_index, remaining_workers, lock):
+            stage = self.stages[stage_index]
+            input_queue = queues[stage_index]
+            output_queue = queues[stage_index + 1]
+
+            while True:
+                item = get(input_queue)
+                if item is END or stop.is_set():
+                    break
+
+                try:
+                    output = stage.function(item)
+                except Exception as e:
+                    self.on_error(stage.name, item, e)
+                    continue
+
+                if output is not None and not put(output_queue, output):
+                    break
+
+            # The last worker of a stage ends the next stage.
+            with lock:
+                remaining_workers[0] -= 1
+                last_worker = remaining_workers[0] == 0
+            if last_worker:
+                next_workers = self.stages[stage_index + 1].workers if stage_index + 1 < len(self.stages) else 1
+                for _ in range(next_workers):
+                    put(output_queue, END)
+
+        threads = [threading.Thread(target=feed, daemon=True)]
+        for stage_index, stage in enumerate(self.stages):
+            remaining_workers = [stage.workers]
+            lock = threading.Lock()
+            threads.extend(threading.Thread(target=work, args=(stage_index, remaining_workers, lock), daemon=True)
+                           for _ in range(stage.workers))
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is END:
+                    break
+                yield item
+        finally:
+            # Workers finish their current item and exit.
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+
+def print_error(stage_name, item, exception):
+    print("Stage " + stage_name + " failed: " + "".join(traceback.format_exception(type(exception), exception,
+                                                                                 exception.__traceback__)))
@@ -0,0 +1,322 @@
+import argparse
+import os
+import re
+import numpy as np
+import pandas as pd
+
+DEFAULT_PRICES_FOLDER = os.path.join("..", "coin-prices")
+DEFAULT_SENTIMENT_VALUES = {"bullish": 1, "neutral": 0, "bearish": -1}
+DEFAULT_WINDOWS = [1, 3, 7, 14, 30]
+DEFAULT_LAGS = [0, 1, 2, 3, 7]
+DEFAULT_HORIZONS = [1, 3, 7, 14]
+
+# e.g. btc_daily_ytd_2021-07-04.csv or all_coins_weekly_2y_2021-07-04.csv
+PRICE_FILE_REGEX = re.compile(r"^(?P<name>.+)_(?P<interval>daily|weekly)_(?P<period>[^_]+)_"
+                              r"(?P<date>\d{4}-\d{2}-\d{2})\.csv$")
+# Weekly bars start on Mondays, like the weekly bars of Yahoo Finance.
+WEEKLY_BAR_WEEKDAY = 0
+
+
+def read_price_file(path):
+    """Reads a price file downloaded with CoinPricesForEval.ipynb.
+
+    Single coin files have the columns (Date, Open, High, Low, Close, Volume) and the coin is taken from the file name.
+    all_coins files have two header rows (ticker, field) followed by a "Date" row.
+
+    Returns
+    -------
+    Data frame with a DatetimeIndex and (coin, field) column pairs, e.g. ("BTC", "Close").
+    """
+
+    name = PRICE_FILE_REGEX.match(os.path.basename(path)).group("name")
+
+    if name == "all_coins":
+        df = pd.read_csv(path, header=[0, 1], index_col=0, skiprows=[2], parse_dates=True)
+        df.columns = pd.MultiIndex.from_tuples([(ticker.split("-")[0].upper(), field) for ticker, field in df.columns])
+    else:
+        df = pd.read_csv(path, index_col=0, parse_dates=True)
+        df.columns = pd.MultiIndex.from_product([[name.upper()], df.columns])
+
+    df.index.name = "Date"
+    df.columns.names = ["Coin", "Field"]
+    return df
+
+
+def get_weekly_bars(df, download_date=None):
+    """Selects the weekly bars starting on WEEKLY_BAR_WEEKDAY that were complete when they were downloaded.
+
+    Downloads for a period starting on another weekday (e.g. the ytd files starting on Friday, January 1st) have weekly
+    bars anchored to that weekday, and the last bar of a download is an incomplete week dated with the download day.
+    Both would interleave with the complete Monday bars of other downloads.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Weekly bars with a DatetimeIndex of the first day of every bar.
+    download_date : str or pd.Timestamp
+        Date of the download. Bars of weeks ending after it are dropped. None keeps the last bar.
+
+    Returns
+    -------
+    Data frame with the selected rows of df.
+    """
+
+    dates = df.index
+    selected = dates.dayofweek == WEEKLY_BAR_WEEKDAY
+    if download_date is not None:
+        selected &= dates + pd.Timedelta(days=7) <= pd.Timestamp(download_date)
+
+    return df[selected]
+
+
+def load_prices(prices_folder=DEFAULT_PRICES_FOLDER, interval="daily"):
+    """Loads all price files of an interval (recursively) into one data frame.
+
+    Values of newer downloads (by the date in the file name) replace values of older downloads for the same day. Weekly
+    files only contribute their complete Monday bars, see get_weekly_bars.
+
+    Parameters
+    ----------
+    prices_folder : str
+        Folder with the price files, e.g. the coin-prices folder.
+    interval : str
+        daily or weekly.
+
+    Returns
+    -------
+    Data frame with a sorted DatetimeIndex and (coin, field) column pairs.
+    """
+
+    price_files = []
+    for folder, _, file_names in os.walk(prices_folder):
+        for file_name in file_names:
+            match = PRICE_FILE_REGEX.match(file_name)
+            if match is not None and match.group("interval") == interval:
+                price_files.append((match.group("date"), os.path.join(folder, file_name)))
+
+    long_dfs = []
+    for download_order, (download_date, path) in enumerate(sorted(price_files)):
+        df = read_price_file(path)
+        if interval == "weekly":
+            df = get_weekly_bars(df, download_date)
+        long_df = df.stack(["Coin", "Field"]).rename("Value").reset_index()
+        long_df["Download_Order"] = download_order
+        long_dfs.append(long_df)
+
+    if len(long_dfs) == 0:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name="Date"),
+                            columns=pd.MultiIndex.from_tuples([], names=["Coin", "Field"]))
+
+    df = pd.concat(long_dfs, ignore_index=True).dropna(subset=["Value"])
+    df = df.sort_values("Download_Order").drop_duplicates(["Date", "Coin", "Field"], keep="last")
+
+    return df.pivot(index="Date", columns=["Coin", "Field"], values="Value").sort_index().sort_index(axis=1)
+
+
+def align_sentiments_to_prices(df_sentiments, price_dates, coins, sentiment_values=DEFAULT_SENTIMENT_VALUES):
+    """Sums the sentiment scores and counts of every coin per price period.
+
+    Every sentiment is assigned to the first price date on or after its date (an as-of join), so sentiments between two
+    weekly prices count for the next price.
+
+    Parameters
+    ----------
+    df_sentiments : pd.DataFrame
+        Output of SentimentAnalysisPipeline.get_sentiments with the columns Date (YYYYMMDD), Coin and Sentiment.
+    price_dates : pd.DatetimeIndex
+        Sorted dates of the prices.
+    coins : list
+        Coins in the order of the output columns.
+    sentiment_values : dict
+        Score of every sentiment label. Other labels are ignored.
+
+    Returns
+    -------
+    Float arrays of shape (number of price dates, number of coins) with the summed scores and the number of sentiments.
+    """
+
+    df = df_sentiments[df_sentiments["Sentiment"].isin(sentiment_values) & df_sentiments["Coin"].isin(coins)]
+    df = pd.DataFrame({"Date": pd.to_datetime(df["Date"].astype(str), format="%Y%m%d"),
+                       "Coin_Index": pd.Categorical(df["Coin"], categories=coins).codes,
+                       "Score": df["Sentiment"].map(sentiment_values).astype(np.float64)}).sort_values("Date")
+
+    df = pd.merge_asof(df, pd.DataFrame({"Date": price_dates, "Price_Index": np.arange(len(price_dates))}),
+                       on="Date", direction="forward").dropna(subset=["Price_Index"])
+
+    scores = np.zeros((len(price_dates), len(coins)))
+    counts = np.zeros((len(price_dates), len(coins)))
+    price_indices = df["Price_Index"].to_numpy(dtype=np.int64)
+    coin_indices = df["Coin_Index"].to_numpy(dtype=np.int64)
+    np.add.at(scores, (price_indices, coin_indices), df["Score"].to_numpy())
+    np.add.at(counts, (price_indices, coin_indices), 1)
+
+    return scores, counts
+
+
+def get_rolling_sentiment_indices(scores, counts, windows):
+    """Computes the mean sentiment score over the last w price periods for every window w.
+
+    Returns
+    -------
+    Float array of shape (number of windows, number of price dates, number of coins). NaN where the window holds no
+    sentiments.
+    """
+
+    score_sums = np.concatenate([np.zeros((1,) + scores.shape[1:]), np.cumsum(scores, axis=0)])
+    count_sums = np.concatenate([np.zeros((1,) + counts.shape[1:]), np.cumsum(counts, axis=0)])
+    ends = np.arange(1, len(scores) + 1)
+
+    indices = np.empty((len(windows),) + scores.shape)
+    for i, window in enumerate(windows):
+        starts = np.maximum(ends - window, 0)
+        window_counts = count_sums[ends] - count_sums[starts]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            indices[i] = np.where(window_counts > 0, (score_sums[ends] - score_sums[starts]) / window_counts, np.nan)
+
+    return indices
+
+
+def get_forward_returns(prices, horizons):
+    """Computes the log return from every price date to h price periods later for every horizon h.
+
+    Parameters
+    ----------
+    prices : np.ndarray
+        Prices of shape (number of price dates, number of coins).
+
+    Returns
+    -------
+    Float array of shape (number of horizons, number of price dates, number of coins). NaN near the end.
+    """
+
+    log_prices = np.log(prices)
+    returns = np.full((len(horizons),) + prices.shape, np.nan)
+    for i, horizon in enumerate(horizons):
+        if horizon < len(prices):
+            returns[i, :len(prices) - horizon] = log_prices[horizon:] - log_prices[:-horizon or None]
+
+    return returns
+
+
+def shift_forward(values, lag):
+    """Shifts an array of shape (..., price dates, coins) so that position t holds the value of t + lag."""
+
+    shifted = np.full(values.shape, np.nan)
+    if lag < values.shape[-2]:
+        shifted[..., :values.shape[-2] - lag, :] = values[..., lag:, :]
+
+    return shifted
+
+
+def evaluate(df_sentiments, prices, windows=DEFAULT_WINDOWS, lags=DEFAULT_LAGS, horizons=DEFAULT_HORIZONS,
+             price_field="Close", sentiment_values=DEFAULT_SENTIMENT_VALUES, coins=None):
+    """Compares rolling sentiment indices with future price returns for every coin, window, lag and horizon.
+
+    The sentiment index at price date t (mean score over the last window periods) is compared with the log return from
+    t + lag to t + lag + horizon.
+
+    Parameters
+    ----------
+    df_sentiments : pd.DataFrame
+        Output of SentimentAnalysisPipeline.get_sentiments.
+    prices : pd.DataFrame
+        Output of load_prices.
+    windows, lags, horizons : list of int
+        Numbers of price periods (days for daily prices).
+    price_field : str
+        Price column used for the returns.
+    coins : list
+        Coins to evaluate. Defaults to all coins with prices and sentiments.
+
+    Returns
+    -------
+    Data frame with the columns (Coin, Window, Lag, Horizon, Correlation, Hit_Rate, Observations). Correlation is the
+    Pearson correlation of index and return, Hit_Rate the share of non-zero indices whose sign matches the return.
+    """
+
+    if coins is None:
+        coins = sorted(set(prices.columns.get_level_values("Coin")) & set(df_sentiments["Coin"].dropna()))
+
+    close = prices.reindex(columns=pd.MultiIndex.from_product([coins, [price_field]]))
+    price_array = close.to_numpy(dtype=np.float64)
+    scores, counts = align_sentiments_to_prices(df_sentiments, prices.index, coins, sentiment_values)
+
+    # (windows, 1, dates, coins) and (1, horizons, dates, coins)
+    indices = get_rolling_sentiment_indices(scores, counts, windows)[:, np.newaxis]
+    returns = get_forward_returns(price_array, horizons)
+
+    results = []
+    for lag in lags:
+        lagged_returns = shift_forward(returns, lag)[np.newaxis]
+
+        valid = np.isfinite(indices) & np.isfinite(lagged_returns)
+        observations = valid.sum(axis=2)
+        x = np.where(valid, indices, 0)
+        y = np.where(valid, lagged_returns, 0)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_x = x.sum(axis=2, keepdims=True) / observations[:, :, np.newaxis]
+            mean_y = y.sum(axis=2, keepdims=True) / observations[:, :, np.newaxis]
+            dx = np.where(valid, x - mean_x, 0)
+            dy = np.where(valid, y - mean_y, 0)
+            correlation = (dx * dy).sum(axis=2) / np.sqrt((dx ** 2).sum(axis=2) * (dy ** 2).sum(axis=2))
+
+            signals = valid & (x != 0)
+            hits = (signals & (np.sign(x) == np.sign(y))).sum(axis=2)
+            hit_rate = hits / signals.sum(axis=2)
+
+        window_grid, horizon_grid, coin_grid = np.meshgrid(np.arange(len(windows)), np.arange(len(horizons)),
+                                                           np.arange(len(coins)), indexing="ij")
+        results.append(pd.DataFrame({"Coin": np.asarray(coins, dtype=object)[coin_grid.ravel()],
+                                     "Window": np.asarray(windows)[window_grid.ravel()],
+                                     "Lag": lag,
+                                     "Horizon": np.asarray(horizons)[horizon_grid.ravel()],
+                                     "Correlation": correlation.ravel(),
+                                     "Hit_Rate": hit_rate.ravel(),
+                                     "Observations": observations.ravel()}))
+
+    if len(results) == 0:
+        return pd.DataFrame(columns=["Coin", "Window", "Lag", "Horizon", "Correlation", "Hit_Rate", "Observations"])
+
+    return pd.concat(results, ignore_index=True).sort_values(["Coin", "Window", "Lag", "Horizon"], ignore_index=True)
+
+
+def get_sentiment_index_df(df_sentiments, prices, windows=DEFAULT_WINDOWS, sentiment_values=DEFAULT_SENTIMENT_VALUES,
+                           coins=None):
+    """Returns the rolling sentiment indices on the price dates, e.g. for plotting next to the prices.
+
+    Returns
+    -------
+    Data frame with the price dates as index and (coin, window) column pairs.
+    """
+
+    if coins is None:
+        coins = sorted(set(prices.columns.get_level_values("Coin")) & set(df_sentiments["Coin"].dropna()))
+
+    scores, counts = align_sentiments_to_prices(df_sentiments, prices.index, coins, sentiment_values)
+    indices = get_rolling_sentiment_indices(scores, counts, windows)
+
+    # (windows, dates, coins) -> (dates, coins, windows)
+    return pd.DataFrame(indices.transpose(1, 2, 0).reshape(len(prices.index), -1), index=prices.index,
+                        columns=pd.MultiIndex.from_product([coins, windows], names=["Coin", "Window"]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Correlate sentiments with coin price returns for many windows, lags "
+                                                 "and horizons.")
+    parser.add_argument("sentiments", help="CSV file written from the output of get_sentiments.")
+    parser.add_argument("--prices-folder", default=DEFAULT_PRICES_FOLDER)
+    parser.add_argument("--interval", default="daily", choices=["daily", "weekly"])
+    parser.add_argument("--windows", type=int, nargs="+", default=DEFAULT_WINDOWS)
+    parser.add_argument("--lags", type=int, nargs="+", default=DEFAULT_LAGS)
+    parser.add_argument("--horizons", type=int, nargs="+", default=DEFAULT_HORIZONS)
+    parser.add_argument("--output", default=None, help="Write the results to this CSV file instead of printing them.")
+    args = parser.parse_args()
+
+    evaluation = evaluate(pd.read_csv(args.sentiments), load_prices(args.prices_folder, args.interval),
+                          args.windows, args.lags, args.horizons)
+
+    if args.output is None:
+        print(evaluation.to_string(index=False))
+    else:
+        evaluation.to_csv(args.output, index=False)
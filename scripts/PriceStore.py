@@ -0,0 +1,190 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import PriceEvaluation
+
+DEFAULT_STORE_FOLDER = os.path.join("..", "coin-prices", "store")
+FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+BAR_DTYPE = np.dtype([("Date", "<M8[ns]")] + [(field, "<f8") for field in FIELDS])
+YFINANCE_INTERVALS = {"daily": "1d", "weekly": "1wk"}
+
+
+class PriceStore:
+    """Append-only price bars stored as one binary file of fixed size records per coin and interval.
+
+    Files are memory-mapped for reading. Bars are sorted by date, so a date range is found with a binary search and only
+    the pages holding the requested bars are read.
+    """
+
+    def __init__(self, folder=DEFAULT_STORE_FOLDER):
+        """
+        :param folder: Folder of the store. Created if it does not exist.
+        """
+
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def get_path(self, coin, interval):
+        return os.path.join(self.folder, coin.upper() + "_" + interval + ".bin")
+
+    def get_bars(self, coin, interval):
+        """Returns a read only memory-mapped record array of all bars (empty if there are none)."""
+
+        path = self.get_path(coin, interval)
+        if not os.path.isfile(path) or os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=BAR_DTYPE)
+
+        return np.memmap(path, dtype=BAR_DTYPE, mode="r")
+
+    def get_coins(self, interval):
+        """Returns the coins with stored bars of an interval."""
+
+        suffix = "_" + interval + ".bin"
+        return sorted(file_name[:-len(suffix)] for file_name in os.listdir(self.folder) if file_name.endswith(suffix))
+
+    def append(self, coin, interval, df):
+        """
+        Adds bars after the last stored bar. A bar with the date of the last stored bar replaces it (the last bar of a
+        download is often still incomplete), older bars are ignored. Weekly bars not starting on a Monday are ignored
+        (see PriceEvaluation.get_weekly_bars), so all stored weekly bars have the same anchor.
+
+        :param coin: Coin ticker, e.g. BTC.
+        :param interval: daily or weekly.
+        :param df: Data frame with a DatetimeIndex and the columns Open, High, Low, Close and Volume.
+        :return: Number of appended bars.
+        """
+
+        df = df.sort_index()
+        df = df[~df.index.duplicated(keep="last")].dropna(subset=["Close"])
+        if interval == "weekly":
+            df = PriceEvaluation.get_weekly_bars(df)
+
+        bars = np.zeros(len(df), dtype=BAR_DTYPE)
+        bars["Date"] = df.index.to_numpy(dtype="datetime64[ns]")
+        for field in FIELDS:
+            bars[field] = df[field].to_numpy(dtype=np.float64)
+
+        path = self.get_path(coin, interval)
+        stored = self.get_bars(coin, interval)
+
+        if len(stored) > 0:
+            last_date = stored["Date"][-1]
+            replacement = bars[bars["Date"] == last_date]
+            del stored
+
+            if len(replacement) > 0:
+                writable = np.memmap(path, dtype=BAR_DTYPE, mode="r+")
+                writable[-1] = replacement[-1]
+                writable.flush()
+                del writable
+
+            bars = bars[bars["Date"] > last_date]
+
+        with open(path, "ab") as bar_file:
+            bar_file.write(bars.tobytes())
+
+        return len(bars)
+
+    def read(self, coin, interval, start_date=None, end_date=None):
+        """
+        Reads the bars of a date range.
+
+        :param start_date: First date (inclusive), anything pd.Timestamp accepts. None starts at the first bar.
+        :param end_date: Last date (inclusive). None ends at the last bar.
+        :return: Data frame with a DatetimeIndex named Date and the columns Open, High, Low, Close and Volume.
+        """
+
+        bars = self.get_bars(coin, interval)
+        dates = bars["Date"]
+
+        first = 0 if start_date is None else np.searchsorted(dates, pd.Timestamp(start_date).to_datetime64(), "left")
+        last = len(bars) if end_date is None else np.searchsorted(dates, pd.Timestamp(end_date).to_datetime64(), "right")
+        selected = np.array(bars[first:last])
+
+        df = pd.DataFrame({field: selected[field] for field in FIELDS}, index=pd.DatetimeIndex(selected["Date"]))
+        df.index.name = "Date"
+        return df
+
+    def load_prices(self, coins=None, interval="daily", start_date=None, end_date=None):
+        """
+        Reads several coins into the layout of PriceEvaluation.load_prices.
+
+        :param coins: Coins to read. None reads all stored coins.
+        :return: Data frame with a DatetimeIndex and (coin, field) column pairs.
+        """
+
+        if coins is None:
+            coins = self.get_coins(interval)
+
+        dfs = {coin.upper(): self.read(coin, interval, start_date, end_date) for coin in coins}
+        if len(dfs) == 0:
+            return pd.DataFrame(index=pd.DatetimeIndex([], name="Date"),
+                                columns=pd.MultiIndex.from_tuples([], names=["Coin", "Field"]))
+
+        return pd.concat(dfs, axis=1, names=["Coin", "Field"]).sort_index()
+
+    def import_csv_folder(self, prices_folder=PriceEvaluation.DEFAULT_PRICES_FOLDER, interval="daily"):
+        """
+        Imports the dated CSV downloads of a folder (e.g. coin-prices). Overlapping downloads are merged first, newer
+        downloads win.
+
+        :return: Dict of coin -> number of appended bars.
+        """
+
+        prices = PriceEvaluation.load_prices(prices_folder, interval)
+
+        appended = {}
+        for coin in prices.columns.get_level_values("Coin").unique():
+            appended[coin] = self.append(coin, interval, prices[coin].dropna(how="all"))
+
+        return appended
+
+    def update_from_yfinance(self, coins, interval="daily", currency="USD"):
+        """
+        Downloads and appends the bars after the last stored bar of every coin. Requires the yfinance package.
+
+        :param coins: Coin tickers, e.g. ["BTC", "ETH", "DOGE"].
+        :return: Dict of coin -> number of appended bars.
+        """
+
+        import yfinance as yf
+
+        appended = {}
+        for coin in coins:
+            bars = self.get_bars(coin, interval)
+            start = None
+            if len(bars) > 0:
+                # Download the last stored bar again, it may have been incomplete.
+                start = pd.Timestamp(bars["Date"][-1]).strftime("%Y-%m-%d")
+            del bars
+
+            df = yf.download(coin.upper() + "-" + currency, start=start, period=None if start else "max",
+                             interval=YFINANCE_INTERVALS[interval], auto_adjust=True, progress=False)
+            if isinstance(df.columns, pd.MultiIndex):
+                df.columns = df.columns.get_level_values(0)
+
+            appended[coin] = self.append(coin, interval, df)
+
+        return appended
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import, update or read the local coin price store.")
+    parser.add_argument("command", choices=["import", "update", "read"])
+    parser.add_argument("--store", default=DEFAULT_STORE_FOLDER)
+    parser.add_argument("--interval", default="daily", choices=["daily", "weekly"])
+    parser.add_argument("--prices-folder", default=PriceEvaluation.DEFAULT_PRICES_FOLDER,
+                        help="Folder with the CSV downloads to import.")
+    parser.add_argument("--coins", nargs="+", default=["BTC", "ETH", "DOGE"])
+    parser.add_argument("--start-date", default=None)
+    parser.add_argument("--end-date", default=None)
+    args = parser.parse_args()
+
+    store = PriceStore(args.store)
+    if args.command == "import":
+        print(store.import_csv_folder(args.prices_folder, args.interval))
+    elif args.command == "update":
+        print(store.update_from_yfinance(args.coins, args.interval))
+    else:
+        print(store.load_prices(args.coins, args.interval, args.start_date, args.end_date).to_string())
@@ -0,0 +1,351 @@
+import numpy as np
+
+FRAME_LENGTH = 0.03  # in seconds
+NOISE_FLOOR_PERCENTILE = 10
+SPEECH_MARGIN = 10  # in dB above the noise floor
+MIN_ENERGY = -60  # in dB, quieter frames are never speech
+MODULATION_WINDOW = 1.0  # in seconds
+MIN_MODULATION = 3  # in dB, steadier signals (music, hum) are not speech
+MIN_PAUSE = 0.3  # in seconds, shorter pauses are filled
+MIN_SPEECH = 0.25  # in seconds, shorter speech runs are dropped
+SPEECH_PADDING = 0.1  # in seconds, kept before and after every speech run
+MAX_GAP = 2.0  # in seconds, longer pauses always end a clip
+MAX_CLIP_LENGTH_FACTOR = 1.5  # clips are cut at max clip_length * factor even without a pause
+
+# Increase when the segmentation changes, checkpoints of older versions are outdated.
+VERSION = "1"
+
+
+def get_frame_energies(audio, sampling_rate=16000, frame_length=FRAME_LENGTH):
+    """Computes the energy of non-overlapping frames.
+
+    Returns
+    -------
+    1d array with the energy of each frame in dB (full scale).
+    """
+
+    frame_samples = int(frame_length * sampling_rate)
+    frame_count = len(audio) // frame_samples
+    frames = np.asarray(audio[:frame_count * frame_samples], dtype=np.float32).reshape(frame_count, frame_samples)
+
+    return 10 * np.log10(np.mean(np.square(frames, dtype=np.float64), axis=1) + 1e-10)
+
+
+def get_runs(mask):
+    """Returns start and end (exclusive) indices of the runs of True values in a boolean array."""
+
+    padded = np.concatenate([[False], mask, [False]]).astype(np.int8)
+    changes = np.diff(padded)
+    return np.flatnonzero(changes == 1), np.flatnonzero(changes == -1)
+
+
+def get_speech_mask(energies, frame_length=FRAME_LENGTH, speech_margin=SPEECH_MARGIN, min_energy=MIN_ENERGY,
+                    min_modulation=MIN_MODULATION, min_pause=MIN_PAUSE, min_speech=MIN_SPEECH):
+    """Decides per frame whether it contains speech.
+
+    A frame is speech if it is louder than the noise floor of the recording by speech_margin and its surroundings show the
+    energy fluctuation of syllables. Silence is below the threshold, music and background noise are usually too steady.
+    Pauses shorter than min_pause are filled and speech runs shorter than min_speech are dropped.
+
+    Parameters
+    ----------
+    energies : np.ndarray
+        Frame energies in dB, see get_frame_energies.
+
+    Returns
+    -------
+    1d boolean array.
+    """
+
+    if len(energies) == 0:
+        return np.zeros(0, dtype=bool)
+
+    threshold = max(np.percentile(energies, NOISE_FLOOR_PERCENTILE) + speech_margin, min_energy)
+    mask = energies > threshold
+
+    if min_modulation > 0:
+        # Standard deviation of the energy in a sliding window around every frame.
+        window = max(int(MODULATION_WINDOW / frame_length), 1)
+        kernel = np.ones(window) / window
+        mean = np.convolve(energies, kernel, mode="same")
+        variance = np.convolve(np.square(energies), kernel, mode="same") - np.square(mean)
+        mask &= np.sqrt(np.maximum(variance, 0)) >= min_modulation
+
+    # Fill short pauses.
+    starts, ends = get_runs(~mask)
+    for start, end in zip(starts, ends):
+        if start > 0 and end < len(mask) and (end - start) * frame_length < min_pause:
+            mask[start:end] = True
+
+    # Drop short speech runs.
+    starts, ends = get_runs(mask)
+    for start, end in zip(starts, ends):
+        if (end - start) * frame_length < min_speech:
+            mask[start:end] = False
+
+    return mask
+
+
+def get_speech_segments(audio, sampling_rate=16000, frame_length=FRAME_LENGTH, padding=SPEECH_PADDING, **vad_settings):
+    """Finds the speech in an audio recording with an energy based voice activity detection.
+
+    Parameters
+    ----------
+    audio : np.ndarray
+        Mono audio.
+    sampling_rate : int
+        Sampling rate of the audio.
+    padding : float
+        Seconds of audio kept before and after every speech run, so that quiet word onsets are not cut.
+    vad_settings
+        Passed on to get_speech_mask.
+
+    Returns
+    -------
+    Float array of shape (number of segments, 2) with start and end of every speech segment in seconds.
+    """
+
+    energies = get_frame_energies(audio, sampling_rate, frame_length)
+    starts, ends = get_runs(get_speech_mask(energies, frame_length, **vad_settings))
+
+    duration = len(audio) / sampling_rate
+    segments = np.stack([np.maximum(starts * frame_length - padding, 0),
+                         np.minimum(ends * frame_length + padding, duration)], axis=1)
+
+    # Padding can make neighbouring segments overlap.
+    merged = []
+    for start, end in segments:
+        if len(merged) > 0 and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    return np.array(merged, dtype=np.float64).reshape(-1, 2)
+
+
+def split_long_segments(segments, energies, max_length, frame_length=FRAME_LENGTH):
+    """Splits segments longer than max_length at their quietest frame in the second half of the allowed length.
+
+    Parameters
+    ----------
+    segments : np.ndarray
+        Start and end of the segments in seconds, see get_speech_segments.
+    energies : np.ndarray
+        Frame energies in dB of the whole recording.
+
+    Returns
+    -------
+    Float array of shape (number of segments, 2).
+    """
+
+    split = []
+    for start, end in segments:
+        while end - start > max_length:
+            first_frame = int((start + max_length / 2) / frame_length)
+            last_frame = max(int((start + max_length) / frame_length), first_frame + 1)
+            cut = (first_frame + np.argmin(energies[first_frame:last_frame])) * frame_length
+            split.append([start, cut])
+            start = cut
+        split.append([start, end])
+
+    return np.array(split, dtype=np.float64).reshape(-1, 2)
+
+
+def group_intervals(starts, ends, clip_length, max_length=None, max_gap=MAX_GAP):
+    """Groups consecutive intervals (speech segments or words) into clips.
+
+    A clip ends at the pause closest to clip_length seconds, at any pause longer than max_gap and before it would grow
+    beyond max_length. Intervals are never split, so a clip only exceeds max_length if a single interval does.
+
+    Parameters
+    ----------
+    starts, ends : np.ndarray
+        Sorted start and end times of the intervals in seconds.
+    clip_length : float
+        Target length of the clips in seconds.
+    max_length : float
+        Maximum length of the clips in seconds. Defaults to clip_length * MAX_CLIP_LENGTH_FACTOR.
+    max_gap : float
+        Pauses of at least this many seconds always end a clip.
+
+    Returns
+    -------
+    Integer array of shape (number of clips, 2) with the index of the first interval and the index after the last
+    interval of every clip.
+    """
+
+    if max_length is None:
+        max_length = clip_length * MAX_CLIP_LENGTH_FACTOR
+
+    if len(starts) == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+
+    groups = []
+    first = 0
+    for i in range(1, len(starts)):
+        length = ends[i - 1] - starts[first]
+        length_with_next = ends[i] - starts[first]
+        # Cut here if adding the next interval moves the clip further away from the target length.
+        if (length_with_next - clip_length > clip_length - length or starts[i] - ends[i - 1] >= max_gap
+                or length_with_next > max_length):
+            groups.append([first, i])
+            first = i
+    groups.append([first, len(starts)])
+
+    return np.array(groups, dtype=np.int64)
+
+
+def segment_on_pauses(audio, clip_length, sampling_rate=16000, max_length=None, max_gap=MAX_GAP, **vad_settings):
+    """Cuts a recording into speech clips of about clip_length seconds. Silence and music between clips are dropped.
+
+    Returns
+    -------
+    Float array of shape (number of clips, 2) with start and end of every clip in seconds.
+    """
+
+    if max_length is None:
+        max_length = clip_length * MAX_CLIP_LENGTH_FACTOR
+
+    energies = get_frame_energies(audio, sampling_rate)
+    segments = get_speech_segments(audio, sampling_rate, **vad_settings)
+    segments = split_long_segments(segments, energies, max_length)
+
+    groups = group_intervals(segments[:, 0], segments[:, 1], clip_length, max_length, max_gap)
+    return np.stack([segments[groups[:, 0], 0], segments[groups[:, 1] - 1, 1]], axis=1).reshape(-1, 2)
+
+
+def iter_windows(blocks, window_samples, stride_samples):
+    """Cuts a stream of audio blocks into overlapping windows for long-form speech to text.
+
+    Consecutive windows overlap by 2 * stride_samples. Only the middle of every window is kept, the strides on both
+    sides are covered by the middle of the neighbouring windows, where the model sees enough context. Together the kept
+    parts cover the whole recording exactly once. The first window keeps its start and the last window keeps its end.
+
+    Parameters
+    ----------
+    blocks : iterable
+        1d audio arrays in order, e.g. from AudioFeatureExtraction.stream_audio or slices of decoded audio.
+    window_samples : int
+        Number of samples per window.
+    stride_samples : int
+        Number of samples on each side of a window that are not kept. Must be less than window_samples / 2.
+
+    Returns
+    -------
+    Generator of (start sample of the window, window, first kept sample, end of the kept samples), the kept range is
+    relative to the window.
+    """
+
+    step = window_samples - 2 * stride_samples
+    if step <= 0:
+        raise ValueError("stride_samples must be less than window_samples / 2")
+
+    buffer = np.zeros(0, dtype=np.float32)
+    start = 0
+    for block in blocks:
+        buffer = np.concatenate([buffer, block])
+        # A window is only complete if audio follows it, otherwise it may be the last one.
+        while len(buffer) > window_samples:
+            yield start, buffer[:window_samples], stride_samples if start > 0 else 0, window_samples - stride_samples
+            buffer = buffer[step:]
+            start += step
+
+    if len(buffer) > 0:
+        yield start, buffer, stride_samples if start > 0 else 0, len(buffer)
+
+
+def get_word_timestamps(predicted_ids, id_to_token, pad_token_id, word_delimiter_token="|", frame_duration=0.02,
+                        skip_token_ids=()):
+    """Reads word timestamps from the greedy (argmax) output of a CTC model.
+
+    Repeated tokens are collapsed and padding tokens are skipped like in CTC decoding. A word starts at the first frame of
+    its first character and ends after the last frame of its last character. Tokens in skip_token_ids are dropped
+    before collapsing, like batch_decode(skip_special_tokens=True) drops them.
+
+    Parameters
+    ----------
+    predicted_ids : np.ndarray
+        Token id per output frame of one clip.
+    id_to_token : dict
+        Token id -> token string (the tokenizer's vocabulary inverted).
+    pad_token_id : int
+        Id of the CTC blank token.
+    word_delimiter_token : str
+        Token separating words.
+    frame_duration : float
+        Seconds of audio per output frame (320 samples at 16 kHz for Wav2Vec2).
+    skip_token_ids : collection of int
+        Ids of tokens that are not part of any word, e.g. <s>, </s> and <unk>, see get_special_token_ids.
+
+    Returns
+    -------
+    List of (word, start in seconds, end in seconds).
+    """
+
+    skip_token_ids = set(skip_token_ids)
+    words = []
+    characters = []
+    word_start = word_end = None
+    previous_id = None
+
+    for frame, token_id in enumerate(np.asarray(predicted_ids).tolist()):
+        if token_id in skip_token_ids:
+            continue
+        if token_id == previous_id:
+            if token_id != pad_token_id and characters:
+                word_end = frame + 1
+            continue
+        previous_id = token_id
+
+        if token_id == pad_token_id:
+            continue
+
+        token = id_to_token.get(token_id, "")
+        if token == word_delimiter_token:
+            if characters:
+                words.append(("".join(characters), word_start * frame_duration, word_end * frame_duration))
+            characters = []
+            continue
+
+        if not characters:
+            word_start = frame
+        characters.append(token)
+        word_end = frame + 1
+
+    if characters:
+        words.append(("".join(characters), word_start * frame_duration, word_end * frame_duration))
+
+    return words
+
+
+def get_special_token_ids(tokenizer):
+    """Returns the ids of the special tokens of a CTC tokenizer that get_word_timestamps has to skip: all of them except
+    the padding (CTC blank) token and the word delimiter.
+    """
+
+    word_delimiter_id = tokenizer.convert_tokens_to_ids(getattr(tokenizer, "word_delimiter_token", "|"))
+    return set(tokenizer.all_special_ids) - {tokenizer.pad_token_id, word_delimiter_id}
+
+
+def segment_on_words(words, clip_length, max_length=None, max_gap=MAX_GAP):
+    """Groups timestamped words into clips of about clip_length seconds that start and end between words.
+
+    Parameters
+    ----------
+    words : list
+        (word, start, end) tuples sorted by start time, see get_word_timestamps.
+
+    Returns
+    -------
+    List of (start in seconds, end in seconds, text) per clip.
+    """
+
+    if len(words) == 0:
+        return []
+
+    starts = np.array([start for _, start, _ in words])
+    ends = np.array([end for _, _, end in words])
+    groups = group_intervals(starts, ends, clip_length, max_length, max_gap)
+
+    return [(float(starts[first]), float(ends[last - 1]), " ".join(word for word, _, _ in words[first:last]))
+            for first, last in groups]
@@ -0,0 +1,131 @@
+import os
+import pickle
+import numpy as np
+import pandas as pd
+
+DEFAULT_SENTIMENT_VALUES = {"bullish": 1, "neutral": 0, "bearish": -1}
+WEIGHTS = ["clips", "views", "duration"]
+
+# Sums kept per (date, coin) bucket, in this order.
+BUCKET_COLUMNS = ["Bullish", "Neutral", "Bearish", "Weight", "Weighted_Score"]
+
+
+class SentimentAggregator:
+    """Folds clip sentiments into per coin and day sums as they are produced.
+
+    Memory grows with the number of days and coins (and episodes for re-adding), not with the number of clips. Weekly
+    aggregates are derived from the daily sums. Adding an episode again replaces its earlier contribution, so reruns
+    and resumed backfills do not count clips twice.
+    """
+
+    def __init__(self, weight="clips", sentiment_values=DEFAULT_SENTIMENT_VALUES):
+        """
+        :param weight: Weight of every clip in the score. clips weights all clips equally, views by the views of the
+         episode and duration by the clip length in seconds (End - Start).
+        :param sentiment_values: Score of every sentiment label. Other labels are ignored.
+        """
+
+        if weight not in WEIGHTS:
+            raise ValueError("weight must be one of " + ", ".join(WEIGHTS))
+
+        self.weight = weight
+        self.sentiment_values = dict(sentiment_values)
+        self.buckets = {}  # (date, coin) -> sums in the order of BUCKET_COLUMNS
+        self.episodes = {}  # episode key -> {(date, coin): sums}
+
+    def get_weights(self, df):
+        if self.weight == "views":
+            # Missing view counts do not contribute to the weighted score.
+            return pd.to_numeric(df["Views"], errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+        if self.weight == "duration":
+            return (df["End"] - df["Start"]).fillna(0).to_numpy(dtype=np.float64)
+
+        return np.ones(len(df))
+
+    def add(self, df, episode_key=None):
+        """
+        Adds the clips of a data frame.
+
+        :param df: Clips with the columns Date (YYYYMMDD), Coin and Sentiment (and Views or Start and End depending on
+         the weight), e.g. the output of SentimentAnalysisPipeline.process_episode.
+        :param episode_key: Unique name of the episode. Adding an episode with a known key replaces its clips.
+        """
+
+        df = df[df["Sentiment"].isin(self.sentiment_values) & df["Coin"].notna()]
+        weights = self.get_weights(df)
+        scores = df["Sentiment"].map(self.sentiment_values).to_numpy(dtype=np.float64)
+
+        sums = pd.DataFrame({"Date": df["Date"].astype(int).to_numpy(),
+                             "Coin": df["Coin"].to_numpy(),
+                             "Bullish": (scores > 0).astype(np.float64),
+                             "Neutral": (scores == 0).astype(np.float64),
+                             "Bearish": (scores < 0).astype(np.float64),
+                             "Weight": weights,
+                             "Weighted_Score": weights * scores}).groupby(["Date", "Coin"]).sum()
+
+        contribution = {key: values for key, values in zip(sums.index, sums[BUCKET_COLUMNS].to_numpy())}
+
+        if episode_key is not None:
+            for key, values in self.episodes.pop(episode_key, {}).items():
+                self.buckets[key] = self.buckets[key] - values
+                if self.buckets[key][:3].sum() < 0.5:
+                    del self.buckets[key]
+            self.episodes[episode_key] = contribution
+
+        for key, values in contribution.items():
+            self.buckets[key] = self.buckets.get(key, 0) + values
+
+    def merge(self, other):
+        """Adds the sums of another aggregator, e.g. of a parallel worker. Episodes must not overlap."""
+
+        for key, values in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + values
+        self.episodes.update(other.episodes)
+
+    def get_df(self, period="day", start_date=None, end_date=None):
+        """
+        Returns the aggregated sentiments.
+
+        :param period: day or week (weeks start on Monday).
+        :param start_date: Do not include days before this date. Format: YYYYMMDD.
+        :param end_date: Do not include days after this date. Format: YYYYMMDD.
+        :return: Data frame with the columns (Date, Coin, Bullish, Neutral, Bearish, Clips, Weight, Score) where Date is
+         the day or the first day of the week and Score the weighted mean sentiment score.
+        """
+
+        keys = list(self.buckets)
+        df = pd.DataFrame(np.array([self.buckets[key] for key in keys]).reshape(-1, len(BUCKET_COLUMNS)),
+                          columns=BUCKET_COLUMNS)
+        df.insert(0, "Date", [date for date, _ in keys])
+        df.insert(1, "Coin", [coin for _, coin in keys])
+
+        if start_date is not None:
+            df = df[df["Date"] >= int(start_date)]
+        if end_date is not None:
+            df = df[df["Date"] <= int(end_date)]
+
+        if period == "week":
+            days = pd.to_datetime(df["Date"].astype(str), format="%Y%m%d")
+            df = df.assign(Date=(days - pd.to_timedelta(days.dt.weekday, unit="D")).dt.strftime("%Y%m%d").astype(int))
+        df = df.groupby(["Date", "Coin"], as_index=False)[BUCKET_COLUMNS].sum()
+
+        counts = ["Bullish", "Neutral", "Bearish"]
+        df[counts] = df[counts].round().astype(np.int64)
+        df["Clips"] = df[counts].sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            df["Score"] = np.where(df["Weight"] > 0, df["Weighted_Score"] / df["Weight"], np.nan)
+
+        return df[["Date", "Coin", "Bullish", "Neutral", "Bearish", "Clips", "Weight", "Score"]].reset_index(drop=True)
+
+    def save(self, path):
+        """Saves the aggregator atomically, so a backfill can continue with it later."""
+
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as aggregator_file:
+            pickle.dump(self, aggregator_file)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def load(path):
+        with open(path, "rb") as aggregator_file:
+            return pickle.load(aggregator_file)
@@ -0,0 +1,254 @@
+import argparse
+import base64
+import io
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+import soundfile as sf
+import SubtitleProcessing
+from CryptoSentimentAnalysis import SentimentAnalysisPipeline, to_object_array
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_MAX_LATENCY = 0.05  # in seconds
+
+
+class MicroBatcher:
+    """Collects items submitted from many threads into batches for a single worker thread.
+
+    A batch is processed as soon as it is full or max_latency seconds after its first item arrived. If processing a
+    batch fails, its items are processed one by one, so only the futures of the failing items get the exception.
+    """
+
+    def __init__(self, process_batch, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_latency=DEFAULT_MAX_LATENCY):
+        """
+        :param process_batch: Function taking a list of items and returning a list of results in the same order.
+        :param max_batch_size: Maximum number of items per batch.
+        :param max_latency: Maximum time in seconds an item waits for more items to join its batch.
+        """
+
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.queue = queue.Queue()
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def submit(self, item):
+        """Queues an item and returns a Future for its result."""
+
+        future = Future()
+        self.queue.put((item, future))
+        return future
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.max_latency
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                results = self.process_batch([item for item, _ in batch])
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                    continue
+                # Process the items one by one, so only the items that fail get the exception.
+                for item, future in batch:
+                    try:
+                        future.set_result(self.process_batch([item])[0])
+                    except Exception as item_exception:
+                        future.set_exception(item_exception)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+
+class SentimentService:
+    """Keeps a sentiment analysis pipeline with all its models loaded and scores clips in micro-batches."""
+
+    def __init__(self, pipeline, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_latency=DEFAULT_MAX_LATENCY):
+        """
+        :param pipeline: SentimentAnalysisPipeline used for transcription, audio features and sentiment prediction.
+        :param max_batch_size: Maximum number of clips scored together.
+        :param max_latency: Maximum time in seconds a clip waits for other clips to join its batch.
+        """
+
+        self.pipeline = pipeline
+        self.pipeline.warm_up()
+        self.batcher = MicroBatcher(self.score_batch, max_batch_size, max_latency)
+
+    def score_clips(self, clips):
+        """
+        Scores clips. Blocks until all clips are scored.
+
+        :param clips: List of dicts with either "audio" (1d array sampled at 16kHz) or "text". Text clips can provide
+         "audio_features" (dict of audio feature name -> value) for pipelines using audio features.
+        :return: List of dicts with "text", "coin" and "sentiment" (None if no sentiment could be predicted).
+        """
+
+        futures = [self.batcher.submit(clip) for clip in clips]
+        return [future.result() for future in futures]
+
+    def score_batch(self, clips):
+        """Scores one micro-batch of clips."""
+
+        pipeline = self.pipeline
+        df = pd.DataFrame({"Clip_Id": range(len(clips)), "Title": "service request"})
+        for column in pipeline.AUDIO_FEATURE_COLUMNS:
+            df[column] = np.nan
+
+        # Speech to text for audio clips
+        audio_indices = [i for i, clip in enumerate(clips) if clip.get("audio") is not None]
+        texts = [clip.get("text") for clip in clips]
+        if len(audio_indices) > 0:
+            transcribed = pipeline.transcribe_audio_clips([clips[i]["audio"] for i in audio_indices])
+            for i, text in zip(audio_indices, transcribed):
+                if texts[i] is None:
+                    texts[i] = text
+        df["Text"] = texts
+
+        # Label coin
+        coin_tagger = SubtitleProcessing.get_keyword_tagger(pipeline.TEXT_COIN_LABELS)
+        df["Coin"] = coin_tagger.tag_series(df["Text"]).to_numpy()
+
+        # Audio features
+        if pipeline.use_audio_features:
+            for i, clip in enumerate(clips):
+                for column, value in clip.get("audio_features", {}).items():
+                    df.loc[i, column] = value
+
+            if len(audio_indices) > 0:
+                df_audio = df.iloc[audio_indices].copy()
+                df_audio["Audio"] = to_object_array([clips[i]["audio"] for i in audio_indices])
+                df.iloc[audio_indices, df.columns.get_indexer(pipeline.AUDIO_FEATURE_COLUMNS)] = \
+                    pipeline.get_audio_features_df_parallel(df_audio, pipeline.coins).to_numpy()
+
+        # Label sentiment
+        to_predict = df["Text"].notna() & df["Coin"].isin(pipeline.coins)
+        if pipeline.use_audio_features:
+            to_predict &= pipeline.has_sentiment_audio_features(df)
+
+        sentiments = [None] * len(clips)
+        if to_predict.any():
+            for i, sentiment in zip(np.flatnonzero(to_predict.to_numpy()),
+                                    pipeline.predict_sentiments(df[to_predict])):
+                sentiments[i] = str(sentiment)
+
+        return [{"text": text, "coin": coin, "sentiment": sentiment}
+                for text, coin, sentiment in zip(df["Text"], df["Coin"], sentiments)]
+
+
+def decode_audio_payload(payload, sampling_rate=SentimentAnalysisPipeline.DEFAULT_SAMPLING_RATE):
+    """Decodes a base64 encoded audio file (wav, flac, ...) into a mono float32 array."""
+
+    audio, file_sampling_rate = sf.read(io.BytesIO(base64.b64decode(payload)), dtype="float32")
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    if file_sampling_rate != sampling_rate:
+        raise ValueError("Sampling rate was not 16k.")
+    return audio
+
+
+def make_request_handler(service):
+    class SentimentRequestHandler(BaseHTTPRequestHandler):
+        """
+        POST /score with a JSON body {"clips": [{"audio": "<base64 audio file>"} or {"text": "..."}, ...]}
+        returns {"results": [{"text": ..., "coin": ..., "sentiment": ...}, ...]} in the same order.
+        GET /health returns {"status": "ok"}.
+        """
+
+        def do_GET(self):
+            if self.path == "/health":
+                self.send_json(200, {"status": "ok"})
+            else:
+                self.send_json(404, {"error": "Not found"})
+
+        def do_POST(self):
+            if self.path != "/score":
+                self.send_json(404, {"error": "Not found"})
+                return
+
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                clips = []
+                for clip in body["clips"]:
+                    clip = dict(clip)
+                    if clip.get("audio") is not None:
+                        clip["audio"] = decode_audio_payload(clip["audio"])
+                    clips.append(clip)
+            except (ValueError, KeyError, TypeError, RuntimeError) as e:
+                self.send_json(400, {"error": repr(e)})
+                return
+
+            try:
+                self.send_json(200, {"results": service.score_clips(clips)})
+            except Exception as e:
+                self.send_json(500, {"error": repr(e)})
+
+        def send_json(self, status, data):
+            response = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(response)))
+            self.end_headers()
+            self.wfile.write(response)
+
+    return SentimentRequestHandler
+
+
+def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Serves the sentiment service over HTTP until interrupted."""
+
+    server = ThreadingHTTPServer((host, port), make_request_handler(service))
+    print("Sentiment service listening on http://" + host + ":" + str(port))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve coin and sentiment predictions for audio clips and texts.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--sentiment-model", required=True)
+    parser.add_argument("--sentiment-vectorizer", required=True)
+    parser.add_argument("--no-audio-features", action="store_true")
+    parser.add_argument("--wav2vec-model", default=SentimentAnalysisPipeline.DEFAULT_WAV2VEC_REPOSITORY,
+                        help="Hub repository or local directory of the speech to text model.")
+    parser.add_argument("--offline", action="store_true")
+    parser.add_argument("--praat-path", default=SentimentAnalysisPipeline.DEFAULT_PRAAT_PATH)
+    parser.add_argument("--praat-script", default=SentimentAnalysisPipeline.DEFAULT_PRAAT_SCRIPT)
+    parser.add_argument("--audio-feature-backend", default=SentimentAnalysisPipeline.DEFAULT_AUDIO_FEATURE_BACKEND,
+                        choices=["praat", "native"])
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--max-latency-ms", type=float, default=DEFAULT_MAX_LATENCY * 1000)
+    args = parser.parse_args()
+
+    sentiment_pipeline = SentimentAnalysisPipeline(wav2vec_model=args.wav2vec_model,
+                                                   offline=args.offline,
+                                                   praat_path=args.praat_path,
+                                                   praat_script=args.praat_script,
+                                                   sentiment_model=args.sentiment_model,
+                                                   sentiment_vectorizer=args.sentiment_vectorizer,
+                                                   use_audio_features=not args.no_audio_features,
+                                                   audio_feature_backend=args.audio_feature_backend)
+
+    serve(SentimentService(sentiment_pipeline, args.max_batch_size, args.max_latency_ms / 1000),
+          args.host, args.port)
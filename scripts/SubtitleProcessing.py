@@ -1,4 +1,11 @@
+import glob
+import html
+import os
 import re
+from array import array
+from collections import Counter
+import numpy as np
+import pandas as pd
 
 BTC_FILTER = ["bitcoin", "btc"]
 ETH_FILTER = ["ethereum", " eth "]
@@ -30,7 +37,7 @@ def generate_text_chunks(subtitle_file, chunk_size, min_chunk_size):
     Parameters
     ----------
     subtitle_file : str
-        Paths of the subtitle file to be used.
+        Paths of the subtitle file to be used (.vtt, .srt or .txt, see read_subtitle_words).
     chunk_size : int
         Word count of the chunks.
     min_chunk_size : int
@@ -41,34 +48,61 @@ def generate_text_chunks(subtitle_file, chunk_size, min_chunk_size):
     List of text chunks which are lists of words, Lists of corresponding start and end timestamps for each chunk.
     """
 
-    text_chunks = list()
-    chunk_start_times = list()
-    chunk_end_times = list()
+    words, starts, ends = read_subtitle_words(subtitle_file)
+
+    if len(words) == 0:
+        print("Could not generate text chunks for file: " + subtitle_file)
+        return None, None, None
 
-    if subtitle_file[-4:] == ".vtt":
-        # Subtitle file is in vtt format.
+    bounds, chunk_starts, chunk_ends = chunk_words(starts, ends, chunk_size)
 
-        words, word_end_times = get_words_with_end_times(subtitle_file)
+    # Discard last chunk if too small
+    if bounds[-1, 1] - bounds[-1, 0] < min_chunk_size:
+        bounds, chunk_starts, chunk_ends = bounds[:-1], chunk_starts[:-1], chunk_ends[:-1]
 
-        if words is None:
-            print("Could not generate text chunks for file: " + subtitle_file)
-            return None, None, None
+    text_chunks = [words[first:last] for first, last in bounds]
+    return text_chunks, [format_timestamp(t) for t in chunk_starts], [format_timestamp(t) for t in chunk_ends]
 
-        # Generate text chunks of desired size
-        text_chunks, chunk_start_times, chunk_end_times = generate_text_chunks_from_word_list(words, word_end_times,
-                                                                                              chunk_size)
-    elif subtitle_file[-4:] == ".txt":
-        # Subtitle file is a plain text.
-        # Possibly approximate timestamps?
-        pass
 
-    # Discard last chunk if too small
-    if len(text_chunks[-1]) < min_chunk_size:
-        text_chunks.pop()
-        chunk_start_times.pop()
-        chunk_end_times.pop()
+def get_text_chunks_df(subtitle_files, chunk_size, min_chunk_size, podcast_names=None):
+    """Chunks many subtitle files into one data frame.
 
-    return text_chunks, chunk_start_times, chunk_end_times
+    Parameters
+    ----------
+    subtitle_files : list
+        Paths of the subtitle files.
+    chunk_size : int
+        Word count of the chunks.
+    min_chunk_size : int
+        Chunks with less words will be discarded.
+    podcast_names : list
+        Names of the podcasts in the order of subtitle_files. Defaults to the file names without extension.
+
+    Returns
+    -------
+    Data frame with the columns (Podcast_Title, Start_Time, End_Time, Text). Times are in milliseconds.
+    """
+
+    if podcast_names is None:
+        podcast_names = [os.path.splitext(os.path.basename(subtitle_file))[0] for subtitle_file in subtitle_files]
+
+    dfs = []
+    for subtitle_file, podcast_name in zip(subtitle_files, podcast_names):
+        words, starts, ends = read_subtitle_words(subtitle_file)
+        if len(words) == 0:
+            continue
+
+        bounds, chunk_starts, chunk_ends = chunk_words(starts, ends, chunk_size)
+        keep = bounds[:, 1] - bounds[:, 0] >= min_chunk_size
+        dfs.append(pd.DataFrame({"Podcast_Title": podcast_name,
+                                 "Start_Time": chunk_starts[keep],
+                                 "End_Time": chunk_ends[keep],
+                                 "Text": [" ".join(words[first:last]) for first, last in bounds[keep]]}))
+
+    if len(dfs) == 0:
+        return pd.DataFrame(columns=["Podcast_Title", "Start_Time", "End_Time", "Text"])
+
+    return pd.concat(dfs, ignore_index=True)
 
 
 def auto_label_text_chunk_default_labels(text):
@@ -88,80 +122,355 @@ def auto_label_text_chunk(text, labels):
 
     Returns
     -------
-    Returns a label for the text. "None" if no suitable label was found.
+    Returns the label with the most keyword mentions in the text (ties are broken by the order of labels).
+    "None" if no suitable label was found.
     """
 
-    for label in labels:
-        regex_str = "|".join(labels[label])
-        r = re.compile(regex_str, flags=re.I)
-        if re.search(r, text) is not None:
-            return label
+    return get_keyword_tagger(labels).tag(text)
 
-    return "None"
 
+_keyword_taggers = {}
 
-def get_words_with_end_times(subtitle_file_path):
-    """Get all words from a subtitle file (vtt format) with their corresponding end timestamps
 
+def get_keyword_tagger(labels):
+    """Returns a KeywordTagger for the labels dict. Taggers are only built once per labels dict content.
+
+    """
+
+    key = tuple((label, tuple(keywords)) for label, keywords in labels.items())
+    if key not in _keyword_taggers:
+        _keyword_taggers[key] = KeywordTagger(labels)
+
+    return _keyword_taggers[key]
+
+
+class KeywordTagger:
+    """Labels texts by keywords using one precompiled regular expression for all labels.
+
+    Keywords only match whole words (case insensitive), e.g. "eth" matches "eth" but not "ether" or "method".
+    """
+
+    def __init__(self, labels):
+        """
+        Parameters
+        ----------
+        labels : dict
+            A dict of possible labels (keys in dict). The values of the dict are keywords for the labels.
+        """
+
+        self.labels = list(labels)
+        self.label_by_keyword = {}
+        for label in labels:
+            for keyword in labels[label]:
+                self.label_by_keyword.setdefault(keyword.strip().lower(), label)
+
+        # Longer keywords first, so "dogecoin" is matched as a whole instead of "doge".
+        keywords = sorted(self.label_by_keyword, key=len, reverse=True)
+        self.regex = re.compile(r"(?<!\w)(" + "|".join(re.escape(k) for k in keywords) + r")(?!\w)", flags=re.I)
+
+    def count_mentions(self, text):
+        """Returns a dict of label -> number of keyword mentions in the text."""
+
+        if not isinstance(text, str):
+            return {}
+
+        return dict(Counter(self.label_by_keyword[match.lower()] for match in self.regex.findall(text)))
+
+    def best_label(self, mentions):
+        """Returns the label with the most mentions (ties are broken by the order of labels) or "None"."""
+
+        if len(mentions) == 0:
+            return "None"
+
+        return max(self.labels, key=lambda label: mentions.get(label, 0))
+
+    def tag(self, text):
+        """Returns the label of a single text or "None"."""
+
+        return self.best_label(self.count_mentions(text))
+
+    def tag_series(self, texts, all_matches=False):
+        """Labels many texts in one pass.
+
+        Parameters
+        ----------
+        texts : pd.Series or list of str
+            The text chunks. Missing texts get no label.
+        all_matches : bool
+            Return the mention counts of all labels instead of the best label.
+
+        Returns
+        -------
+        pd.Series of labels ("None" if no keyword was found) or, with all_matches, of dicts label -> mention count.
+        """
+
+        texts = pd.Series(texts)
+        matches = texts.where(texts.map(lambda text: isinstance(text, str)), "").str.lower().str.findall(self.regex)
+        mentions = matches.map(lambda keywords: dict(Counter(self.label_by_keyword[k] for k in keywords)))
+
+        if all_matches:
+            return mentions
+
+        return mentions.map(self.best_label)
+
+
+CUE_TIMING_REGEX = re.compile(r"^\s*((?:\d+:)?\d{1,2}:\d{2}[.,]\d{3})\s*-->\s*((?:\d+:)?\d{1,2}:\d{2}[.,]\d{3})")
+INLINE_TIMESTAMP_REGEX = re.compile(r"<((?:\d+:)?\d{1,2}:\d{2}\.\d{3})>")
+TAG_REGEX = re.compile(r"<[^>]*>")
+TEXT_TIMESTAMP_REGEX = re.compile(r"^\s*((?:\d+:)?\d{1,2}:\d{2})\s*$")
+
+DEFAULT_WORDS_PER_MINUTE = 150
+
+
+def parse_timestamp(timestamp):
+    """Converts a timestamp like "01:02:03.456", "02:03,456" or "2:03" into milliseconds."""
+
+    seconds = 0.0
+    for part in timestamp.replace(",", ".").split(":"):
+        seconds = seconds * 60 + float(part)
+
+    return int(round(seconds * 1000))
+
+
+def format_timestamp(milliseconds):
+    """Converts milliseconds into a timestamp like "01:02:03.456"."""
+
+    milliseconds = int(milliseconds)
+    return "%02d:%02d:%02d.%03d" % (milliseconds // 3600000, milliseconds // 60000 % 60, milliseconds // 1000 % 60,
+                                    milliseconds % 1000)
+
+
+def iter_cues(subtitle_file):
+    """Yields (start in ms, end in ms, list of text lines) for every cue of a vtt or srt file, reading line by line."""
+
+    start = end = None
+    lines = []
+
+    for line in subtitle_file:
+        line = line.rstrip("\r\n")
+        timing = CUE_TIMING_REGEX.match(line)
+
+        if timing is not None:
+            if start is not None:
+                yield start, end, lines
+            start, end = parse_timestamp(timing.group(1)), parse_timestamp(timing.group(2))
+            lines = []
+        elif line == "":
+            # Only an empty line ends a cue, YouTube captions contain lines with a single space.
+            if start is not None:
+                yield start, end, lines
+            start = None
+        elif start is not None:
+            lines.append(line)
+
+    if start is not None:
+        yield start, end, lines
+
+
+def iter_subtitle_words(subtitle_file_path):
+    """Yields (word, start in ms, end in ms) for every word of a vtt or srt subtitle file.
+
+    Cues with word timestamps (YouTube auto-subs: "word<00:00:01.234><c> next</c>") give every word its own start, the
+    end of a word is the start of the next word. Other cues spread their duration over their words by character count.
+    Lines repeating the previous cue's text (rolling captions) are skipped.
+    """
+
+    previous_lines = set()
+
+    with open(subtitle_file_path, encoding="utf-8", errors="replace") as subtitle_file:
+        for cue_start, cue_end, lines in iter_cues(subtitle_file):
+            timed_lines = [line for line in lines if INLINE_TIMESTAMP_REGEX.search(line) is not None]
+
+            if len(timed_lines) > 0:
+                for line in timed_lines:
+                    # Split into (text before the first timestamp, timestamp, text, timestamp, text, ...)
+                    parts = INLINE_TIMESTAMP_REGEX.split(line)
+                    word_starts = [cue_start] + [parse_timestamp(t) for t in parts[1::2]]
+                    word_ends = word_starts[1:] + [cue_end]
+
+                    for text, start, end in zip(parts[0::2], word_starts, word_ends):
+                        for word in html.unescape(TAG_REGEX.sub("", text)).split():
+                            yield word, start, end
+
+                previous_lines = set(html.unescape(TAG_REGEX.sub("", line)).strip() for line in lines)
+                continue
+
+            texts = [html.unescape(TAG_REGEX.sub("", line)).strip() for line in lines]
+            new_texts = [text for text in texts if text != "" and text not in previous_lines]
+            previous_lines = set(texts)
+
+            words = " ".join(new_texts).split()
+            if len(words) == 0:
+                continue
+
+            # Approximate word times by character count.
+            boundaries = np.cumsum([0] + [len(word) + 1 for word in words])
+            times = cue_start + (cue_end - cue_start) * boundaries / boundaries[-1]
+            for word, start, end in zip(words, times[:-1], times[1:]):
+                yield word, int(start), int(end)
+
+
+def iter_text_words(text_file_path, words_per_minute=DEFAULT_WORDS_PER_MINUTE):
+    """Yields (word, start in ms, end in ms) for every word of a plain text transcript.
+
+    Lines holding only a timestamp (e.g. "1:05") mark the start of the following text. The words between two timestamps
+    are spread evenly over the time in between. Without timestamps every word takes 60 / words_per_minute seconds.
+    """
+
+    word_duration = 60000 / words_per_minute
+    section_start = 0
+    section_words = []
+
+    def spread(words, start, end):
+        if end is None or end <= start:
+            end = start + len(words) * word_duration
+        times = np.linspace(start, end, len(words) + 1)
+        return zip(words, times[:-1].astype(np.int64).tolist(), times[1:].astype(np.int64).tolist())
+
+    with open(text_file_path, encoding="utf-8", errors="replace") as text_file:
+        for line in text_file:
+            timestamp = TEXT_TIMESTAMP_REGEX.match(line)
+            if timestamp is None:
+                section_words.extend(line.split())
+                continue
+
+            section_end = parse_timestamp(timestamp.group(1))
+            yield from spread(section_words, section_start, section_end)
+            section_start = section_end
+            section_words = []
+
+    yield from spread(section_words, section_start, None)
+
+
+def read_subtitle_words(subtitle_file_path, words_per_minute=DEFAULT_WORDS_PER_MINUTE):
+    """Reads all words of a subtitle file with their timestamps.
+
+    Parameters
+    ----------
+    subtitle_file_path : str
+        A .vtt or .srt subtitle file or a .txt transcript (see iter_text_words).
+    words_per_minute : int
+        Speaking rate used to approximate timestamps of plain text transcripts.
+
+    Returns
+    -------
+    List of words, int64 arrays of word start and end times in milliseconds.
     """
 
-    with open(subtitle_file_path) as subtitle_file:
+    if subtitle_file_path[-4:] == ".txt":
+        records = iter_text_words(subtitle_file_path, words_per_minute)
+    else:
+        records = iter_subtitle_words(subtitle_file_path)
 
-        # Remove first 4 lines (containing meta information)
-        for j in range(0, 4):
-            subtitle_file.readline()
+    words = []
+    times = array("q")
+    for word, start, end in records:
+        words.append(word)
+        times.append(start)
+        times.append(end)
 
-        text = subtitle_file.read()
+    times = np.frombuffer(times, dtype=np.int64).reshape(-1, 2) if len(times) > 0 else np.zeros((0, 2), dtype=np.int64)
+    return words, times[:, 0].copy(), times[:, 1].copy()
 
-        # Check if the subtitle file supports individual word times
-        if text.find("<c>") == -1:
-            print("Individual word times are not supported for file: " + subtitle_file_path)
-            return None, None
 
-        chunks = text.split(" \n\n")  # split into chunks for easier data processing
+def chunk_words(starts, ends, chunk_size):
+    """Splits a word sequence into chunks of chunk_size words.
+
+    Parameters
+    ----------
+    starts, ends : np.ndarray
+        Start and end times of the words.
+
+    Returns
+    -------
+    Integer array of shape (number of chunks, 2) with the index of the first word and the index after the last word of
+    every chunk, arrays of chunk start and end times.
+    """
+
+    firsts = np.arange(0, len(starts), chunk_size)
+    lasts = np.minimum(firsts + chunk_size, len(starts))
+    return np.stack([firsts, lasts], axis=1), starts[firsts], ends[lasts - 1]
 
-        words = list()
-        word_end_times = list()
 
-        for chunk in chunks:
-            chunk_lines = chunk.split("\n")
-            words_line = chunk_lines[2]
+ANNOTATION_REGEX = re.compile(r"^[\[(].*[\])]$")
 
-            words_in_chunk = []
-            word_end_times_in_chunk = []
 
-            first_word_end_index = words_line.find("<")
-            if first_word_end_index != -1:
-                first_word = words_line[
-                             0:first_word_end_index]  # get the first word (can't be found using method below)
+def is_annotation(word):
+    """Checks whether a subtitle word is a sound annotation like "[Music]" or "(applause)" instead of speech."""
 
-                words_in_chunk = re.findall("<c> [\S]*</c>", words_line)  # get all words
-                words_in_chunk = [w[4:-4] for w in words_in_chunk]  # strip <c> and <c/>
+    return ANNOTATION_REGEX.match(word) is not None
 
-                word_end_times_in_chunk = re.findall("<\d\d:\d\d:\d\d.\d\d\d>", words_line)  # get all word end times
-                word_end_times_in_chunk = [t[1:-1] for t in word_end_times_in_chunk]  # strip < and >
-            else:
-                # Only one word
-                first_word = words_line
 
-            last_time = chunk_lines[4][17:29]  # end time for the last word
+def align_words_to_clips(words, starts, ends, clip_starts, clip_ends):
+    """Assigns every word to the clip containing the middle of the word.
+
+    Parameters
+    ----------
+    words : list
+        Words, see read_subtitle_words.
+    starts, ends : np.ndarray
+        Start and end times of the words in milliseconds.
+    clip_starts, clip_ends : np.ndarray
+        Start and end times of the clips in milliseconds. Clips must not overlap.
+
+    Returns
+    -------
+    List with the text of every clip (None for clips without words), int array with the number of sound annotations per
+    clip (see is_annotation). Annotations are not part of the texts.
+    """
+
+    clip_starts = np.asarray(clip_starts, dtype=np.float64)
+    clip_ends = np.asarray(clip_ends, dtype=np.float64)
+    texts = [None] * len(clip_starts)
+    annotation_counts = np.zeros(len(clip_starts), dtype=np.int64)
 
-            words_in_chunk.insert(0, first_word)
-            word_end_times_in_chunk.append(last_time)
+    if len(words) == 0 or len(clip_starts) == 0:
+        return texts, annotation_counts
 
-            words.extend(words_in_chunk)
-            word_end_times.extend(word_end_times_in_chunk)
+    order = np.argsort(clip_starts, kind="stable")
+    sorted_starts = clip_starts[order]
+    middles = (starts + ends) / 2
+
+    positions = np.searchsorted(sorted_starts, middles, side="right") - 1
+    clip_indices = order[np.maximum(positions, 0)]
+    inside = (positions >= 0) & (middles < clip_ends[clip_indices])
+
+    annotations = np.fromiter((is_annotation(word) for word in words), dtype=bool, count=len(words))
+    np.add.at(annotation_counts, clip_indices[inside & annotations], 1)
+
+    selected = np.flatnonzero(inside & ~annotations)
+    for clip_index, text in pd.Series([words[i] for i in selected]).groupby(clip_indices[selected]).agg(" ".join).items():
+        texts[clip_index] = text
+
+    return texts, annotation_counts
+
+
+def find_subtitle_file(audio_file):
+    """Returns the subtitle file downloaded together with an audio file (e.g. "name.en.vtt" for "name.wav") or None.
+
+    English subtitles are preferred.
+    """
+
+    base = os.path.splitext(audio_file)[0]
+    candidates = sorted(glob.glob(glob.escape(base) + ".*vtt") + glob.glob(glob.escape(base) + ".*srt"))
+    candidates.sort(key=lambda candidate: not os.path.basename(candidate)[len(os.path.basename(base)):]
+                    .startswith(".en"))
+
+    return candidates[0] if len(candidates) > 0 else None
+
+
+def get_words_with_end_times(subtitle_file_path):
+    """Get all words from a subtitle file with their corresponding end timestamps
+
+    """
 
-        # For the last chunk we have to get the word end time from somewhere else
-        first_line_in_last_chunk = chunks[-1].split("\n")[0]
-        last_time = first_line_in_last_chunk[17:29]
-        word_end_times.pop()
-        word_end_times.append(last_time)
+    words, _, ends = read_subtitle_words(subtitle_file_path)
 
-        if len(words) != len(word_end_times):
-            print("Warning: word count does not match times count")
+    if len(words) == 0:
+        print("No words found in file: " + subtitle_file_path)
+        return None, None
 
-        return words, word_end_times
+    return words, [format_timestamp(end) for end in ends]
 
 
 def generate_text_chunks_from_word_list(words, word_end_times, chunk_size):
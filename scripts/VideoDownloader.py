@@ -1,8 +1,19 @@
 from __future__ import unicode_literals
+import json
 import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from os import listdir
 import subprocess
 
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MIN_REQUEST_INTERVAL = 1.0  # in seconds, between the start of two downloads
+DEFAULT_ARCHIVE_FILE_NAME = "download_archive.txt"
+DEFAULT_SKIPPED_FILE_NAME = "download_skipped.txt"
+DOWNLOADED_FILE_EXTENSIONS = [".vtt", ".wav", ".info.json"]
+
 
 def download_playlist(url, output_folder="", start_date=None, end_date=None, max_videos=0,
                       file_name_separator="-sep-",
@@ -24,7 +35,17 @@ def download_playlist(url, output_folder="", start_date=None, end_date=None, max
 
     """
 
-    calls = ["youtube-dl", "-x", "--audio-format", "wav", "--yes-playlist"]
+    subprocess.call(get_download_command(url, output_folder, start_date, end_date, max_videos, file_name_separator,
+                                         extract_subtitles))
+
+
+def get_download_command(url, output_folder="", start_date=None, end_date=None, max_videos=0,
+                         file_name_separator="-sep-", extract_subtitles=True, playlist=True):
+    """Builds the youtube-dl command to download the audio (and subtitles) of a video or playlist.
+
+    """
+
+    calls = ["youtube-dl", "-x", "--audio-format", "wav", "--yes-playlist" if playlist else "--no-playlist"]
 
     if extract_subtitles:
         calls.append("--write-auto-sub")
@@ -38,7 +59,7 @@ def download_playlist(url, output_folder="", start_date=None, end_date=None, max
         calls.append(end_date)
     if max_videos > 0:
         calls.append("--max-downloads")
-        calls.append(max_videos)
+        calls.append(str(max_videos))
 
     file_name = "%(channel)s" + file_name_separator + "%(upload_date)s" + file_name_separator + \
                 "%(title)s" + file_name_separator + "%(view_count)s" + ".%(ext)s"
@@ -49,7 +70,7 @@ def download_playlist(url, output_folder="", start_date=None, end_date=None, max
 
     calls.append(url)
 
-    subprocess.call(calls)
+    return calls
 
 
 def ensure_correct_naming(folder_path):
@@ -62,11 +83,295 @@ def ensure_correct_naming(folder_path):
     all_file_names = listdir(folder_path)
 
     for file_name in all_file_names:
-        if file_name[-4:] == ".vtt" or file_name[-4:] == ".wav" or file_name[-10:] == ".info.json":
-            new_file_name = file_name.replace(" ", "_")
-            new_file_name = new_file_name.replace(":", "_")
-
+        if is_downloaded_file(file_name):
             old_file_name = os.path.join(folder_path, file_name)
-            new_file_name = os.path.join(folder_path, new_file_name)
+            new_file_name = os.path.join(folder_path, sanitize_file_name(file_name))
 
             os.rename(old_file_name, new_file_name)
+
+
+def is_downloaded_file(file_name):
+    return any(file_name.endswith(extension) for extension in DOWNLOADED_FILE_EXTENSIONS)
+
+
+def sanitize_file_name(file_name):
+    """Replaces problematic characters in a file name."""
+
+    new_file_name = file_name.replace(" ", "_")
+    new_file_name = new_file_name.replace(":", "_")
+    return new_file_name
+
+
+def list_videos(url):
+    """Lists the videos of a playlist (or a single video) without downloading them.
+
+    Parameters
+    ----------
+    url : str
+        Playlist or video URL.
+
+    Returns
+    -------
+    List of (archive id, video URL) tuples. The archive id has the format of youtube-dl's download archive.
+    """
+
+    result = subprocess.run(["youtube-dl", "--flat-playlist", "-J", url], capture_output=True, check=True)
+    info = json.loads(result.stdout)
+
+    videos = []
+    for entry in info.get("entries") or [info]:
+        extractor = entry.get("ie_key") or entry.get("extractor_key") or info.get("extractor_key", "")
+        video_url = entry.get("webpage_url") or entry.get("url", "")
+        if not video_url.startswith("http"):
+            video_url = "https://www.youtube.com/watch?v=" + entry["id"]
+        videos.append((extractor.lower() + " " + entry["id"], video_url))
+
+    return videos
+
+
+def download_video(url, output_folder, start_date=None, end_date=None, file_name_separator="-sep-",
+                   extract_subtitles=True):
+    """Downloads the audio (and subtitles) of a single video with youtube-dl.
+
+    Returns
+    -------
+    The youtube-dl exit code.
+    """
+
+    return subprocess.call(get_download_command(url, output_folder, start_date, end_date,
+                                                file_name_separator=file_name_separator,
+                                                extract_subtitles=extract_subtitles,
+                                                playlist=False))
+
+
+class DownloadManager:
+    """Downloads videos concurrently with a bounded number of workers.
+
+    Finished videos are recorded in a download archive (same format as youtube-dl's --download-archive), so they are
+    skipped in later runs without listing the output folder. Videos outside of the requested date range are recorded
+    with the date range in a second file and skipped for the same or a narrower date range. Every video is downloaded
+    into its own staging folder and its files are renamed (see sanitize_file_name) and moved to the output folder once
+    the download succeeded.
+    """
+
+    def __init__(self, output_folder, archive_file=None, skipped_file=None, max_workers=DEFAULT_MAX_WORKERS,
+                 min_request_interval=DEFAULT_MIN_REQUEST_INTERVAL, file_name_separator="-sep-",
+                 extract_subtitles=True, downloader=download_video, lister=list_videos, on_file_downloaded=None):
+        """
+        Parameters
+        ----------
+        output_folder : str
+            Folder to save the downloaded files in.
+        archive_file : str
+            Download archive. Defaults to download_archive.txt in the output folder.
+        skipped_file : str
+            Videos skipped because of their upload date, with the date range. Defaults to download_skipped.txt in the
+            output folder.
+        max_workers : int
+            Maximum number of parallel downloads.
+        min_request_interval : float
+            Minimum time in seconds between the start of two downloads.
+        file_name_separator : str
+            Separator used in file names.
+        extract_subtitles : bool
+            Also download (auto generated) subtitles.
+        downloader
+            Function (url, output_folder, start_date, end_date, file_name_separator, extract_subtitles) downloading a
+            single video into output_folder and returning the youtube-dl exit code. Replace it for tests.
+        lister
+            Function (url) returning the (archive id, video URL) tuples of a playlist or video. Replace it for tests.
+        on_file_downloaded
+            Called with the path of every downloaded file after it was moved to the output folder.
+        """
+
+        self.output_folder = output_folder
+        self.archive_file = archive_file or os.path.join(output_folder, DEFAULT_ARCHIVE_FILE_NAME)
+        self.skipped_file = skipped_file or os.path.join(output_folder, DEFAULT_SKIPPED_FILE_NAME)
+        self.max_workers = max_workers
+        self.min_request_interval = min_request_interval
+        self.file_name_separator = file_name_separator
+        self.extract_subtitles = extract_subtitles
+        self.downloader = downloader
+        self.lister = lister
+        self.on_file_downloaded = on_file_downloaded
+
+        self.lock = threading.Lock()
+        self.next_request_time = 0
+        self.archive = set()
+        self.skipped = {}  # archive id -> list of (start date, end date) the video is not in
+        self.downloads_per_playlist = {}
+
+        os.makedirs(output_folder, exist_ok=True)
+        if os.path.isfile(self.archive_file):
+            with open(self.archive_file) as archive:
+                self.archive = set(line.strip() for line in archive if line.strip())
+        if os.path.isfile(self.skipped_file):
+            with open(self.skipped_file) as skipped:
+                for line in skipped:
+                    if line.strip():
+                        archive_id, start_date, end_date = line.rstrip("\n").split("\t")
+                        self.skipped.setdefault(archive_id, []).append((start_date or None, end_date or None))
+
+    def download(self, video_urls=[], playlist_urls=[], start_date=None, end_date=None, max_videos_per_playlist=0):
+        """Downloads videos and playlists, skipping videos in the download archive.
+
+        Parameters
+        ----------
+        video_urls : list of str
+            Video URLs to download.
+        playlist_urls : list of str
+            Playlist URLs to download.
+        start_date : str
+            Only download videos uploaded on and after this date. Date format: YYYYMMDD.
+        end_date : str
+            Only download videos uploaded until this date. Date format: YYYYMMDD.
+        max_videos_per_playlist : int
+            Stop after downloading max_videos_per_playlist videos of a playlist. 0 means no limit.
+
+        Returns
+        -------
+        List of paths of the downloaded files.
+        """
+
+        self.downloads_per_playlist = {}
+
+        def run_job(job):
+            return self.download_job(job, start_date, end_date, max_videos_per_playlist)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            downloaded_files = [file for files in executor.map(run_job, self.get_jobs(video_urls, playlist_urls,
+                                                                                      start_date, end_date))
+                                for file in files]
+
+        return downloaded_files
+
+    def get_jobs(self, video_urls=[], playlist_urls=[], start_date=None, end_date=None):
+        """Lists the videos that still have to be downloaded.
+
+        Returns
+        -------
+        List of (archive id, video URL, playlist URL or None) tuples, without archived and duplicate videos and without
+        videos known to be outside of the date range.
+        """
+
+        jobs = []
+        for url in video_urls:
+            jobs.extend((archive_id, video_url, None) for archive_id, video_url in self.lister(url))
+        for url in playlist_urls:
+            jobs.extend((archive_id, video_url, url) for archive_id, video_url in self.lister(url))
+
+        # Skip archived and duplicate videos.
+        queued_ids = set()
+        new_jobs = []
+        for job in jobs:
+            if job[0] not in self.archive and job[0] not in queued_ids \
+                    and not self.is_skipped(job[0], start_date, end_date):
+                queued_ids.add(job[0])
+                new_jobs.append(job)
+
+        return new_jobs
+
+    def download_job(self, job, start_date=None, end_date=None, max_videos_per_playlist=0):
+        """Downloads the video of a job from get_jobs unless its playlist already reached max_videos_per_playlist.
+
+        Returns
+        -------
+        List of paths of the downloaded files. Empty if the download failed or was skipped.
+        """
+
+        archive_id, video_url, playlist_url = job
+
+        # Reserve a download of the playlist before downloading, so parallel jobs can't exceed the limit, and release
+        # it again if nothing was downloaded.
+        if playlist_url is not None:
+            with self.lock:
+                if 0 < max_videos_per_playlist <= self.downloads_per_playlist.get(playlist_url, 0):
+                    return []
+                self.downloads_per_playlist[playlist_url] = self.downloads_per_playlist.get(playlist_url, 0) + 1
+
+        try:
+            files = self.download_video(archive_id, video_url, start_date, end_date)
+        except Exception as e:
+            print("Could not download " + video_url + ": " + repr(e))
+            files = []
+
+        if playlist_url is not None and len(files) == 0:
+            with self.lock:
+                self.downloads_per_playlist[playlist_url] -= 1
+
+        return files
+
+    def download_video(self, archive_id, video_url, start_date=None, end_date=None):
+        """Downloads one video into a staging folder and moves its files to the output folder.
+
+        Returns
+        -------
+        List of paths of the downloaded files.
+        """
+
+        self.wait_for_request_slot()
+
+        staging_folder = os.path.join(self.output_folder, ".staging", sanitize_file_name(archive_id).replace("/", "_"))
+        os.makedirs(staging_folder, exist_ok=True)
+
+        try:
+            return_code = self.downloader(video_url, staging_folder, start_date, end_date, self.file_name_separator,
+                                          self.extract_subtitles)
+
+            file_names = [file_name for file_name in listdir(staging_folder) if is_downloaded_file(file_name)]
+            if return_code != 0 or not any(file_name.endswith(".wav") for file_name in file_names):
+                # youtube-dl succeeds without any file for videos outside of the date range.
+                if return_code == 0 and len(file_names) == 0 and (start_date is not None or end_date is not None):
+                    self.add_to_skipped(archive_id, start_date, end_date)
+                else:
+                    print("Could not download " + video_url + ": youtube-dl exit code " + str(return_code))
+                # Partial downloads (e.g. only the subtitles) are discarded and the video is downloaded again next time.
+                return []
+
+            downloaded_files = []
+            for file_name in file_names:
+                downloaded_file = os.path.join(self.output_folder, sanitize_file_name(file_name))
+                os.replace(os.path.join(staging_folder, file_name), downloaded_file)
+                downloaded_files.append(downloaded_file)
+
+                if self.on_file_downloaded is not None:
+                    self.on_file_downloaded(downloaded_file)
+        finally:
+            shutil.rmtree(staging_folder, ignore_errors=True)
+
+        self.add_to_archive(archive_id)
+
+        return downloaded_files
+
+    def wait_for_request_slot(self):
+        """Blocks until at least min_request_interval seconds passed since the last download started."""
+
+        with self.lock:
+            start_time = max(time.monotonic(), self.next_request_time)
+            self.next_request_time = start_time + self.min_request_interval
+
+        time.sleep(max(0, start_time - time.monotonic()))
+
+    def add_to_archive(self, archive_id):
+        with self.lock:
+            self.archive.add(archive_id)
+            with open(self.archive_file, "a") as archive:
+                archive.write(archive_id + "\n")
+
+    def is_skipped(self, archive_id, start_date=None, end_date=None):
+        """Returns True if the video was skipped for a date range containing start_date to end_date, so it is outside of
+        this date range as well."""
+
+        for skipped_start_date, skipped_end_date in self.skipped.get(archive_id, []):
+            if (skipped_start_date is None or (start_date is not None and int(start_date) >= int(skipped_start_date))) \
+                    and (skipped_end_date is None or (end_date is not None and int(end_date) <= int(skipped_end_date))):
+                return True
+
+        return False
+
+    def add_to_skipped(self, archive_id, start_date=None, end_date=None):
+        with self.lock:
+            self.skipped.setdefault(archive_id, []).append((start_date, end_date))
+            with open(self.skipped_file, "a") as skipped:
+                skipped.write("\t".join([archive_id, "" if start_date is None else str(start_date),
+                                         "" if end_date is None else str(end_date)]) + "\n")
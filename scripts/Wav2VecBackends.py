@@ -0,0 +1,308 @@
+import argparse
+import hashlib
+import os
+import sys
+import time
+import weakref
+import numpy as np
+import pandas as pd
+import soundfile as sf
+import torch
+
+BACKENDS = ["torch", "quantized", "onnx"]
+DEFAULT_ONNX_FOLDER = os.path.join("models", "wav2vec_onnx")
+ONNX_OPSET_VERSION = 13
+# Largest word error rate against the eager model accepted by compare_backends.
+DEFAULT_MAX_WER = 0.05
+
+
+def inference_mode():
+    """Returns torch.inference_mode if available (torch >= 1.9), otherwise torch.no_grad."""
+
+    return getattr(torch, "inference_mode", torch.no_grad)()
+
+
+class TorchBackend:
+    """Runs the model in eager PyTorch. The quantized backend is a TorchBackend with int8 linear layers."""
+
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, input_values, attention_mask=None):
+        """Returns the logits tensor of shape (batch, frames, vocabulary)."""
+
+        model_inputs = {"input_values": input_values}
+        if attention_mask is not None:
+            model_inputs["attention_mask"] = attention_mask
+
+        with inference_mode():
+            return self.model(**model_inputs).logits
+
+
+class LogitsOnly(torch.nn.Module):
+    """Wraps a Wav2Vec2ForCTC model so that the exported graph has plain tensor inputs and a single output."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_values, attention_mask=None):
+        return self.model(input_values, attention_mask=attention_mask).logits
+
+
+class OnnxBackend:
+    """Runs an exported ONNX graph of the model with onnxruntime on the CPU. Requires the onnxruntime package."""
+
+    def __init__(self, model, onnx_path, use_attention_mask=False, num_threads=None):
+        """
+        :param model: Wav2Vec2ForCTC model. Exported to onnx_path if the file does not exist yet.
+        :param onnx_path: Path of the ONNX file.
+        :param use_attention_mask: Export and feed the attention mask (models with feat_extract_norm == "layer").
+        :param num_threads: Number of threads used by onnxruntime. None uses all cores.
+        """
+
+        import onnxruntime
+
+        self.use_attention_mask = use_attention_mask
+
+        if not os.path.isfile(onnx_path):
+            export_onnx(model, onnx_path, use_attention_mask)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads is not None:
+            options.intra_op_num_threads = num_threads
+
+        self.session = onnxruntime.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+
+    def __call__(self, input_values, attention_mask=None):
+        """Returns the logits tensor of shape (batch, frames, vocabulary)."""
+
+        feed = {"input_values": input_values.numpy().astype(np.float32)}
+        if self.use_attention_mask:
+            if attention_mask is None:
+                attention_mask = torch.ones(input_values.shape, dtype=torch.long)
+            feed["attention_mask"] = attention_mask.numpy().astype(np.int64)
+
+        return torch.from_numpy(self.session.run(["logits"], feed)[0])
+
+
+def export_onnx(model, onnx_path, use_attention_mask=False):
+    """Exports a Wav2Vec2ForCTC model to ONNX with dynamic batch size and audio length."""
+
+    os.makedirs(os.path.dirname(onnx_path) or ".", exist_ok=True)
+
+    dummy_input = torch.zeros(1, 16000, dtype=torch.float32)
+    inputs = (dummy_input,)
+    input_names = ["input_values"]
+    dynamic_axes = {"input_values": {0: "batch", 1: "samples"}, "logits": {0: "batch", 1: "frames"}}
+    if use_attention_mask:
+        inputs = (dummy_input, torch.ones(1, 16000, dtype=torch.long))
+        input_names.append("attention_mask")
+        dynamic_axes["attention_mask"] = {0: "batch", 1: "samples"}
+
+    # Export to a temporary file, so an interrupted export never leaves a broken model behind.
+    temp_path = onnx_path + ".tmp"
+    with torch.no_grad():
+        torch.onnx.export(LogitsOnly(model).eval(), inputs, temp_path, input_names=input_names,
+                          output_names=["logits"], dynamic_axes=dynamic_axes, opset_version=ONNX_OPSET_VERSION)
+    os.replace(temp_path, onnx_path)
+
+
+def quantize(model):
+    """Returns a copy of the model with dynamically quantized int8 linear layers (weights int8, activations float)."""
+
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def create_backend(model, backend="torch", onnx_path=None, use_attention_mask=False, num_threads=None):
+    """Creates an inference backend for a Wav2Vec2ForCTC model.
+
+    Parameters
+    ----------
+    model : Wav2Vec2ForCTC
+        Model in evaluation mode.
+    backend : str
+        torch (full precision eager PyTorch), quantized (int8 linear layers) or onnx (onnxruntime).
+    onnx_path : str
+        ONNX file for the onnx backend. The model is exported to it if it does not exist.
+    use_attention_mask : bool
+        Whether the model expects an attention mask.
+    num_threads : int
+        Number of threads used by onnxruntime.
+
+    Returns
+    -------
+    Callable (input_values, attention_mask) returning the logits tensor.
+    """
+
+    if backend == "torch":
+        return TorchBackend(model)
+    if backend == "quantized":
+        return TorchBackend(quantize(model))
+    if backend == "onnx":
+        return OnnxBackend(model, onnx_path, use_attention_mask, num_threads)
+
+    raise ValueError("Unknown Wav2Vec backend " + str(backend) + ", use one of " + ", ".join(BACKENDS))
+
+
+# model -> (weights state, hash), see get_model_hash
+model_hashes = weakref.WeakKeyDictionary()
+
+
+def get_model_hash(model):
+    """Returns a SHA-1 hash of the configuration and weights of a model.
+
+    Reads every weight once, for large models this takes a few seconds. The hash is cached per model object and only
+    computed again after a weight was replaced or changed in place (e.g. by training), which changes the storage or the
+    version counter of its tensor.
+    """
+
+    state_dict = model.state_dict()
+    weights_state = (model.config.to_json_string(),
+                     tuple((name, tensor.data_ptr(), tensor._version) for name, tensor in state_dict.items()))
+    cached = model_hashes.get(model)
+    if cached is not None and cached[0] == weights_state:
+        return cached[1]
+
+    model_hash = hashlib.sha1(weights_state[0].encode("utf-8"))
+    for name, tensor in state_dict.items():
+        model_hash.update(name.encode("utf-8"))
+        model_hash.update(tensor.detach().cpu().contiguous().reshape(-1).view(torch.uint8).numpy())
+
+    model_hashes[model] = (weights_state, model_hash.hexdigest())
+    return model_hash.hexdigest()
+
+
+def get_default_onnx_path(model):
+    """Returns the default ONNX file of a model, e.g. models/wav2vec_onnx/<repository name>-<hash>.onnx.
+
+    The file name contains a hash of the weights, so a fine-tuned or updated model with the same name is exported
+    again instead of loading the graph of the old weights.
+    """
+
+    model_name = getattr(model.config, "_name_or_path", "") or "custom"
+
+    return os.path.join(DEFAULT_ONNX_FOLDER, model_name.strip("/\\").replace("/", "--").replace("\\", "--") + "-"
+                        + get_model_hash(model)[:12] + ".onnx")
+
+
+def word_error_rate(references, hypotheses):
+    """Computes the word error rate of hypotheses against references (word level Levenshtein distance).
+
+    Parameters
+    ----------
+    references, hypotheses : list of str
+        Transcripts in the same order.
+
+    Returns
+    -------
+    Number of substituted, deleted and inserted words divided by the number of reference words.
+    """
+
+    errors = 0
+    reference_words = 0
+    for reference, hypothesis in zip(references, hypotheses):
+        reference = (reference or "").split()
+        hypothesis = (hypothesis or "").split()
+
+        distances = np.arange(len(hypothesis) + 1)
+        for i, reference_word in enumerate(reference, 1):
+            previous = distances.copy()
+            distances[0] = i
+            for j, hypothesis_word in enumerate(hypothesis, 1):
+                distances[j] = min(previous[j] + 1, distances[j - 1] + 1,
+                                   previous[j - 1] + (reference_word != hypothesis_word))
+
+        errors += distances[-1]
+        reference_words += len(reference)
+
+    return errors / max(reference_words, 1)
+
+
+def compare_backends(pipeline, clip_files, backends=("quantized", "onnx"), onnx_path=None, max_wer=DEFAULT_MAX_WER):
+    """Transcribes a fixed clip set with the eager model and every backend and compares the results.
+
+    Parameters
+    ----------
+    pipeline : SentimentAnalysisPipeline
+        Pipeline with the torch backend. Its model, processor and batch size are used.
+    clip_files : list of str
+        Paths of 16 kHz audio clips.
+    backends : list of str
+        Backends compared with the eager model.
+    onnx_path : str
+        ONNX file for the onnx backend. Defaults to get_default_onnx_path of the model.
+    max_wer : float
+        Largest word error rate of a backend against the eager transcripts that is accepted.
+
+    Returns
+    -------
+    Data frame with the columns (Backend, WER, Seconds, Audio_Seconds_Per_Second, Within_Tolerance). WER is measured
+    against the eager transcripts, Seconds is the total transcription time. Within_Tolerance is False for backends
+    whose WER is above max_wer, they should not be used with this model.
+    """
+
+    audio_clips = [sf.read(clip_file, dtype="float32")[0] for clip_file in clip_files]
+    audio_seconds = sum(len(audio) for audio in audio_clips) / pipeline.DEFAULT_SAMPLING_RATE
+    use_attention_mask = bool(getattr(pipeline.wav2vec_processor.feature_extractor, "return_attention_mask", False))
+
+    if onnx_path is None:
+        onnx_path = get_default_onnx_path(pipeline.wav2vec_model)
+
+    eager_backend = pipeline.wav2vec_backend
+    results = []
+    references = None
+
+    try:
+        for backend in ["torch"] + list(backends):
+            pipeline.wav2vec_backend = create_backend(pipeline.wav2vec_model, backend, onnx_path, use_attention_mask,
+                                                      pipeline.num_threads)
+            # Warm up, the first forward pass pays for lazy initialization.
+            pipeline.transcribe_batch([audio_clips[0]])
+
+            start_time = time.perf_counter()
+            texts = [pipeline.transcribe_batch(audio_clips[i:i + pipeline.wav2vec_batch_size])
+                     for i in range(0, len(audio_clips), pipeline.wav2vec_batch_size)]
+            seconds = time.perf_counter() - start_time
+            texts = [text for batch in texts for text in batch]
+
+            if references is None:
+                references = texts
+            results.append([backend, word_error_rate(references, texts), seconds, audio_seconds / seconds])
+    finally:
+        pipeline.wav2vec_backend = eager_backend
+
+    df_results = pd.DataFrame(results, columns=["Backend", "WER", "Seconds", "Audio_Seconds_Per_Second"])
+    df_results["Within_Tolerance"] = df_results["WER"] <= max_wer
+
+    return df_results
+
+
+if __name__ == '__main__':
+    from CryptoSentimentAnalysis import SentimentAnalysisPipeline
+
+    parser = argparse.ArgumentParser(description="Compare the word error rate and speed of the Wav2Vec backends with "
+                                                 "the eager PyTorch model on a fixed set of clips.")
+    parser.add_argument("clips_folder", help="Folder with 16 kHz wav clips.")
+    parser.add_argument("--wav2vec-model", default=SentimentAnalysisPipeline.DEFAULT_WAV2VEC_REPOSITORY)
+    parser.add_argument("--offline", action="store_true")
+    parser.add_argument("--backends", nargs="+", default=["quantized", "onnx"], choices=BACKENDS)
+    parser.add_argument("--onnx-path", default=None)
+    parser.add_argument("--max-clips", type=int, default=100)
+    parser.add_argument("--num-threads", type=int, default=None)
+    parser.add_argument("--max-wer", type=float, default=DEFAULT_MAX_WER,
+                        help="Exit with status 1 if a backend has a higher word error rate.")
+    args = parser.parse_args()
+
+    clips = sorted(os.path.join(args.clips_folder, file_name) for file_name in os.listdir(args.clips_folder)
+                   if file_name[-4:] == ".wav")[:args.max_clips]
+    sentiment_pipeline = SentimentAnalysisPipeline(wav2vec_model=args.wav2vec_model, offline=args.offline,
+                                                   num_threads=args.num_threads)
+
+    df_comparison = compare_backends(sentiment_pipeline, clips, args.backends, args.onnx_path, args.max_wer)
+    print(df_comparison.to_string(index=False))
+    if not df_comparison["Within_Tolerance"].all():
+        print("Backends above the maximum word error rate of " + str(args.max_wer) + ": "
+              + ", ".join(df_comparison.loc[~df_comparison["Within_Tolerance"], "Backend"]))
+        sys.exit(1)
@@ -0,0 +1,34 @@
+import os
+import sys
+import pytest
+
+# The modules in scripts are imported by their file name, like the notebooks and the pipeline import them.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def tiny_models(tmp_path_factory):
+    """Small randomly initialized speech to text and sentiment models, see Benchmark.make_tiny_wav2vec."""
+
+    pytest.importorskip("transformers")
+    import Benchmark
+
+    folder = str(tmp_path_factory.mktemp("models"))
+    processor, model = Benchmark.make_tiny_wav2vec(folder)
+    vectorizer_path, model_path = Benchmark.make_sentiment_model(folder)
+    return {"wav2vec_processor": processor, "wav2vec_model": model, "sentiment_vectorizer": vectorizer_path,
+            "sentiment_model": model_path}
+
+
+@pytest.fixture
+def make_pipeline(tiny_models):
+    """Returns a function creating a SentimentAnalysisPipeline with the tiny models and the native audio features."""
+
+    from CryptoSentimentAnalysis import SentimentAnalysisPipeline
+
+    def make_pipeline(**kwargs):
+        settings = dict(tiny_models, wav2vec_version="test", audio_feature_backend="native")
+        settings.update(kwargs)
+        return SentimentAnalysisPipeline(**settings)
+
+    return make_pipeline
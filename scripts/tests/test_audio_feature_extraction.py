@@ -0,0 +1,66 @@
+import os
+import numpy as np
+import pandas as pd
+import AudioFeatureExtraction
+import NativeAudioFeatures
+
+
+def make_labelled_data():
+    return pd.DataFrame({"Podcast_Title": ["Episode A.en.vtt", "Episode A.en.vtt", "Episode B.en.vtt"],
+                         "Start_Time": ["00:00:00.000", "00:00:01.000", "00:00:00.500"],
+                         "End_Time": ["00:00:01.000", "00:00:02.000", "00:00:01.500"]})
+
+
+def test_praat_failure_of_one_clip_keeps_the_others(monkeypatch):
+    monkeypatch.setattr(AudioFeatureExtraction, "decode_audio",
+                        lambda audio_file, sampling_rate: np.arange(3 * sampling_rate, dtype=np.float32))
+
+    def get_audio_features_from_array(audio, sampling_rate, praat_path, praat_script):
+        if audio[0] == sampling_rate:
+            raise UnicodeDecodeError("utf-16", b"\x00", 0, 1, "truncated data")
+        return [str(float(i)) for i in range(len(NativeAudioFeatures.AUDIO_FEATURE_NAMES))]
+
+    monkeypatch.setattr(AudioFeatureExtraction, "get_audio_features_from_array", get_audio_features_from_array)
+
+    result = AudioFeatureExtraction.extract_clips_from_data_frame_batched(
+        make_labelled_data(), "podcasts", correct_file_extension=True, audio_features="praat", max_workers=2)
+
+    assert result["Clip_Name"].tolist() == ["Episode A_00.00.00.000_00.00.01.000.wav",
+                                            "Episode A_00.00.01.000_00.00.02.000.wav",
+                                            "Episode B_00.00.00.500_00.00.01.500.wav"]
+    assert result.loc[1, NativeAudioFeatures.AUDIO_FEATURE_NAMES].isna().all()
+    assert result.loc[[0, 2], "Pitch_Max"].tolist() == [1.0, 1.0]
+
+
+def test_undecodable_podcast_has_no_features(monkeypatch):
+    def decode_audio(audio_file, sampling_rate):
+        if "Episode B" in audio_file:
+            raise OSError("No such file")
+        return np.zeros(3 * sampling_rate, dtype=np.float32)
+
+    monkeypatch.setattr(AudioFeatureExtraction, "decode_audio", decode_audio)
+
+    result = AudioFeatureExtraction.extract_clips_from_data_frame_batched(
+        make_labelled_data(), "podcasts", correct_file_extension=True, audio_features="native")
+
+    assert len(result) == 3
+    assert result.loc[2, NativeAudioFeatures.AUDIO_FEATURE_NAMES].isna().all()
+
+
+def test_praat_defaults_match_the_pipeline(monkeypatch):
+    monkeypatch.setattr(AudioFeatureExtraction, "decode_audio",
+                        lambda audio_file, sampling_rate: np.zeros(3 * sampling_rate, dtype=np.float32))
+    praat_calls = set()
+
+    def get_audio_features_from_array(audio, sampling_rate, praat_path, praat_script):
+        praat_calls.add((praat_path, praat_script))
+        return [str(float(i)) for i in range(len(NativeAudioFeatures.AUDIO_FEATURE_NAMES))]
+
+    monkeypatch.setattr(AudioFeatureExtraction, "get_audio_features_from_array", get_audio_features_from_array)
+
+    AudioFeatureExtraction.extract_clips_from_data_frame_batched(make_labelled_data(), "podcasts",
+                                                                 correct_file_extension=True, audio_features="praat")
+
+    assert praat_calls == {(AudioFeatureExtraction.DEFAULT_PRAAT_PATH, AudioFeatureExtraction.DEFAULT_PRAAT_SCRIPT)}
+    assert os.path.isfile(os.path.join(os.path.dirname(AudioFeatureExtraction.__file__),
+                                       AudioFeatureExtraction.DEFAULT_PRAAT_SCRIPT))
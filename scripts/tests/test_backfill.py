@@ -0,0 +1,191 @@
+import argparse
+import multiprocessing
+import os
+import time
+import pandas as pd
+import pytest
+import Backfill
+
+
+def make_episodes(dates):
+    return pd.DataFrame([[date, "Channel", "Episode %d" % i, "100", "Channel-sep-%d-sep-Episode %d-sep-100.wav"
+                          % (date, i)] for i, date in enumerate(dates)], columns=Backfill.EPISODE_COLUMNS)
+
+
+class StubPipeline:
+    """Labels every episode with one bullish BTC clip instead of running the models."""
+
+    def __init__(self, on_episode=None):
+        self.on_episode = on_episode
+
+    def process_episode(self, row, clip_extraction_method="ffmpeg", checkpoints=None):
+        if self.on_episode is not None:
+            self.on_episode(row)
+        return pd.DataFrame({"Date": [row["Date"]], "Author": row["Author"], "Title": row["Title"], "Coin": "BTC",
+                             "Sentiment": "bullish"})
+
+
+def run_stub_worker(queue_path, output_folder, log_path, worker):
+    """Runs a worker with a StubPipeline, logging every processed episode."""
+
+    def log_episode(row):
+        with open(log_path, "a") as log:
+            log.write(worker + "\t" + row["Episode_File_Name"] + "\n")
+        time.sleep(0.05)
+
+    Backfill.run_worker(queue_path, output_folder, StubPipeline(log_episode), worker=worker)
+
+
+def queued_episodes(work_queue):
+    episodes = []
+    while True:
+        shard = work_queue.claim("worker")
+        if shard is None:
+            return episodes
+        episodes.extend(episode["Episode_File_Name"] for episode in shard[1])
+        work_queue.complete(shard[0], "worker", shard[0] + ".pkl")
+
+
+@pytest.fixture
+def work_queue(tmp_path):
+    work_queue = Backfill.WorkQueue(str(tmp_path / "queue.sqlite"), max_attempts=2)
+    yield work_queue
+    work_queue.close()
+
+
+def test_make_shards():
+    df = make_episodes([20210105] * 12 + [20210201] * 3)
+
+    shards = Backfill.make_shards(df, shard_size=5)
+
+    assert [len(episodes) for _, episodes in shards] == [5, 5, 2, 3]
+    assert [shard_id[:6] for shard_id, _ in shards] == ["202101", "202101", "202101", "202102"]
+    assert len({shard_id for shard_id, _ in shards}) == 4
+    assert Backfill.make_shards(df, shard_size=5) == shards
+
+
+def test_republish_adds_only_new_episodes(work_queue):
+    df = make_episodes([20210101 + i for i in range(10)])
+    assert work_queue.publish(df, shard_size=4) == 3
+    first_episodes = queued_episodes(work_queue)
+    assert sorted(first_episodes) == sorted(df["Episode_File_Name"])
+
+    # A new episode in the middle of the month.
+    df_new = pd.concat([df, make_episodes([20210105]).assign(Title="New", Episode_File_Name="new.wav")],
+                       ignore_index=True).sort_values(["Date", "Episode_File_Name"], ignore_index=True)
+    assert work_queue.publish(df_new, shard_size=4) == 1
+    assert work_queue.publish(df_new, shard_size=4) == 0
+
+    assert queued_episodes(work_queue) == ["new.wav"]
+    assert work_queue.is_finished()
+
+
+def test_retries_failed_shard(work_queue):
+    work_queue.publish(make_episodes([20210101]))
+
+    shard_id, _ = work_queue.claim("worker")
+    work_queue.fail(shard_id, "worker", "error")
+    assert work_queue.get_status() == {"pending": 1}
+
+    assert work_queue.claim("worker")[0] == shard_id
+    work_queue.fail(shard_id, "worker", "error")
+    assert work_queue.get_status() == {"failed": 1}
+    assert work_queue.claim("worker") is None
+    assert work_queue.is_finished()
+
+    assert work_queue.reset_failed() == 1
+    assert work_queue.claim("worker")[0] == shard_id
+
+
+def test_expired_lease_is_claimed_again(work_queue):
+    work_queue.publish(make_episodes([20210101]))
+
+    shard_id, _ = work_queue.claim("dead worker", lease_seconds=0.01)
+    time.sleep(0.05)
+    assert not work_queue.is_finished()
+
+    assert work_queue.claim("worker")[0] == shard_id
+    assert not work_queue.renew(shard_id, "dead worker")
+    assert work_queue.renew(shard_id, "worker")
+
+
+def test_expired_lease_on_last_attempt_fails(work_queue):
+    work_queue.publish(make_episodes([20210101]))
+
+    for _ in range(2):
+        shard_id, _ = work_queue.claim("dead worker", lease_seconds=0.01)
+        time.sleep(0.05)
+
+    assert work_queue.claim("worker") is None
+    assert work_queue.get_status() == {"failed": 1}
+    assert work_queue.is_finished()
+
+    assert work_queue.reset_failed() == 1
+    assert work_queue.claim("worker")[0] == shard_id
+
+
+def test_complete_requires_the_lease(work_queue):
+    work_queue.publish(make_episodes([20210101]))
+    shard_id, _ = work_queue.claim("dead worker", lease_seconds=0.01)
+    time.sleep(0.05)
+    work_queue.claim("worker")
+
+    assert not work_queue.complete(shard_id, "dead worker", "dead.pkl")
+    work_queue.fail(shard_id, "dead worker", "error")
+    assert work_queue.get_status() == {"leased": 1}
+    assert work_queue.complete(shard_id, "worker", "worker.pkl")
+    assert work_queue.get_results() == ["worker.pkl"]
+
+
+def test_worker_abandons_shard_after_losing_the_lease(work_queue, tmp_path):
+    work_queue.publish(make_episodes([20210101]))
+
+    def take_over_shard(row):
+        # Another worker claims the shard after the lease of this worker ran out.
+        with work_queue.lock:
+            work_queue.connection.execute("UPDATE shards SET lease_expires = 0")
+        assert work_queue.claim("other worker") is not None
+
+    output_folder = str(tmp_path / "shards")
+    processed = Backfill.run_worker(work_queue.path, output_folder, StubPipeline(take_over_shard), worker="worker")
+
+    assert processed == 0
+    assert os.listdir(output_folder) == []
+    assert work_queue.get_status() == {"leased": 1}
+
+
+def test_worker_processes_share_the_queue(work_queue, tmp_path):
+    df_episodes = make_episodes([20210101 + i for i in range(10)] + [20210201 + i for i in range(10)])
+    work_queue.publish(df_episodes, shard_size=3)
+    output_folder = str(tmp_path / "shards")
+    log_path = str(tmp_path / "episodes.log")
+
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=run_stub_worker, args=(work_queue.path, output_folder, log_path, "worker %d" % i))
+               for i in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+    assert [worker.exitcode for worker in workers] == [0, 0, 0]
+
+    with open(log_path) as log:
+        processed = [line.rstrip("\n").split("\t")[1] for line in log]
+    assert sorted(processed) == sorted(df_episodes["Episode_File_Name"])
+    assert work_queue.get_status() == {"done": 8}
+
+    df, aggregator = Backfill.merge(work_queue.path, str(tmp_path / "merged"))
+
+    assert sorted(df["Title"]) == sorted(df_episodes["Title"])
+    assert df.columns.tolist() == Backfill.OUTPUT_COLUMNS
+    df_aggregated = aggregator.get_df(period="day")
+    assert df_aggregated["Bullish"].tolist() == [1] * 20
+    assert sorted(os.listdir(tmp_path / "merged")) == ["aggregator.pkl", "sentiments.csv"]
+
+
+def test_local_workers_get_the_same_settings():
+    args = argparse.Namespace(command="local", queue="queue.sqlite", output_folder="out", shard_size=5, workers=3,
+                              worker=None, wait=False, offline=True, sentiment_model=None)
+
+    assert Backfill.get_worker_arguments(args) == ["--queue", "queue.sqlite", "--output-folder", "out",
+                                                   "--shard-size", "5", "--offline"]
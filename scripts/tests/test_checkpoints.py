@@ -0,0 +1,87 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("transformers")
+
+import Benchmark
+import PipelineCheckpoints
+
+ROW = pd.Series({"Date": 20210101, "Author": "Channel", "Title": "Episode", "Views": "1000"})
+
+
+@pytest.fixture
+def pipeline(make_pipeline, tmp_path, monkeypatch):
+    audio_files_folder = tmp_path / "audio"
+    audio_files_folder.mkdir()
+    (audio_files_folder / "Channel-sep-20210101-sep-Episode-sep-1000.wav").write_bytes(b"")
+
+    pipeline = make_pipeline(audio_files_folder=str(audio_files_folder), clip_length=5)
+    audio, _ = Benchmark.synthesize_speech(20, np.random.default_rng(0))
+    monkeypatch.setattr(pipeline, "decode_episode_audio", lambda row: audio)
+    return pipeline
+
+
+def run_episode(pipeline, checkpoints, monkeypatch):
+    """Processes the episode and returns it with the names of the stages that ran."""
+
+    stages = []
+    run_episode_stage = type(pipeline).run_episode_stage
+
+    def record_stage(stage, *args, **kwargs):
+        stages.append(stage)
+        return run_episode_stage(pipeline, stage, *args, **kwargs)
+
+    monkeypatch.setattr(pipeline, "run_episode_stage", record_stage)
+    return pipeline.process_episode(ROW, "memory", checkpoints=checkpoints), stages
+
+
+def test_resume_skips_completed_stages(pipeline, tmp_path, monkeypatch):
+    checkpoints = PipelineCheckpoints.CheckpointStore(str(tmp_path / "checkpoints"))
+
+    df, stages = run_episode(pipeline, checkpoints, monkeypatch)
+    assert stages == pipeline.EPISODE_STAGES
+
+    df_resumed, stages = run_episode(pipeline, checkpoints, monkeypatch)
+    assert stages == []
+    pd.testing.assert_frame_equal(df_resumed, df)
+
+
+def test_resume_after_interrupted_run(pipeline, tmp_path, monkeypatch):
+    checkpoints = PipelineCheckpoints.CheckpointStore(str(tmp_path / "checkpoints"))
+    episode = pipeline.start_episode(ROW, "memory", checkpoints)
+    pipeline.run_episode_stages(episode, ["clips", "text"], "memory", checkpoints=checkpoints)
+
+    _, stages = run_episode(pipeline, checkpoints, monkeypatch)
+
+    assert stages == ["coins", "audio_features", "sentiments"]
+
+
+def test_changed_settings_invalidate_later_stages(pipeline, tmp_path, monkeypatch):
+    checkpoints = PipelineCheckpoints.CheckpointStore(str(tmp_path / "checkpoints"))
+    run_episode(pipeline, checkpoints, monkeypatch)
+
+    pipeline.TEXT_COIN_LABELS = dict(pipeline.TEXT_COIN_LABELS, BTC=["bitcoin", "btc", "sats"])
+    _, stages = run_episode(pipeline, checkpoints, monkeypatch)
+    assert stages == ["coins", "audio_features", "sentiments"]
+
+    # A newer audio file makes every checkpoint outdated.
+    audio_file = os.path.join(pipeline.audio_files_folder, pipeline.reconstruct_filename_from_metadata(ROW))
+    os.utime(audio_file, (os.path.getmtime(audio_file) + 10,) * 2)
+    _, stages = run_episode(pipeline, checkpoints, monkeypatch)
+    assert stages == pipeline.EPISODE_STAGES
+
+
+def test_missing_praat_script_is_only_read_for_checkpoints(make_pipeline, tmp_path):
+    pipeline = make_pipeline(audio_feature_backend="praat", praat_script=str(tmp_path / "missing.praat"),
+                             use_audio_features=False)
+
+    assert pipeline.start_episode(ROW, "memory")["versions"] is None
+
+    pipeline.use_audio_features = True
+    versions = pipeline.get_stage_versions("memory")
+    praat_script = tmp_path / "missing.praat"
+    praat_script.write_text("# script")
+    assert pipeline.get_stage_versions("memory")["audio_features"] != versions["audio_features"]
+    assert pipeline.get_stage_versions("memory")["text"] == versions["text"]
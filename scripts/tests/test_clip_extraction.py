@@ -0,0 +1,62 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+import soundfile as sf
+
+pytest.importorskip("transformers")
+
+import Benchmark
+
+ROW = pd.Series({"Date": 20210101, "Author": "Channel", "Title": "Episode", "Views": "1000"})
+# ffmpeg's segment muxer cuts wav files between packets of 1024 samples.
+FFMPEG_PACKET_SAMPLES = 1024
+
+
+@pytest.fixture
+def audio():
+    audio, _ = Benchmark.synthesize_speech(23, np.random.default_rng(0))
+    return audio
+
+
+def test_in_memory_clips_are_views_of_equal_length(make_pipeline, audio, monkeypatch):
+    pipeline = make_pipeline(clip_length=5)
+    monkeypatch.setattr(pipeline, "decode_episode_audio", lambda row: audio)
+
+    df = pipeline.get_episode_clips_df(ROW, "memory")
+
+    assert df["Clip_Id"].tolist() == ["0000", "0001", "0002", "0003", "0004"]
+    assert df["Start"].tolist() == [0, 5, 10, 15, 20]
+    assert df["End"].tolist() == [5, 10, 15, 20, 23]
+    assert df["File_Name"].isna().all()
+    for start, clip in zip(df["Start"], df["Audio"]):
+        assert np.shares_memory(clip, audio)
+        np.testing.assert_array_equal(clip, audio[start * 16000:(start + 5) * 16000])
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+def test_in_memory_clips_match_ffmpeg_clips(make_pipeline, audio, tmp_path):
+    audio_files_folder = tmp_path / "audio"
+    clips_folder = tmp_path / "clips"
+    audio_files_folder.mkdir()
+    clips_folder.mkdir()
+    sf.write(str(audio_files_folder / "Channel-sep-20210101-sep-Episode-sep-1000.wav"), audio, 16000)
+    pipeline = make_pipeline(audio_files_folder=str(audio_files_folder), clips_folder=str(clips_folder), clip_length=5)
+
+    df_memory = pipeline.get_episode_clips_df(ROW, "memory")
+    df_ffmpeg = pipeline.get_episode_clips_df(ROW, "ffmpeg")
+
+    assert df_ffmpeg["Clip_Id"].tolist() == df_memory["Clip_Id"].tolist()
+    assert df_ffmpeg["Start"].tolist() == df_memory["Start"].tolist()
+
+    decoded = np.concatenate(df_memory["Audio"].tolist())
+    ffmpeg_start = 0
+    for memory_start, file_name in zip(df_memory["Start"], df_ffmpeg["File_Name"]):
+        ffmpeg_clip, sampling_rate = sf.read(os.path.join(str(clips_folder), file_name), dtype="float32")
+        assert sampling_rate == 16000
+        assert abs(ffmpeg_start - memory_start * 16000) < FFMPEG_PACKET_SAMPLES
+        np.testing.assert_allclose(ffmpeg_clip, decoded[ffmpeg_start:ffmpeg_start + len(ffmpeg_clip)], atol=1e-4)
+        ffmpeg_start += len(ffmpeg_clip)
+
+    assert ffmpeg_start == len(decoded)
@@ -0,0 +1,104 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import FeatureCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = FeatureCache.FeatureCache(str(tmp_path / "cache.sqlite"), max_size=10_000)
+    yield cache
+    cache.close()
+
+
+def test_put_and_get(cache):
+    cache.put("text", "v1", "a", "hello")
+    cache.put_many("text", "v1", {"b": "world", "c": [1.0, 2.0]})
+
+    assert cache.get("text", "v1", "a") == "hello"
+    assert cache.get("text", "v2", "a") is None
+    assert cache.get("audio_features", "v1", "a") is None
+    assert cache.get_many("text", "v1", ["a", "c", "d"]) == {"a": "hello", "c": [1.0, 2.0]}
+
+
+def test_size_is_tracked(cache):
+    cache.put_many("text", "v1", {str(i): "x" * 100 for i in range(10)})
+    # Replacing a value does not count it twice.
+    cache.put("text", "v1", "0", "y" * 200)
+
+    assert cache.total_size == cache.size()
+
+    cache.invalidate(kind="text")
+    assert cache.total_size == cache.size() == 0
+
+
+def test_evicts_least_recently_used(cache):
+    for i in range(5):
+        cache.put("audio_features", "v1", str(i), np.zeros(200, dtype=np.float32))
+    cache.get("audio_features", "v1", "0")
+
+    # Every value takes a little more than 800 bytes, 13 do not fit into 10000 bytes.
+    cache.put_many("audio_features", "v1", {str(i): np.zeros(200, dtype=np.float32) for i in range(5, 13)})
+
+    assert cache.size() <= cache.max_size
+    assert cache.total_size == cache.size()
+    assert cache.get("audio_features", "v1", "0") is not None
+    assert cache.get("audio_features", "v1", "1") is None
+    assert cache.get("audio_features", "v1", "12") is not None
+
+
+def test_notices_other_writers(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = FeatureCache.FeatureCache(path, max_size=10_000)
+    other_cache = FeatureCache.FeatureCache(path, max_size=10_000)
+
+    other_cache.put_many("text", "v1", {str(i): "x" * 1000 for i in range(9)})
+    cache.put_many("text", "v1", {str(i): "x" * 1000 for i in range(9, 18)})
+    # Neither cache has written more than max_size itself.
+    assert cache.size() > cache.max_size
+
+    cache.put_many("text", "v1", {str(i): "x" * 1000 for i in range(18, 20)})
+    assert cache.size() <= cache.max_size
+    assert cache.total_size == cache.size()
+    cache.close()
+    other_cache.close()
+
+
+def test_hash_audio():
+    audio = np.linspace(-1, 1, 100)
+
+    assert FeatureCache.hash_audio(audio) == FeatureCache.hash_audio(audio.astype(np.float32))
+    assert FeatureCache.hash_audio(audio) != FeatureCache.hash_audio(audio[:-1])
+
+
+def test_praat_audio_features_are_cached(tmp_path, monkeypatch):
+    pytest.importorskip("transformers")
+    import Benchmark
+    from CryptoSentimentAnalysis import SentimentAnalysisPipeline
+
+    processor, model = Benchmark.make_tiny_wav2vec(str(tmp_path / "models"))
+    praat_script = tmp_path / "GetAudioFeatures.praat"
+    praat_script.write_text("# test script")
+    pipeline = SentimentAnalysisPipeline(wav2vec_model=model, wav2vec_processor=processor, wav2vec_version="test",
+                                         audio_feature_backend="praat", praat_script=str(praat_script),
+                                         cache_path=os.path.join(str(tmp_path), "cache.sqlite"))
+
+    calls = []
+
+    def get_audio_features_for_clip(row, timeout=None):
+        calls.append(row["Clip_Id"])
+        return [str(float(i)) for i in range(len(pipeline.AUDIO_FEATURE_COLUMNS))]
+
+    monkeypatch.setattr(pipeline, "get_audio_features_for_clip", get_audio_features_for_clip)
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"Clip_Id": ["0000", "0001", "0002"], "Title": "Episode", "Coin": ["BTC", "ETH", "XRP"],
+                       "Audio": [rng.normal(size=1600).astype(np.float32) for _ in range(3)]})
+
+    first = pipeline.get_audio_features_df(df)
+    second = pipeline.get_audio_features_df(df)
+
+    assert calls == ["0000", "0001"]
+    pd.testing.assert_frame_equal(first, second)
+    assert first.iloc[2].isna().all()
+    assert first.iloc[0].tolist() == [float(i) for i in range(len(pipeline.AUDIO_FEATURE_COLUMNS))]
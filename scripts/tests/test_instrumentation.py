@@ -0,0 +1,102 @@
+import json
+import sys
+import threading
+import pytest
+import Instrumentation
+
+
+def test_counters_and_spans_from_many_threads():
+    instrumentation = Instrumentation.Instrumentation()
+
+    def work():
+        for _ in range(100):
+            instrumentation.count("clips")
+            instrumentation.add_span("model.wav2vec", 0.5)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    instrumentation.count("cache_hits.text", 5)
+    instrumentation.add_span("model.wav2vec", 2.0)
+
+    report = instrumentation.get_report()
+
+    assert report["counters"] == {"clips": 400, "cache_hits.text": 5}
+    assert report["spans"]["model.wav2vec"] == {"count": 401, "seconds": pytest.approx(202), "max_seconds": 2}
+    assert report["wall_seconds"] >= 0
+
+    instrumentation.reset()
+    assert instrumentation.get_report()["counters"] == {}
+
+
+def test_span_is_recorded_when_the_block_fails():
+    instrumentation = Instrumentation.Instrumentation()
+
+    with pytest.raises(ValueError):
+        with instrumentation.span("model.sentiment"):
+            raise ValueError()
+
+    assert instrumentation.get_report()["spans"]["model.sentiment"]["count"] == 1
+
+
+def test_failed_subprocesses_are_counted():
+    instrumentation = Instrumentation.Instrumentation()
+
+    assert instrumentation.run_subprocess("python", [sys.executable, "-c", "pass"]).returncode == 0
+    assert instrumentation.run_subprocess("python", [sys.executable, "-c", "raise SystemExit(3)"]).returncode == 3
+    with pytest.raises(OSError):
+        instrumentation.run_subprocess("missing", ["this-program-does-not-exist"])
+
+    report = instrumentation.get_report()
+    assert report["spans"]["subprocess.python"]["count"] == 2
+    assert report["counters"] == {"subprocess_failures": 2, "subprocess_failures.python": 1,
+                                  "subprocess_failures.missing": 1}
+
+
+def test_sinks(tmp_path):
+    json_path = str(tmp_path / "runs.jsonl")
+    prometheus_path = str(tmp_path / "metrics.prom")
+    instrumentation = Instrumentation.Instrumentation([Instrumentation.JsonLinesSink(json_path),
+                                                       Instrumentation.PrometheusTextSink(prometheus_path)])
+    instrumentation.count("subprocess_failures.ffmpeg-decode", 2)
+    instrumentation.add_span("model.wav2vec", 1.5)
+    instrumentation.add_span("model.wav2vec", 0.5)
+
+    report = instrumentation.flush()
+    instrumentation.flush()
+
+    with open(json_path) as json_file:
+        reports = [json.loads(line) for line in json_file]
+    assert len(reports) == 2
+    assert reports[0]["counters"] == report["counters"]
+
+    with open(prometheus_path) as prometheus_file:
+        lines = prometheus_file.read().splitlines()
+    assert "# TYPE crypto_sentiment_subprocess_failures_ffmpeg_decode_total counter" in lines
+    assert "crypto_sentiment_subprocess_failures_ffmpeg_decode_total 2.0" in lines
+    assert 'crypto_sentiment_span_count_total{span="model.wav2vec"} 2.0' in lines
+    assert 'crypto_sentiment_span_seconds_total{span="model.wav2vec"} 2.0' in lines
+    assert "# TYPE crypto_sentiment_span_max_seconds gauge" in lines
+    assert 'crypto_sentiment_span_max_seconds{span="model.wav2vec"} 1.5' in lines
+    # Every sample belongs to the metric of the TYPE line before it.
+    metric = None
+    for line in lines:
+        if line.startswith("# TYPE "):
+            metric = line.split()[2]
+        else:
+            assert line.split("{")[0].split(" ")[0] == metric
+    assert not (tmp_path / "metrics.prom.tmp").exists()
+
+
+def test_format_report():
+    instrumentation = Instrumentation.Instrumentation()
+    instrumentation.add_span("fast", 0.1)
+    instrumentation.add_span("slow", 3.0)
+    instrumentation.count("clips", 7)
+
+    lines = Instrumentation.format_report(instrumentation.get_report()).splitlines()
+
+    assert lines[1].startswith("slow") and lines[2].startswith("fast")
+    assert lines[4].split() == ["clips", "7"]
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("transformers")
+
+import torch
+import Benchmark
+from CryptoSentimentAnalysis import SentimentAnalysisPipeline
+
+
+@pytest.fixture(scope="module")
+def pipeline(tmp_path_factory):
+    processor, model = Benchmark.make_tiny_wav2vec(str(tmp_path_factory.mktemp("models")))
+    return SentimentAnalysisPipeline(wav2vec_model=model, wav2vec_processor=processor, wav2vec_version="test",
+                                     audio_feature_backend="native")
+
+
+@pytest.fixture(scope="module")
+def audio():
+    audio, _ = Benchmark.synthesize_speech(75, np.random.default_rng(0))
+    return audio
+
+
+def split(audio, block_samples):
+    return [audio[i:i + block_samples] for i in range(0, len(audio), block_samples)]
+
+
+def test_transcribe_long_form_does_not_depend_on_blocks(pipeline, audio):
+    words = pipeline.transcribe_long_form(split(audio, 16000 * 30))
+
+    assert len(words) > 0
+    assert pipeline.transcribe_long_form(split(audio, 12345)) == words
+    assert all(start < end for _, start, end in words)
+    assert all(words[i][2] <= words[i + 1][1] for i in range(len(words) - 1))
+    assert words[-1][2] <= len(audio) / 16000
+
+
+def test_transcribe_long_form_short_audio_matches_transcribe_words(pipeline, audio):
+    short_audio = audio[:16000 * 10]
+
+    long_form_words = pipeline.transcribe_long_form([short_audio])
+    words = pipeline.transcribe_words([short_audio])[0]
+
+    # transcribe_words measures the frame length on the padded input, so the timestamps differ slightly.
+    assert [word for word, _, _ in long_form_words] == [word for word, _, _ in words]
+    np.testing.assert_allclose([times for _, *times in long_form_words], [times for _, *times in words], atol=0.05)
+
+
+def test_transcribe_long_form_skips_special_tokens(pipeline, audio, monkeypatch):
+    vocabulary_size = len(Benchmark.CTC_VOCABULARY)
+
+    def backend(input_values, attention_mask=None):
+        # Every token in turn, four frames each.
+        frames = input_values.shape[1] // 320
+        token_ids = (torch.arange(frames) // 4) % vocabulary_size
+        return torch.nn.functional.one_hot(token_ids, vocabulary_size).float().unsqueeze(0).repeat(
+            input_values.shape[0], 1, 1)
+
+    monkeypatch.setattr(pipeline, "wav2vec_backend", backend)
+    words = pipeline.transcribe_long_form(split(audio, 16000 * 30))
+
+    assert len(words) > 0
+    for word, _, _ in words:
+        for special_token in ["<pad>", "<s>", "</s>", "<unk>", "|"]:
+            assert special_token not in word
+
+
+def test_longform_clip_extraction(pipeline, audio, monkeypatch):
+    monkeypatch.setattr(pipeline, "decode_episode_audio", lambda row: audio)
+    row = pd.Series({"Date": 20210101, "Author": "Channel", "Title": "Episode", "Views": "1000"})
+
+    df = pipeline.get_episode_clips_df_segmented(row, "longform")
+
+    assert len(df) > 0
+    assert (df["Start"] < df["End"]).all()
+    assert df["Text"].str.len().gt(0).all()
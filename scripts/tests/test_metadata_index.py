@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+import soundfile as sf
+import MetadataIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = MetadataIndex.MetadataIndex(str(tmp_path / "index.sqlite"))
+    yield index
+    index.close()
+
+
+@pytest.mark.parametrize("file_name, parsed", [
+    ("Channel-sep-20210101-sep-Episode-sep-1000.wav", ("Channel", 20210101, "Episode", "1000")),
+    ("Channel-sep-20210101-sep-BTC-sep-ETH-sep-1000.wav", ("Channel", 20210101, "BTC-sep-ETH", "1000")),
+    ("folder/Channel-sep-20210101-sep-Ep. 3-sep-NA.en.vtt", ("Channel", 20210101, "Ep. 3", "NA.en")),
+    ("Channel-sep-20210101-sep-1000.wav", None),
+    ("Channel-sep-January-sep-Episode-sep-1000.wav", None),
+])
+def test_parse_file_name(file_name, parsed):
+    assert MetadataIndex.parse_file_name(file_name) == parsed
+
+
+def test_query_episodes_by_date(index, tmp_path):
+    audio_folder = tmp_path / "audio"
+    audio_folder.mkdir()
+    for date, title in [(20210105, "A"), (20210101, "B-sep-C"), (20210210, "D")]:
+        sf.write(str(audio_folder / ("Channel-sep-%d-sep-%s-sep-10.wav" % (date, title))), np.zeros(8000), 16000)
+    (audio_folder / "notes.txt").write_text("not an episode")
+    (audio_folder / "unknown.wav").write_bytes(b"")
+
+    assert index.add_folder(str(audio_folder)) == 3
+    assert index.add_folder(str(audio_folder)) == 0
+
+    df = index.query_episodes()
+    assert df["Date"].tolist() == [20210101, 20210105, 20210210]
+    assert df["Title"].tolist() == ["B-sep-C", "A", "D"]
+    assert df["Episode_File_Name"].tolist()[0] == "Channel-sep-20210101-sep-B-sep-C-sep-10.wav"
+    assert df["Duration"].tolist() == [0.5, 0.5, 0.5]
+
+    assert index.query_episodes("20210101", "20210105")["Title"].tolist() == ["B-sep-C", "A"]
+    assert index.query_episodes(start_date=20210102)["Title"].tolist() == ["A", "D"]
+    assert index.query_episodes(end_date=20210104)["Title"].tolist() == ["B-sep-C"]
+    assert len(index.query_episodes(20210301)) == 0
+
+
+def test_clips_are_replaced_and_ordered_by_start(index):
+    index.add_clips("episode", [("0001", 15.0, 30.0, "clips/0001.wav"), ("0000", 0.0, 15.0, None)])
+    index.add_clips("episode", [("0001", 15.0, 29.0, "clips/0001.wav")])
+
+    df = index.query_clips("episode")
+
+    assert df["Clip_Id"].tolist() == ["0000", "0001"]
+    assert df["End"].tolist() == [15, 29]
+    assert df["File_Path"].isna().tolist() == [True, False]
+    assert len(index.query_clips("other episode")) == 0
@@ -0,0 +1,53 @@
+import os
+import joblib
+import numpy as np
+import pytest
+
+pytest.importorskip("transformers")
+
+import Benchmark
+import ModelRegistry
+
+
+@pytest.fixture(autouse=True)
+def clear_registry():
+    ModelRegistry.clear()
+    yield
+    ModelRegistry.clear()
+
+
+def test_pickle_is_loaded_once_and_reloaded_after_a_change(tmp_path):
+    path = str(tmp_path / "model.pkl")
+    joblib.dump({"weights": np.arange(10.0)}, path)
+
+    model = ModelRegistry.load_pickle(path)
+    assert isinstance(model["weights"], np.memmap)
+    assert ModelRegistry.load_pickle(path) is model
+    assert ModelRegistry.load_pickle(os.path.join(str(tmp_path), ".", "model.pkl")) is model
+
+    joblib.dump({"weights": np.zeros(3)}, path)
+    modified_time = os.path.getmtime(path) + 10
+    os.utime(path, (modified_time, modified_time))
+
+    reloaded = ModelRegistry.load_pickle(path)
+    assert reloaded is not model
+    np.testing.assert_array_equal(reloaded["weights"], np.zeros(3))
+    assert ModelRegistry.load_pickle(path) is reloaded
+
+
+def test_wav2vec_model_and_backend_are_shared(tmp_path):
+    folder = str(tmp_path / "wav2vec")
+    processor, model = Benchmark.make_tiny_wav2vec(folder)
+    processor.save_pretrained(folder)
+    model.save_pretrained(folder)
+
+    loaded_processor, loaded_model = ModelRegistry.load_wav2vec(folder)
+    assert not loaded_model.training
+    assert ModelRegistry.load_wav2vec(folder, offline=True)[1] is loaded_model
+
+    backend = ModelRegistry.load_wav2vec_backend(loaded_model)
+    assert ModelRegistry.load_wav2vec_backend(loaded_model) is backend
+    assert ModelRegistry.load_wav2vec_backend(loaded_model, "quantized") is not backend
+
+    ModelRegistry.clear()
+    assert ModelRegistry.load_wav2vec(folder)[1] is not loaded_model
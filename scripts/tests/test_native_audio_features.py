@@ -0,0 +1,113 @@
+import os
+import shutil
+import numpy as np
+import pytest
+import soundfile as sf
+import NativeAudioFeatures
+
+SAMPLING_RATE = 16000
+
+
+def make_voice(periods, amplitudes, sampling_rate=SAMPLING_RATE):
+    """Glottal pulses at the given periods (in seconds) through a damped resonance at 700 Hz."""
+
+    pulse_positions = np.round(np.cumsum(np.concatenate([[0.05], periods])) * sampling_rate).astype(int)
+    source = np.zeros(pulse_positions[-1] + int(0.05 * sampling_rate))
+    source[pulse_positions] = np.append(amplitudes, amplitudes[-1])
+
+    t = np.arange(int(0.01 * sampling_rate)) / sampling_rate
+    resonance = np.exp(-300 * t) * np.sin(2 * np.pi * 700 * t)
+    audio = np.convolve(source, resonance)[:len(source)]
+    audio += np.random.default_rng(0).normal(0, 1e-4, len(audio))
+
+    return (0.5 * audio / np.abs(audio).max()).astype(np.float32)
+
+
+def get_features(audio):
+    features = NativeAudioFeatures.get_audio_features_batch([audio])[0]
+    return dict(zip(NativeAudioFeatures.AUDIO_FEATURE_NAMES, features))
+
+
+def test_jitter_and_shimmer_of_pulses():
+    # Periods alternate between 78 and 82 samples and amplitudes between 0.9 and 1.1.
+    pulses = np.cumsum(np.tile([78.0, 82.0], 50))
+    audio = np.zeros(int(pulses[-1]) + 100)
+    audio[np.round(pulses).astype(int)] = np.tile([0.9, 1.1], 50)
+
+    jitter, shimmer = NativeAudioFeatures.get_jitter_and_shimmer(audio, pulses, SAMPLING_RATE)
+
+    assert jitter == pytest.approx(0.05, rel=1e-3)
+    assert shimmer == pytest.approx(0.2, rel=0.1)
+
+
+def test_jitter_and_shimmer_skip_irregular_periods():
+    pulses = np.array([0, 80, 160, 800, 880, 960], dtype=np.float64)
+
+    jitter, _ = NativeAudioFeatures.get_jitter_and_shimmer(np.ones(1000), pulses, SAMPLING_RATE)
+
+    # The 40 ms gap is longer than the longest period, the other periods are equal.
+    assert jitter == 0
+    assert np.isnan(NativeAudioFeatures.get_jitter_and_shimmer(np.ones(1000), pulses[:2], SAMPLING_RATE)[0])
+
+
+def test_pitch_of_steady_voice():
+    # 100 samples per period, the pulses are not shifted by rounding.
+    features = get_features(make_voice(np.full(300, 1 / 160), np.ones(300)))
+
+    assert features["Pitch_Median"] == pytest.approx(160, rel=0.01)
+    assert features["Pitch_05_Quantile"] == pytest.approx(160, rel=0.01)
+    assert features["Pitch_95_Quantile"] == pytest.approx(160, rel=0.01)
+    assert features["Jitter"] < 0.005
+    assert features["Shimmer"] < 0.02
+
+
+def test_jitter_and_shimmer_of_voice():
+    # Praat's local jitter and shimmer of independent normal perturbations are about 1.13 times their deviation.
+    rng = np.random.default_rng(1)
+    periods = 1 / 120 * (1 + 0.02 * rng.standard_normal(400))
+    amplitudes = 1 + 0.1 * rng.standard_normal(400)
+
+    features = get_features(make_voice(periods, amplitudes))
+
+    assert features["Pitch_Median"] == pytest.approx(120, rel=0.02)
+    assert features["Jitter"] == pytest.approx(1.13 * 0.02, rel=0.2)
+    assert features["Shimmer"] == pytest.approx(1.13 * 0.1, rel=0.2)
+
+
+def test_silence_is_unvoiced():
+    audio = np.random.default_rng(0).normal(0, 1e-4, SAMPLING_RATE).astype(np.float32)
+
+    features = get_features(audio)
+
+    assert np.isnan(features["Pitch_Median"])
+    assert np.isnan(features["Jitter"])
+
+
+@pytest.mark.skipif(shutil.which("praat") is None, reason="Praat is not installed")
+def test_praat_parity(tmp_path):
+    rng = np.random.default_rng(2)
+    audio_files = []
+    for i in range(4):
+        periods = 1 / rng.uniform(90, 250) * (1 + 0.01 * rng.standard_normal(500))
+        audio_file = str(tmp_path / ("%d.wav" % i))
+        sf.write(audio_file, make_voice(periods, 1 + 0.08 * rng.standard_normal(500)), SAMPLING_RATE)
+        audio_files.append(audio_file)
+
+    praat_script = os.path.join(os.path.dirname(os.path.dirname(__file__)), "praat", "GetAudioFeatures.praat")
+    df_comparison = NativeAudioFeatures.check_praat_parity(audio_files, shutil.which("praat"), praat_script)
+
+    assert df_comparison["Within_Tolerance"].all()
+
+
+def test_praat_parity_fails_on_divergence(monkeypatch):
+    monkeypatch.setattr(NativeAudioFeatures.AudioFeatureExtraction, "get_audio_features",
+                        lambda audio_file, praat_path, praat_script: ["150"] * 8 + ["0.5", "0.1", "20"])
+    monkeypatch.setattr(NativeAudioFeatures.sf, "read", lambda audio_file, dtype: (
+        make_voice(np.full(300, 1 / 150), np.ones(300)), SAMPLING_RATE))
+
+    df_comparison = NativeAudioFeatures.compare_with_praat(["a.wav"])
+    assert not df_comparison.set_index("Feature").loc["Jitter", "Within_Tolerance"]
+    assert df_comparison.set_index("Feature").loc["Pitch_Median", "Within_Tolerance"]
+
+    with pytest.raises(ValueError, match="Jitter"):
+        NativeAudioFeatures.check_praat_parity(["a.wav"])
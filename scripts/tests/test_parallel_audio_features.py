@@ -0,0 +1,59 @@
+import threading
+import time
+import numpy as np
+import pandas as pd
+import pytest
+
+
+class FakePraat:
+    """Replaces SentimentAnalysisPipeline.get_audio_features_for_clip, counting the Praat processes running at once."""
+
+    def __init__(self, feature_count):
+        self.feature_count = feature_count
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def __call__(self, row, timeout=None):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            time.sleep(0.02)
+            if row["Clip_Id"] == "0002":
+                raise TimeoutError("Praat timed out")
+            return ["--undefined--"] + [str(float(row["Clip_Id"]))] * (self.feature_count - 1)
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+def make_clips_df(count):
+    return pd.DataFrame({"Clip_Id": ["%04d" % i for i in range(count)], "Title": "Episode",
+                         "Coin": ["ETH" if i == 5 else "BTC" for i in range(count)]}, index=range(10, 10 + count))
+
+
+def test_praat_pool_is_bounded_and_isolates_failures(make_pipeline, monkeypatch):
+    pipeline = make_pipeline(audio_feature_backend="praat", audio_feature_workers=3)
+    praat = FakePraat(len(pipeline.AUDIO_FEATURE_COLUMNS))
+    monkeypatch.setattr(pipeline, "get_audio_features_for_clip", praat)
+
+    df_audio_features = pipeline.get_audio_features_df_parallel(make_clips_df(12), coins=["BTC"])
+
+    assert 1 < praat.max_running <= 3
+    assert df_audio_features.index.tolist() == list(range(10, 22))
+    assert df_audio_features.columns.tolist() == pipeline.AUDIO_FEATURE_COLUMNS
+    assert df_audio_features.iloc[:, 0].isna().all()
+    expected = [np.nan if i in [2, 5] else float(i) for i in range(12)]
+    np.testing.assert_array_equal(df_audio_features.iloc[:, 1], expected)
+    assert pipeline.instrumentation.get_report()["counters"]["subprocess_failures.praat"] == 1
+
+
+def test_praat_pool_size_can_be_overridden(make_pipeline, monkeypatch):
+    pipeline = make_pipeline(audio_feature_backend="praat", audio_feature_workers=3)
+    praat = FakePraat(len(pipeline.AUDIO_FEATURE_COLUMNS))
+    monkeypatch.setattr(pipeline, "get_audio_features_for_clip", praat)
+
+    pipeline.get_audio_features_df_parallel(make_clips_df(4), coins=["BTC"], max_workers=1)
+
+    assert praat.max_running == 1
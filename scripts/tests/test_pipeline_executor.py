@@ -0,0 +1,99 @@
+import itertools
+import threading
+import time
+from PipelineExecutor import PipelineExecutor, Stage
+
+
+def test_single_worker_stages_keep_the_order():
+    executor = PipelineExecutor([Stage("add", lambda x: x + 1), Stage("double", lambda x: x * 2),
+                                 Stage("format", str)])
+
+    assert list(executor.run(range(20))) == [str((x + 1) * 2) for x in range(20)]
+
+
+def test_parallel_workers_process_every_item_once():
+    running = []
+    lock = threading.Lock()
+
+    def slow_square(x):
+        with lock:
+            running.append(threading.current_thread().name)
+        time.sleep(0.01)
+        return x * x
+
+    executor = PipelineExecutor([Stage("square", slow_square, workers=4), Stage("identity", lambda x: x, workers=2)])
+
+    assert sorted(executor.run(range(40))) == [x * x for x in range(40)]
+    assert len(set(running)) > 1
+
+
+def test_failing_item_is_dropped_and_reported():
+    errors = []
+
+    def invert(x):
+        return 1 / x
+
+    executor = PipelineExecutor([Stage("invert", invert, workers=2), Stage("odd", lambda x: x if x < 1 else None)],
+                                on_error=lambda stage, item, e: errors.append((stage, item, type(e))))
+
+    assert sorted(executor.run([0, 1, 2, 4])) == [0.25, 0.5]
+    assert errors == [("invert", 0, ZeroDivisionError)]
+
+
+def test_failing_input_is_reported():
+    errors = []
+
+    def items():
+        yield 1
+        yield 2
+        raise OSError("listing failed")
+
+    executor = PipelineExecutor([Stage("identity", lambda x: x)],
+                                on_error=lambda stage, item, e: errors.append((stage, item, type(e))))
+
+    assert list(executor.run(items())) == [1, 2]
+    assert errors == [("input", None, OSError)]
+
+
+def test_full_queues_stop_reading_the_input():
+    consumed = []
+    release = threading.Event()
+
+    def items():
+        for x in range(100):
+            consumed.append(x)
+            yield x
+
+    def blocked(x):
+        release.wait()
+        return x
+
+    executor = PipelineExecutor([Stage("fast", lambda x: x, queue_size=2), Stage("blocked", blocked, queue_size=2)])
+    outputs = executor.run(items())
+    results = []
+    consumer = threading.Thread(target=lambda: results.extend(outputs))
+    consumer.start()
+
+    time.sleep(0.3)
+    # One item in the blocked stage, two waiting for it, one in the fast stage, two waiting for it and one being fed.
+    assert len(consumed) <= 7
+    release.set()
+    consumer.join(10)
+
+    assert results == list(range(100))
+
+
+def test_stopping_early_ends_all_threads():
+    def slow(x):
+        time.sleep(0.01)
+        return x
+
+    threads_before = threading.active_count()
+    executor = PipelineExecutor([Stage("identity", lambda x: x, workers=3), Stage("slow", slow)])
+
+    # The input never ends.
+    outputs = executor.run(itertools.count())
+    assert len({next(outputs), next(outputs)}) == 2
+    outputs.close()
+
+    assert threading.active_count() == threads_before
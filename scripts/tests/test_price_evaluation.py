@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+import pytest
+import PriceEvaluation
+
+
+def make_sentiments(rows):
+    return pd.DataFrame(rows, columns=["Date", "Coin", "Sentiment"])
+
+
+def make_prices(dates, closes):
+    df = pd.DataFrame({("BTC", "Close"): closes}, index=pd.DatetimeIndex(pd.to_datetime(dates), name="Date"))
+    df.columns.names = ["Coin", "Field"]
+    return df
+
+
+def test_align_sentiments_to_next_price_date():
+    price_dates = pd.to_datetime(["2021-01-03", "2021-01-10", "2021-01-17"])
+    df_sentiments = make_sentiments([[20210101, "BTC", "bullish"],
+                                     [20210103, "BTC", "bullish"],  # on a price date
+                                     [20210104, "ETH", "bearish"],
+                                     [20210109, "BTC", "bearish"],
+                                     [20210110, "BTC", "neutral"],
+                                     [20210111, "BTC", "unknown"],  # not a sentiment label
+                                     [20210111, "DOGE", "bullish"],  # not evaluated
+                                     [20210120, "BTC", "bullish"]])  # after the last price
+
+    scores, counts = PriceEvaluation.align_sentiments_to_prices(df_sentiments, price_dates, ["BTC", "ETH"])
+
+    np.testing.assert_array_equal(scores, [[2, 0], [-1, -1], [0, 0]])
+    np.testing.assert_array_equal(counts, [[2, 0], [2, 1], [0, 0]])
+
+
+def test_align_unsorted_sentiments():
+    price_dates = pd.to_datetime(["2021-01-01", "2021-01-02"])
+    df_sentiments = make_sentiments([[20210102, "BTC", "bearish"], [20210101, "BTC", "bullish"]])
+
+    scores, counts = PriceEvaluation.align_sentiments_to_prices(df_sentiments, price_dates, ["BTC"])
+
+    np.testing.assert_array_equal(scores, [[1], [-1]])
+    np.testing.assert_array_equal(counts, [[1], [1]])
+
+
+def test_rolling_sentiment_indices():
+    scores = np.array([[2.0], [0.0], [-1.0]])
+    counts = np.array([[2.0], [0.0], [1.0]])
+
+    indices = PriceEvaluation.get_rolling_sentiment_indices(scores, counts, [1, 2])
+
+    np.testing.assert_array_equal(indices[0, :, 0], [1, np.nan, -1])
+    np.testing.assert_array_equal(indices[1, :, 0], [1, 1, -1])
+
+
+def test_forward_returns_and_shift():
+    prices = np.array([[1.0], [2.0], [4.0]])
+
+    returns = PriceEvaluation.get_forward_returns(prices, [1, 2, 3])
+
+    np.testing.assert_allclose(returns[0, :, 0], [np.log(2), np.log(2), np.nan])
+    np.testing.assert_allclose(returns[1, :, 0], [np.log(4), np.nan, np.nan])
+    assert np.isnan(returns[2]).all()
+    np.testing.assert_array_equal(PriceEvaluation.shift_forward(returns, 1)[0, :, 0], [np.log(2), np.nan, np.nan])
+
+
+def test_evaluate_finds_predictive_sentiment():
+    dates = pd.date_range("2021-01-01", periods=40)
+    rng = np.random.default_rng(0)
+    # Bullish days are followed by rising prices.
+    bullish = rng.random(len(dates)) < 0.5
+    closes = 100 * np.exp(np.cumsum(np.concatenate([[0], np.where(bullish[:-1], 0.01, -0.01)])))
+    df_sentiments = make_sentiments([[int(date.strftime("%Y%m%d")), "BTC", "bullish" if up else "bearish"]
+                                     for date, up in zip(dates, bullish)])
+
+    df_evaluation = PriceEvaluation.evaluate(df_sentiments, make_prices(dates, closes), windows=[1], lags=[0, 1],
+                                             horizons=[1])
+
+    assert df_evaluation[["Coin", "Window", "Lag", "Horizon"]].values.tolist() == [["BTC", 1, 0, 1], ["BTC", 1, 1, 1]]
+    no_lag = df_evaluation.iloc[0]
+    assert no_lag["Correlation"] == pytest.approx(1)
+    assert no_lag["Hit_Rate"] == 1
+    assert no_lag["Observations"] == len(dates) - 1
+    assert df_evaluation.iloc[1]["Observations"] == len(dates) - 2
+
+
+def test_load_prices_prefers_newer_downloads(tmp_path):
+    (tmp_path / "btc").mkdir()
+    (tmp_path / "btc" / "btc_daily_ytd_2021-07-03.csv").write_text(
+        "Date,Open,High,Low,Close,Volume\n2021-07-02,1,1,1,10,5\n2021-07-03,1,1,1,11,5\n")
+    (tmp_path / "btc" / "btc_daily_ytd_2021-07-04.csv").write_text(
+        "Date,Open,High,Low,Close,Volume\n2021-07-03,1,1,1,12,5\n2021-07-04,1,1,1,13,5\n")
+    (tmp_path / "all_coins_daily_ytd_2021-07-04.csv").write_text(
+        ",ETH-USD,ETH-USD,ETH-USD,ETH-USD,ETH-USD\n,Open,High,Low,Close,Volume\nDate,,,,,\n"
+        "2021-07-04,2,2,2,20,7\n")
+    (tmp_path / "btc" / "btc_weekly_ytd_2021-07-04.csv").write_text(
+        "Date,Open,High,Low,Close,Volume\n2021-07-04,1,1,1,99,5\n")
+
+    prices = PriceEvaluation.load_prices(str(tmp_path))
+
+    assert prices.index.tolist() == list(pd.to_datetime(["2021-07-02", "2021-07-03", "2021-07-04"]))
+    assert prices[("BTC", "Close")].tolist() == [10, 12, 13]
+    assert prices[("ETH", "Close")].iloc[-1] == 20
+    assert np.isnan(prices[("ETH", "Close")].iloc[0])
+
+
+def test_load_prices_without_files(tmp_path):
+    prices = PriceEvaluation.load_prices(str(tmp_path))
+
+    assert len(prices) == 0
+    assert prices.columns.names == ["Coin", "Field"]
+
+
+def test_load_weekly_prices_keeps_complete_monday_bars(tmp_path):
+    # Monday bars with the incomplete week of the download day.
+    (tmp_path / "btc_weekly_2y_2021-07-04.csv").write_text(
+        "Date,Open,High,Low,Close,Volume\n2021-06-21,1,1,1,10,5\n2021-06-28,1,1,1,11,5\n2021-07-04,1,1,1,12,5\n")
+    # The ytd download starts on Friday, January 1st, so its bars start on Fridays.
+    (tmp_path / "eth_weekly_ytd_2021-07-03.csv").write_text(
+        "Date,Open,High,Low,Close,Volume\n2021-06-25,1,1,1,20,5\n2021-07-02,1,1,1,21,5\n2021-07-03,1,1,1,22,5\n")
+    (tmp_path / "eth_weekly_2y_2021-07-05.csv").write_text(
+        "Date,Open,High,Low,Close,Volume\n2021-06-21,1,1,1,30,5\n2021-06-28,1,1,1,31,5\n2021-07-05,1,1,1,32,5\n")
+
+    prices = PriceEvaluation.load_prices(str(tmp_path), "weekly")
+
+    assert prices.index.tolist() == list(pd.to_datetime(["2021-06-21", "2021-06-28"]))
+    np.testing.assert_array_equal(prices[("BTC", "Close")], [10, np.nan])
+    np.testing.assert_array_equal(prices[("ETH", "Close")], [30, 31])
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+import PriceStore
+
+
+def make_bars(dates, closes):
+    return pd.DataFrame({"Open": closes, "High": closes, "Low": closes, "Close": closes, "Volume": 1.0},
+                        index=pd.to_datetime(dates))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PriceStore.PriceStore(str(tmp_path / "store"))
+
+
+def test_append_and_read(store):
+    assert store.append("btc", "daily", make_bars(["2021-01-02", "2021-01-01", "2021-01-03"], [2.0, 1.0, 3.0])) == 3
+
+    df = store.read("BTC", "daily")
+    assert df.index.tolist() == list(pd.to_datetime(["2021-01-01", "2021-01-02", "2021-01-03"]))
+    assert df["Close"].tolist() == [1, 2, 3]
+    assert df.index.name == "Date"
+
+    assert store.read("BTC", "daily", "2021-01-02", "2021-01-02")["Close"].tolist() == [2]
+    assert store.read("BTC", "daily", start_date="2021-01-02")["Close"].tolist() == [2, 3]
+    assert len(store.read("BTC", "daily", "2021-02-01")) == 0
+    assert len(store.read("ETH", "daily")) == 0
+
+
+def test_append_replaces_last_bar_and_ignores_older_bars(store):
+    store.append("BTC", "daily", make_bars(["2021-01-01", "2021-01-02"], [1.0, 2.0]))
+
+    appended = store.append("BTC", "daily", make_bars(["2021-01-01", "2021-01-02", "2021-01-03"], [9.0, 2.5, 3.0]))
+
+    assert appended == 1
+    assert store.read("BTC", "daily")["Close"].tolist() == [1, 2.5, 3]
+
+
+def test_load_prices_joins_coins_on_dates(store):
+    store.append("BTC", "daily", make_bars(["2021-01-01", "2021-01-02"], [1.0, 2.0]))
+    store.append("ETH", "daily", make_bars(["2021-01-02", "2021-01-03"], [20.0, 30.0]))
+    store.append("BTC", "weekly", make_bars(["2021-01-03"], [5.0]))
+
+    prices = store.load_prices()
+
+    assert store.get_coins("daily") == ["BTC", "ETH"]
+    assert prices.columns.names == ["Coin", "Field"]
+    assert prices.index.tolist() == list(pd.to_datetime(["2021-01-01", "2021-01-02", "2021-01-03"]))
+    np.testing.assert_array_equal(prices[("BTC", "Close")], [1, 2, np.nan])
+    np.testing.assert_array_equal(prices[("ETH", "Close")], [np.nan, 20, 30])
+    assert len(store.load_prices(coins=[])) == 0
+
+
+def test_import_csv_folder(store, tmp_path):
+    prices_folder = tmp_path / "coin-prices"
+    prices_folder.mkdir()
+    (prices_folder / "btc_daily_ytd_2021-07-03.csv").write_text(
+        "Date,Open,High,Low,Close,Volume\n2021-07-02,1,1,1,10,5\n2021-07-03,1,1,1,11,5\n")
+    (prices_folder / "btc_daily_ytd_2021-07-04.csv").write_text(
+        "Date,Open,High,Low,Close,Volume\n2021-07-03,1,1,1,12,5\n2021-07-04,1,1,1,13,5\n")
+
+    assert store.import_csv_folder(str(prices_folder)) == {"BTC": 3}
+    assert store.read("BTC", "daily")["Close"].tolist() == [10, 12, 13]
+    # Importing again changes nothing.
+    assert store.import_csv_folder(str(prices_folder)) == {"BTC": 0}
+    assert store.read("BTC", "daily")["Close"].tolist() == [10, 12, 13]
+
+
+def test_weekly_bars_have_one_anchor(store, tmp_path):
+    # Friday bars are not aligned to the Monday weeks.
+    assert store.append("BTC", "weekly", make_bars(["2021-06-21", "2021-06-25", "2021-06-28"], [1.0, 2.0, 3.0])) == 2
+    assert store.read("BTC", "weekly").index.dayofweek.tolist() == [0, 0]
+
+    prices_folder = tmp_path / "coin-prices"
+    prices_folder.mkdir()
+    (prices_folder / "eth_weekly_ytd_2021-07-03.csv").write_text(
+        "Date,Open,High,Low,Close,Volume\n2021-06-25,1,1,1,20,5\n2021-07-02,1,1,1,21,5\n")
+    (prices_folder / "eth_weekly_2y_2021-07-05.csv").write_text(
+        "Date,Open,High,Low,Close,Volume\n2021-06-21,1,1,1,30,5\n2021-06-28,1,1,1,31,5\n2021-07-05,1,1,1,32,5\n")
+
+    assert store.import_csv_folder(str(prices_folder), "weekly") == {"ETH": 2}
+    assert store.read("ETH", "weekly")["Close"].tolist() == [30, 31]
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+import Segmentation
+
+
+def collect_kept(windows):
+    return np.concatenate([window[keep_start:keep_end] for _, window, keep_start, keep_end in windows])
+
+
+@pytest.mark.parametrize("block_samples", [7, 100, 1000, 5000])
+def test_iter_windows_keeps_every_sample_once(block_samples):
+    audio = np.arange(2345, dtype=np.float32)
+    blocks = (audio[i:i + block_samples] for i in range(0, len(audio), block_samples))
+
+    windows = list(Segmentation.iter_windows(blocks, 400, 50))
+
+    np.testing.assert_array_equal(collect_kept(windows), audio)
+    for start, window, _, _ in windows:
+        np.testing.assert_array_equal(window, audio[start:start + len(window)])
+        assert len(window) <= 400
+
+
+def test_iter_windows_overlap():
+    windows = list(Segmentation.iter_windows([np.zeros(1000, dtype=np.float32)], 400, 50))
+
+    assert [start for start, _, _, _ in windows] == [0, 300, 600]
+    assert [(keep_start, keep_end) for _, _, keep_start, keep_end in windows] == [(0, 350), (50, 350), (50, 400)]
+
+
+def test_iter_windows_short_audio():
+    windows = list(Segmentation.iter_windows([np.ones(10, dtype=np.float32)], 400, 50))
+
+    assert len(windows) == 1
+    assert windows[0][2:] == (0, 10)
+
+
+def test_iter_windows_rejects_large_stride():
+    with pytest.raises(ValueError):
+        list(Segmentation.iter_windows([np.zeros(10, dtype=np.float32)], 100, 50))
+
+
+def test_get_word_timestamps():
+    id_to_token = {0: "<pad>", 1: "<s>", 2: "|", 3: "a", 4: "b"}
+    # "ab|ba" with blanks, repeats and a special token inside the second word.
+    predicted_ids = [3, 3, 0, 4, 2, 2, 4, 1, 0, 3, 0]
+
+    words = Segmentation.get_word_timestamps(predicted_ids, id_to_token, 0, "|", 0.02, skip_token_ids={1})
+
+    assert [word for word, _, _ in words] == ["ab", "ba"]
+    assert words[0][1:] == pytest.approx((0.0, 0.08))
+    assert words[1][1:] == pytest.approx((0.12, 0.2))
+
+
+def test_get_word_timestamps_keeps_unskipped_tokens():
+    id_to_token = {0: "<pad>", 1: "<s>", 2: "|", 3: "a"}
+
+    words = Segmentation.get_word_timestamps([1, 3, 2], id_to_token, 0)
+
+    assert [word for word, _, _ in words] == ["<s>a"]
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+from SentimentAggregation import SentimentAggregator
+
+
+def make_clips(rows):
+    return pd.DataFrame(rows, columns=["Date", "Coin", "Sentiment", "Views", "Start", "End"])
+
+
+EPISODE_A = make_clips([[20210104, "BTC", "bullish", "100", 0, 15],
+                        [20210104, "BTC", "bearish", "100", 15, 20],
+                        [20210104, "ETH", "neutral", "100", 20, 35],
+                        [20210104, "BTC", None, "100", 35, 50],  # no sentiment
+                        [20210104, None, "bullish", "100", 50, 65]])  # no coin
+EPISODE_B = make_clips([[20210110, "BTC", "bullish", "300", 0, 15],
+                        [20210111, "BTC", "bearish", "NA", 0, 15]])
+
+
+def test_daily_sums():
+    aggregator = SentimentAggregator()
+    aggregator.add(EPISODE_A, "a")
+    aggregator.add(EPISODE_B, "b")
+
+    df = aggregator.get_df().sort_values(["Date", "Coin"], ignore_index=True)
+
+    assert df[["Date", "Coin"]].values.tolist() == [[20210104, "BTC"], [20210104, "ETH"], [20210110, "BTC"],
+                                                    [20210111, "BTC"]]
+    assert df["Bullish"].tolist() == [1, 0, 1, 0]
+    assert df["Bearish"].tolist() == [1, 0, 0, 1]
+    assert df["Clips"].tolist() == [2, 1, 1, 1]
+    assert df["Score"].tolist() == [0, 0, 1, -1]
+    assert aggregator.get_df(start_date="20210105", end_date=20210110)["Date"].tolist() == [20210110]
+
+
+def test_adding_an_episode_again_replaces_it():
+    aggregator = SentimentAggregator()
+    aggregator.add(EPISODE_A, "a")
+    aggregator.add(EPISODE_B, "b")
+    expected = aggregator.get_df()
+
+    aggregator.add(EPISODE_A, "a")
+    pd.testing.assert_frame_equal(aggregator.get_df(), expected)
+
+    # A rerun with fewer clips removes the buckets the episode no longer contributes to.
+    aggregator.add(EPISODE_A[EPISODE_A["Coin"] == "BTC"], "a")
+    assert aggregator.get_df()[["Date", "Coin"]].values.tolist() == [[20210104, "BTC"], [20210110, "BTC"],
+                                                                     [20210111, "BTC"]]
+
+
+def test_merge_equals_adding_all_episodes(tmp_path):
+    aggregator = SentimentAggregator("views")
+    aggregator.add(EPISODE_A, "a")
+    other = SentimentAggregator("views")
+    other.add(EPISODE_B, "b")
+    everything = SentimentAggregator("views")
+    everything.add(EPISODE_A, "a")
+    everything.add(EPISODE_B, "b")
+
+    aggregator.merge(other)
+
+    pd.testing.assert_frame_equal(aggregator.get_df().sort_values(["Date", "Coin"], ignore_index=True),
+                                  everything.get_df().sort_values(["Date", "Coin"], ignore_index=True))
+    aggregator.save(str(tmp_path / "aggregator.pkl"))
+    loaded = SentimentAggregator.load(str(tmp_path / "aggregator.pkl"))
+    pd.testing.assert_frame_equal(loaded.get_df(), aggregator.get_df())
+    # Merged episodes can be replaced too.
+    loaded.add(EPISODE_B, "b")
+    pd.testing.assert_frame_equal(loaded.get_df(), aggregator.get_df())
+
+
+def test_weekly_buckets_start_on_monday():
+    aggregator = SentimentAggregator("duration")
+    aggregator.add(EPISODE_A, "a")
+    aggregator.add(EPISODE_B, "b")
+
+    df = aggregator.get_df(period="week").sort_values(["Date", "Coin"], ignore_index=True)
+
+    # 2021-01-04 is a Monday, 2021-01-10 the following Sunday and 2021-01-11 the next Monday.
+    assert df[["Date", "Coin"]].values.tolist() == [[20210104, "BTC"], [20210104, "ETH"], [20210111, "BTC"]]
+    assert df["Clips"].tolist() == [3, 1, 1]
+    assert df["Weight"].tolist() == [35, 15, 15]
+    assert df["Score"].tolist() == pytest.approx([(15 - 5 + 15) / 35, 0, -1])
+
+
+def test_views_weight_ignores_missing_views():
+    aggregator = SentimentAggregator("views")
+    aggregator.add(EPISODE_B, "b")
+
+    df = aggregator.get_df(period="week")
+
+    assert df["Weight"].tolist() == [300, 0]
+    assert df["Score"].iloc[0] == 1
+    assert np.isnan(df["Score"].iloc[1])
+
+
+def test_unknown_weight():
+    with pytest.raises(ValueError):
+        SentimentAggregator("likes")
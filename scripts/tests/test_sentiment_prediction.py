@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.sparse
+import NativeAudioFeatures
+from test_native_audio_features import make_voice
+
+
+@pytest.fixture(scope="module")
+def audio_features():
+    """Native audio features of a long voiced clip and of a clip with only three voiced periods."""
+
+    clips = [make_voice(np.full(300, 1 / 150), np.ones(300)), make_voice(np.full(3, 1 / 150), np.ones(3))]
+    return pd.DataFrame(NativeAudioFeatures.get_audio_features_batch(clips),
+                        columns=NativeAudioFeatures.AUDIO_FEATURE_NAMES)
+
+
+def make_clips_df(audio_features):
+    df = pd.DataFrame({"Clip_Id": ["0000", "0001"], "Title": "Episode", "Text": "bitcoin goes up", "Coin": "BTC"})
+    return pd.concat([df, audio_features], axis=1)
+
+
+def test_short_voiced_clip_has_pitch_but_no_shimmer(audio_features):
+    assert np.isfinite(audio_features.loc[1, "Pitch_Median"])
+    assert np.isnan(audio_features.loc[1, "Shimmer"])
+    assert np.isfinite(audio_features.loc[0].to_numpy()).all()
+
+
+def test_clips_missing_an_audio_feature_are_not_predicted(make_pipeline, audio_features):
+    pipeline = make_pipeline()
+    df = make_clips_df(audio_features)
+
+    assert pipeline.has_sentiment_audio_features(df).tolist() == [True, False]
+    assert len(pipeline.predict_sentiments(df)) == 1
+
+    df_sentiments = pipeline.run_episode_stage("sentiments", df, None)
+    assert df_sentiments["Clip_Id"].tolist() == ["0000"]
+    assert df_sentiments["Sentiment"].notna().all()
+
+
+def test_service_skips_clips_missing_an_audio_feature(make_pipeline, audio_features):
+    import SentimentService
+
+    service = SentimentService.SentimentService(make_pipeline())
+    clips = [{"text": "bitcoin goes up", "audio_features": audio_features.loc[i].to_dict()} for i in range(2)]
+
+    results = service.score_clips(clips)
+
+    assert results[0]["sentiment"] is not None
+    assert results[1]["sentiment"] is None
+    assert [result["coin"] for result in results] == ["BTC", "BTC"]
+
+
+def make_random_clips_df(pipeline, count):
+    import Benchmark
+
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({"Text": [" ".join(rng.choice(Benchmark.VOCABULARY, 15)) for _ in range(count)]})
+    audio_features = rng.normal(size=(count, len(pipeline.SENTIMENT_AUDIO_FEATURE_COLUMNS)))
+    return pd.concat([df, pd.DataFrame(audio_features, columns=pipeline.SENTIMENT_AUDIO_FEATURE_COLUMNS)], axis=1)
+
+
+def test_sparse_chunked_prediction_equals_dense_prediction(make_pipeline, monkeypatch):
+    import ModelRegistry
+
+    pipeline = make_pipeline(prediction_chunk_size=4)
+    df = make_random_clips_df(pipeline, 10)
+    vectorizer = ModelRegistry.load_pickle(pipeline.sentiment_vectorizer)
+    model = ModelRegistry.load_pickle(pipeline.sentiment_model)
+    dense_input = np.hstack([vectorizer.transform(df["Text"]).toarray(),
+                             df[pipeline.SENTIMENT_AUDIO_FEATURE_COLUMNS].to_numpy()])
+
+    model_inputs = []
+
+    class RecordingModel:
+        def predict(self, model_input):
+            model_inputs.append(model_input)
+            return model.predict(model_input)
+
+    load_pickle = ModelRegistry.load_pickle
+    monkeypatch.setattr(ModelRegistry, "load_pickle", lambda path: RecordingModel()
+                        if path == pipeline.sentiment_model else load_pickle(path))
+
+    predicted = pipeline.predict_sentiments(df)
+
+    assert [model_input.shape[0] for model_input in model_inputs] == [4, 4, 2]
+    assert all(scipy.sparse.issparse(model_input) for model_input in model_inputs)
+    np.testing.assert_array_equal(predicted, model.predict(dense_input))
+    np.testing.assert_allclose(np.vstack([model_input.toarray() for model_input in model_inputs]), dense_input)
@@ -0,0 +1,75 @@
+import threading
+import time
+import pytest
+
+pytest.importorskip("transformers")
+
+import SentimentService
+
+
+class RecordingBatches:
+    """process_batch function recording the batches and failing for negative items."""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        if any(item < 0 for item in items):
+            raise ValueError("negative item")
+        return [item * 2 for item in items]
+
+
+def test_flushes_full_batches():
+    process_batch = RecordingBatches()
+    batcher = SentimentService.MicroBatcher(process_batch, max_batch_size=3, max_latency=10)
+
+    started = time.monotonic()
+    futures = [batcher.submit(i) for i in range(6)]
+
+    assert [future.result(timeout=5) for future in futures] == [0, 2, 4, 6, 8, 10]
+    assert process_batch.batches == [[0, 1, 2], [3, 4, 5]]
+    assert time.monotonic() - started < 5
+
+
+def test_flushes_partial_batch_after_max_latency():
+    process_batch = RecordingBatches()
+    batcher = SentimentService.MicroBatcher(process_batch, max_batch_size=10, max_latency=0.2)
+
+    started = time.monotonic()
+    futures = [batcher.submit(i) for i in range(2)]
+
+    assert [future.result(timeout=5) for future in futures] == [0, 2]
+    assert time.monotonic() - started >= 0.2
+    assert process_batch.batches == [[0, 1]]
+
+
+def test_failing_item_only_fails_its_own_future():
+    process_batch = RecordingBatches()
+    batcher = SentimentService.MicroBatcher(process_batch, max_batch_size=3, max_latency=10)
+
+    futures = [batcher.submit(item) for item in [1, -1, 2]]
+
+    assert futures[0].result(timeout=5) == 2
+    with pytest.raises(ValueError):
+        futures[1].result(timeout=5)
+    assert futures[2].result(timeout=5) == 4
+    assert process_batch.batches == [[1, -1, 2], [1], [-1], [2]]
+
+
+def test_items_from_many_threads():
+    process_batch = RecordingBatches()
+    batcher = SentimentService.MicroBatcher(process_batch, max_batch_size=4, max_latency=0.01)
+    results = {}
+
+    def submit(i):
+        results[i] = batcher.submit(i).result(timeout=5)
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {i: i * 2 for i in range(20)}
+    assert max(len(batch) for batch in process_batch.batches) <= 4
@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+import SubtitleProcessing
+
+# Shortened YouTube auto-subs: every cue repeats the previous line and adds one line with word timestamps. Lines
+# with a single space do not end a cue.
+AUTO_VTT = ("WEBVTT\nKind: captions\nLanguage: en\n\n"
+            "00:00:00.000 --> 00:00:02.000 align:start position:0%\n"
+            " \n"
+            "bitcoin<00:00:00.500><c> is</c><00:00:01.000><c> up</c>\n\n"
+            "00:00:02.000 --> 00:00:02.010 align:start position:0%\n"
+            "bitcoin is up\n"
+            " \n\n"
+            "00:00:02.010 --> 00:00:04.000 align:start position:0%\n"
+            "bitcoin is up\n"
+            "[Music]<00:00:03.000><c> again</c>\n\n")
+
+SRT = """1
+00:00:01,000 --> 00:00:02,000
+<i>hello</i> &amp; bye
+
+2
+00:00:02,000 --> 00:00:03,000
+hello &amp; bye
+ethereum
+"""
+
+
+def write(tmp_path, file_name, text):
+    path = tmp_path / file_name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("timestamp, milliseconds", [("01:02:03.456", 3723456), ("02:03,456", 123456),
+                                                     ("2:03", 123000), ("00:00:00.000", 0)])
+def test_parse_timestamp(timestamp, milliseconds):
+    assert SubtitleProcessing.parse_timestamp(timestamp) == milliseconds
+
+
+def test_format_timestamp():
+    assert SubtitleProcessing.format_timestamp(3723456) == "01:02:03.456"
+    assert SubtitleProcessing.format_timestamp(np.int64(5)) == "00:00:00.005"
+    assert SubtitleProcessing.parse_timestamp(SubtitleProcessing.format_timestamp(86399999)) == 86399999
+
+
+def test_read_auto_subtitles(tmp_path):
+    words, starts, ends = SubtitleProcessing.read_subtitle_words(write(tmp_path, "a.en.vtt", AUTO_VTT))
+
+    assert words == ["bitcoin", "is", "up", "[Music]", "again"]
+    assert starts.tolist() == [0, 500, 1000, 2010, 3000]
+    assert ends.tolist() == [500, 1000, 2000, 3000, 4000]
+    assert starts.dtype == np.int64
+
+
+def test_read_srt_subtitles(tmp_path):
+    words, starts, ends = SubtitleProcessing.read_subtitle_words(write(tmp_path, "a.srt", SRT))
+
+    # Tags and entities are removed, the repeated line of the second cue is skipped.
+    assert words == ["hello", "&", "bye", "ethereum"]
+    assert starts[0] == 1000 and ends[2] == 2000
+    assert np.all(np.diff(starts) > 0)
+    assert starts[3] == 2000 and ends[3] == 3000
+
+
+def test_read_text_transcript(tmp_path):
+    text = "intro words\n0:10\none two three four\n0:30\nlast\n"
+
+    words, starts, ends = SubtitleProcessing.read_subtitle_words(write(tmp_path, "a.txt", text), words_per_minute=60)
+
+    assert words == ["intro", "words", "one", "two", "three", "four", "last"]
+    assert starts.tolist() == [0, 5000, 10000, 15000, 20000, 25000, 30000]
+    assert ends[-1] == 31000
+
+
+def test_read_empty_file(tmp_path):
+    words, starts, ends = SubtitleProcessing.read_subtitle_words(write(tmp_path, "a.vtt", "WEBVTT\n\n"))
+
+    assert words == [] and len(starts) == 0 and len(ends) == 0
+    assert SubtitleProcessing.generate_text_chunks(write(tmp_path, "b.vtt", "WEBVTT\n\n"), 2, 1) == (None, None, None)
+
+
+def test_generate_text_chunks(tmp_path):
+    text_chunks, starts, ends = SubtitleProcessing.generate_text_chunks(write(tmp_path, "a.en.vtt", AUTO_VTT), 2, 2)
+
+    # The last chunk has a single word and is discarded.
+    assert text_chunks == [["bitcoin", "is"], ["up", "[Music]"]]
+    assert starts == ["00:00:00.000", "00:00:01.000"]
+    assert ends == ["00:00:01.000", "00:00:03.000"]
+
+
+def test_align_words_to_clips():
+    words = ["a", "[Music]", "b", "c", "d"]
+    starts = np.array([0, 1000, 2000, 5000, 9000])
+    ends = np.array([900, 1900, 2900, 5900, 9900])
+
+    # The clips are not sorted, no word falls into the last one and d is after all clips.
+    texts, annotation_counts = SubtitleProcessing.align_words_to_clips(words, starts, ends, [4000, 0, 7000],
+                                                                       [6000, 3000, 8000])
+
+    assert texts == ["c", "a b", None]
+    assert annotation_counts.tolist() == [0, 1, 0]
+
+
+def test_align_words_to_clips_without_words():
+    texts, annotation_counts = SubtitleProcessing.align_words_to_clips([], np.zeros(0), np.zeros(0), [0], [1000])
+
+    assert texts == [None]
+    assert annotation_counts.tolist() == [0]
+
+
+# SentimentAnalysisPipeline.TEXT_COIN_LABELS
+COIN_LABELS = {"DOGE": ["doge", "dogecoin"], "ETH": ["ethereum", " eth "], "BTC": ["bitcoin", "btc"]}
+
+
+@pytest.mark.parametrize("text, label", [("ethereum is up", "ETH"),
+                                         ("methereum is up", "None"),
+                                         ("ethereums", "None"),
+                                         ("Buy ETH, not BTC.", "ETH"),
+                                         ("eth", "ETH"),
+                                         ("method and ether", "None"),
+                                         ("dogecoin doge bitcoin", "DOGE"),
+                                         ("bitcoin's price", "BTC"),
+                                         ("", "None"),
+                                         (None, "None")])
+def test_keyword_tagger_matches_whole_words(text, label):
+    tagger = SubtitleProcessing.get_keyword_tagger(COIN_LABELS)
+
+    assert tagger.tag(text) == label
+    assert tagger.tag_series([text]).tolist() == [label]
+
+
+def test_keyword_tagger_counts_mentions():
+    tagger = SubtitleProcessing.get_keyword_tagger(COIN_LABELS)
+
+    assert tagger.count_mentions("Dogecoin and DOGE and btc") == {"DOGE": 2, "BTC": 1}
+    assert tagger.tag_series(["eth eth bitcoin", "methereum"], all_matches=True).tolist() == [{"ETH": 2, "BTC": 1}, {}]
+    # Ties go to the first label.
+    assert tagger.tag("bitcoin doge") == "DOGE"
+    assert SubtitleProcessing.get_keyword_tagger(dict(COIN_LABELS)) is tagger
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("transformers")
+
+ROW = pd.Series({"Date": 20210101, "Author": "Channel", "Title": "Episode", "Views": "1000"})
+EPISODE_NAME = "Channel-sep-20210101-sep-Episode-sep-1000"
+
+
+def make_srt(cues):
+    return "".join("%d\n00:00:%06.3f --> 00:00:%06.3f\n%s\n\n" % (i + 1, start, end, text)
+                   for i, (start, end, text) in enumerate(cues)).replace(".", ",")
+
+
+SUBTITLES = make_srt([(0.5, 4.5, "Bitcoin is going UP today"),  # plausible
+                      # nothing between 5 and 10 seconds
+                      (10.5, 12, "[Music]"), (12, 14, "[Music] eth"),  # mostly annotations
+                      (15, 19.5, " ".join(["buy"] * 40))])  # too many words for 5 seconds
+
+
+@pytest.fixture
+def pipeline(make_pipeline, tmp_path, monkeypatch):
+    (tmp_path / (EPISODE_NAME + ".wav")).write_bytes(b"")
+    (tmp_path / (EPISODE_NAME + ".en.srt")).write_text(SUBTITLES)
+    pipeline = make_pipeline(audio_files_folder=str(tmp_path), clip_length=5, use_subtitles=True)
+    monkeypatch.setattr(pipeline, "decode_episode_audio", lambda row: np.zeros(20 * 16000, dtype=np.float32))
+    return pipeline
+
+
+def test_subtitle_texts_of_plausible_clips(pipeline):
+    df = pipeline.get_episode_clips_df(ROW, "memory")
+
+    assert pipeline.get_subtitle_texts(ROW, df) == ["bitcoin is going up today", None, None, None]
+
+
+def test_clips_without_plausible_subtitles_are_transcribed(pipeline, monkeypatch):
+    transcribed = []
+
+    def transcribe_audio_clips(audio_clips):
+        transcribed.extend(len(audio) for audio in audio_clips)
+        return ["asr text"] * len(audio_clips)
+
+    monkeypatch.setattr(pipeline, "transcribe_audio_clips", transcribe_audio_clips)
+    df = pipeline.run_episode_stage("clips", None, ROW, "memory")
+
+    df = pipeline.run_episode_stage("text", df, ROW, "memory")
+
+    assert df["Text"].tolist() == ["bitcoin is going up today", "asr text", "asr text", "asr text"]
+    assert df["Text_Source"].tolist() == ["subtitles", "asr", "asr", "asr"]
+    assert transcribed == [5 * 16000] * 3
+
+
+def test_episode_without_subtitle_file_is_transcribed(pipeline, monkeypatch, tmp_path):
+    (tmp_path / (EPISODE_NAME + ".en.srt")).unlink()
+    monkeypatch.setattr(pipeline, "transcribe_audio_clips", lambda audio_clips: ["asr text"] * len(audio_clips))
+    df = pipeline.run_episode_stage("clips", None, ROW, "memory")
+
+    df = pipeline.run_episode_stage("text", df, ROW, "memory")
+
+    assert df["Text_Source"].tolist() == ["asr"] * 4
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("transformers")
+
+import Benchmark
+
+
+class FakeTranscription:
+    """Replaces SentimentAnalysisPipeline.transcribe_batch, "transcribing" every clip to its length."""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, audio_clips):
+        self.batches.append([len(audio) for audio in audio_clips])
+        return ["clip %d" % len(audio) for audio in audio_clips]
+
+
+def make_clips(lengths):
+    return [np.zeros(length, dtype=np.float32) for length in lengths]
+
+
+def test_batches_by_length_and_keeps_input_order(make_pipeline, monkeypatch):
+    pipeline = make_pipeline(wav2vec_batch_size=2)
+    transcription = FakeTranscription()
+    monkeypatch.setattr(pipeline, "transcribe_batch", transcription)
+
+    texts = pipeline.transcribe_audio_clips(make_clips([5000, 1000, 4000, 2000, 3000]))
+
+    assert texts == ["clip 5000", "clip 1000", "clip 4000", "clip 2000", "clip 3000"]
+    assert transcription.batches == [[1000, 2000], [3000, 4000], [5000]]
+
+
+def test_cached_clips_keep_their_position(make_pipeline, monkeypatch, tmp_path):
+    pipeline = make_pipeline(wav2vec_batch_size=2, cache_path=str(tmp_path / "cache.sqlite"))
+    transcription = FakeTranscription()
+    monkeypatch.setattr(pipeline, "transcribe_batch", transcription)
+    pipeline.transcribe_audio_clips(make_clips([3000, 1000]))
+
+    transcription.batches = []
+    texts = pipeline.transcribe_audio_clips(make_clips([1000, 2000, 3000]))
+
+    assert texts == ["clip 1000", "clip 2000", "clip 3000"]
+    assert transcription.batches == [[2000]]
+
+
+def test_transcribed_words_do_not_depend_on_input_order(make_pipeline):
+    pipeline = make_pipeline(wav2vec_batch_size=2)
+    rng = np.random.default_rng(0)
+    clips = [Benchmark.synthesize_speech(duration, rng)[0] for duration in [3, 5, 2, 4]]
+
+    words = pipeline.transcribe_words(clips)
+
+    assert any(len(clip_words) > 0 for clip_words in words)
+    assert pipeline.transcribe_words(clips[::-1]) == words[::-1]
+    assert pipeline.transcribe_audio_clips(clips[::-1]) == pipeline.transcribe_audio_clips(clips)[::-1]
@@ -0,0 +1,101 @@
+import os
+import time
+import VideoDownloader
+
+
+class FakeYoutubeDl:
+    """Stands in for youtube-dl: writes the files of a video and returns an exit code."""
+
+    def __init__(self, videos):
+        # video URL -> (exit code, file names)
+        self.videos = videos
+        self.calls = []
+
+    def __call__(self, url, output_folder, start_date=None, end_date=None, file_name_separator="-sep-",
+                 extract_subtitles=True):
+        self.calls.append(url)
+        return_code, file_names = self.videos[url]
+        for file_name in file_names:
+            with open(os.path.join(output_folder, file_name), "w") as downloaded_file:
+                downloaded_file.write("data")
+        return return_code
+
+    def list(self, url):
+        return [("youtube " + video_url[-1], video_url) for video_url in sorted(self.videos)]
+
+
+def make_manager(folder, youtube_dl):
+    return VideoDownloader.DownloadManager(str(folder), min_request_interval=0, downloader=youtube_dl,
+                                           lister=youtube_dl.list)
+
+
+def test_archives_only_complete_downloads(tmp_path):
+    youtube_dl = FakeYoutubeDl({"https://video/a": (0, ["A-sep-20210101-sep-A-sep-1.wav",
+                                                        "A-sep-20210101-sep-A-sep-1.en.vtt"]),
+                                "https://video/b": (1, ["B-sep-20210101-sep-B-sep-1.en.vtt"]),
+                                "https://video/c": (1, ["C-sep-20210101-sep-C-sep-1.wav"])})
+
+    files = make_manager(tmp_path, youtube_dl).download(playlist_urls=["https://playlist"])
+
+    assert sorted(os.path.basename(file) for file in files) == ["A-sep-20210101-sep-A-sep-1.en.vtt",
+                                                               "A-sep-20210101-sep-A-sep-1.wav"]
+    output_files = sorted(file_name for file_name in os.listdir(tmp_path) if file_name != ".staging")
+    assert output_files == ["A-sep-20210101-sep-A-sep-1.en.vtt", "A-sep-20210101-sep-A-sep-1.wav",
+                            VideoDownloader.DEFAULT_ARCHIVE_FILE_NAME]
+
+    # The failed videos are downloaded again.
+    youtube_dl.calls = []
+    make_manager(tmp_path, youtube_dl).download(playlist_urls=["https://playlist"])
+    assert sorted(youtube_dl.calls) == ["https://video/b", "https://video/c"]
+
+
+def test_remembers_videos_outside_of_date_range(tmp_path):
+    youtube_dl = FakeYoutubeDl({"https://video/a": (0, [])})
+
+    assert make_manager(tmp_path, youtube_dl).download(["https://video/a"], start_date="20210101") == []
+    assert youtube_dl.calls == ["https://video/a"]
+
+    manager = make_manager(tmp_path, youtube_dl)
+    assert manager.get_jobs(["https://video/a"], start_date="20210101") == []
+    assert manager.get_jobs(["https://video/a"], start_date="20210201", end_date="20210301") == []
+    # A wider date range may contain the video.
+    assert len(manager.get_jobs(["https://video/a"], start_date="20201201")) == 1
+    assert len(manager.get_jobs(["https://video/a"])) == 1
+
+
+def test_does_not_remember_empty_download_without_date_range(tmp_path):
+    youtube_dl = FakeYoutubeDl({"https://video/a": (0, [])})
+
+    make_manager(tmp_path, youtube_dl).download(["https://video/a"])
+
+    assert len(make_manager(tmp_path, youtube_dl).get_jobs(["https://video/a"])) == 1
+
+
+def test_parallel_downloads_respect_playlist_limit(tmp_path):
+    class SlowYoutubeDl(FakeYoutubeDl):
+        def __call__(self, *args, **kwargs):
+            time.sleep(0.1)
+            return super().__call__(*args, **kwargs)
+
+    youtube_dl = SlowYoutubeDl({"https://video/" + name: (0, [name.upper() + "-sep-20210101-sep-T-sep-1.wav"])
+                                for name in "abcd"})
+    manager = VideoDownloader.DownloadManager(str(tmp_path), max_workers=4, min_request_interval=0,
+                                              downloader=youtube_dl, lister=youtube_dl.list)
+
+    files = manager.download(playlist_urls=["https://playlist"], max_videos_per_playlist=2)
+
+    assert len(files) == 2
+    assert len(youtube_dl.calls) == 2
+
+
+def test_failed_downloads_do_not_count_for_playlist_limit(tmp_path):
+    youtube_dl = FakeYoutubeDl({"https://video/a": (1, []),
+                                "https://video/b": (0, ["B-sep-20210101-sep-B-sep-1.wav"]),
+                                "https://video/c": (0, ["C-sep-20210101-sep-C-sep-1.wav"])})
+    manager = VideoDownloader.DownloadManager(str(tmp_path), max_workers=1, min_request_interval=0,
+                                              downloader=youtube_dl, lister=youtube_dl.list)
+
+    files = manager.download(playlist_urls=["https://playlist"], max_videos_per_playlist=2)
+
+    assert len(files) == 2
+    assert manager.downloads_per_playlist == {"https://playlist": 2}
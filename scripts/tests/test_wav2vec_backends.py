@@ -0,0 +1,89 @@
+import os
+import numpy as np
+import pytest
+
+pytest.importorskip("transformers")
+
+import soundfile as sf
+import torch
+import Benchmark
+import Wav2VecBackends
+from CryptoSentimentAnalysis import SentimentAnalysisPipeline
+
+
+@pytest.fixture(scope="module")
+def pipeline(tmp_path_factory):
+    processor, model = Benchmark.make_tiny_wav2vec(str(tmp_path_factory.mktemp("models")))
+    return SentimentAnalysisPipeline(wav2vec_model=model, wav2vec_processor=processor, wav2vec_version="test",
+                                     audio_feature_backend="native")
+
+
+@pytest.fixture
+def clip_files(tmp_path):
+    rng = np.random.default_rng(0)
+    clip_files = []
+    for i in range(3):
+        clip_file = str(tmp_path / ("%d.wav" % i))
+        sf.write(clip_file, Benchmark.synthesize_speech(5, rng)[0], 16000)
+        clip_files.append(clip_file)
+    return clip_files
+
+
+def make_backend(shift):
+    """Backend that outputs every token in turn, shifted by shift tokens."""
+
+    vocabulary_size = len(Benchmark.CTC_VOCABULARY)
+
+    def backend(input_values, attention_mask=None):
+        token_ids = (torch.arange(input_values.shape[1] // 320) // 4 + shift) % vocabulary_size
+        return torch.nn.functional.one_hot(token_ids, vocabulary_size).float().unsqueeze(0).repeat(
+            input_values.shape[0], 1, 1)
+
+    return backend
+
+
+def test_word_error_rate():
+    assert Wav2VecBackends.word_error_rate(["a b c", "d"], ["a b c", "d"]) == 0
+    assert Wav2VecBackends.word_error_rate(["a b c", "d"], ["a x c", ""]) == pytest.approx(0.5)
+    assert Wav2VecBackends.word_error_rate(["a b"], ["a b c d"]) == pytest.approx(1)
+
+
+def test_compare_backends_flags_diverging_backend(pipeline, clip_files, monkeypatch):
+    shifts = {"torch": 0, "quantized": 0, "onnx": 3}
+    monkeypatch.setattr(Wav2VecBackends, "create_backend", lambda model, backend, *args: make_backend(shifts[backend]))
+
+    df_comparison = Wav2VecBackends.compare_backends(pipeline, clip_files, onnx_path="unused.onnx", max_wer=0.1)
+
+    assert df_comparison["Backend"].tolist() == ["torch", "quantized", "onnx"]
+    assert df_comparison["WER"].tolist()[:2] == [0, 0]
+    assert df_comparison["WER"].iloc[2] > 0.1
+    assert df_comparison["Within_Tolerance"].tolist() == [True, True, False]
+
+
+def test_default_onnx_path_depends_on_weights(tmp_path):
+    _, model = Benchmark.make_tiny_wav2vec(str(tmp_path))
+    _, same_model = Benchmark.make_tiny_wav2vec(str(tmp_path))
+    _, other_model = Benchmark.make_tiny_wav2vec(str(tmp_path), seed=1)
+
+    onnx_path = Wav2VecBackends.get_default_onnx_path(model)
+
+    assert os.path.dirname(onnx_path) == Wav2VecBackends.DEFAULT_ONNX_FOLDER
+    assert onnx_path.endswith(".onnx")
+    assert Wav2VecBackends.get_default_onnx_path(same_model) == onnx_path
+    assert Wav2VecBackends.get_default_onnx_path(other_model) != onnx_path
+
+
+def test_model_hash_is_computed_once_per_weights(tmp_path, monkeypatch):
+    _, model = Benchmark.make_tiny_wav2vec(str(tmp_path))
+    model_hash = Wav2VecBackends.get_model_hash(model)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("weights hashed again")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Wav2VecBackends.hashlib, "sha1", fail)
+        assert Wav2VecBackends.get_model_hash(model) == model_hash
+
+    with torch.no_grad():
+        next(model.parameters()).add_(1)
+    assert Wav2VecBackends.get_model_hash(model) != model_hash